@@ -264,6 +264,7 @@ def delete_identity(user_id):
         return create_error_response(404, title="NotFound", message=f'User: {user_id} not found')
 
     if delete_user_profile(user_id):
+        remove_user_faces(user_id)
         builder = IdentityBuilder()
         builder.add_namespace("FacePass", LINK_RELATIONS_URL)
         builder.add_control("self", href=request.path)
@@ -408,6 +409,17 @@ def get_access_logs(access_request_id):
     return Response(json.dumps(builder), status=200, mimetype=MASON)
 
 
+@app.route('/health/ready', methods=['GET'], endpoint='ready')
+def readiness():
+    """
+    Report whether the recognition models are loaded, for load balancer readiness checks.
+    Returns:
+        Response: A JSON response with the load state of each model; 200 when all are ready, 503 otherwise.
+    """
+    ready, models = models_status()
+    return jsonify({'ready': ready, 'models': models}), 200 if ready else 503
+
+
 @app.route('/face_pass/tos')
 def terms_of_service():
     """
@@ -442,4 +454,6 @@ def send_profile_html():
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+    if cfg.app.preload_models:
+        preload_models()
     app.run(host=cfg.app.host, port=cfg.app.port, debug=False)
@@ -0,0 +1,91 @@
+"""
+Measures recall and query latency of the IVF index against an exact brute-force search on synthetic embeddings.
+Embeddings are drawn around one random centre per identity (several faces per identity), like a real gallery.
+
+    python benchmarks/ann_index.py --sizes 10000 100000 1000000 --dim 512 --nprobe 4 8 16 32
+
+A 1M x 512 float32 gallery takes 2 GiB, and the index holds a second, normalised copy.
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import argparse
+import time
+import numpy as np
+from face_engine.ann import IVFIndex, normalize
+
+
+def synthetic_gallery(size, dim, faces_per_identity, rng):
+    """
+    Draws a synthetic gallery of embeddings clustered by identity.
+    Args:
+        size (int): The number of embeddings.
+        dim (int): The embedding dimension.
+        faces_per_identity (int): The average number of embeddings per identity.
+        rng (numpy.random.Generator): The random generator.
+    Returns:
+        numpy.ndarray: The (size, dim) float32 embeddings.
+    """
+    identities = max(1, size // faces_per_identity)
+    centres = rng.standard_normal((identities, dim), dtype=np.float32)
+    gallery = np.empty((size, dim), dtype=np.float32)
+    for start in range(0, size, 100000):
+        end = min(start + 100000, size)
+        owners = rng.integers(0, identities, end - start)
+        gallery[start:end] = centres[owners] + 0.5 * rng.standard_normal((end - start, dim), dtype=np.float32)
+    return gallery
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--dim', type=int, default=512)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 8, 16, 32])
+    parser.add_argument('--faces-per-identity', type=int, default=5)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    for size in args.sizes:
+        gallery = synthetic_gallery(size, args.dim, args.faces_per_identity, rng)
+        rows = rng.choice(size, args.queries, replace=False)
+        queries = gallery[rows] + 0.1 * rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+        exact = []
+        nearest = []
+        normalized = normalize(gallery)
+        latencies = []
+        for query in normalize(queries):
+            start_query = time.perf_counter()
+            distances = 1 - normalized @ query
+            exact.append(np.argpartition(distances, args.k)[:args.k])
+            nearest.append(int(distances.argmin()))
+            latencies.append(time.perf_counter() - start_query)
+        del normalized
+        print(f'\n{size} embeddings x {args.dim} | brute force p50 {np.percentile(latencies, 50) * 1000:.2f} ms | '
+              f'p99 {np.percentile(latencies, 99) * 1000:.2f} ms')
+
+        nlist = int(4 * np.sqrt(size))
+        start = time.perf_counter()
+        index = IVFIndex(args.dim, nlist=nlist)
+        index.train(gallery)
+        index.add(np.arange(size), gallery)
+        print(f'IVF nlist={index.nlist} built in {time.perf_counter() - start:.1f}s')
+
+        for nprobe in args.nprobe:
+            latencies = []
+            found = []
+            for query in queries:
+                start_query = time.perf_counter()
+                ids, _ = index.search(query, k=args.k, nprobe=nprobe)
+                latencies.append(time.perf_counter() - start_query)
+                found.append(ids)
+            recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(found, exact)])
+            top1 = np.mean([ids[0] == best for ids, best in zip(found, nearest)])
+            print(f'  nprobe {nprobe:>3} | recall@{args.k} {recall:.3f} | top-1 {top1:.3f} | p50 {np.percentile(latencies, 50) * 1000:.2f} ms'
+                  f' | p99 {np.percentile(latencies, 99) * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
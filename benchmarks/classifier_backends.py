@@ -0,0 +1,105 @@
+"""
+Compares the classifier backends (cfg.recognizer.classifier) on the stored gallery: fit time, single-probe latency,
+batched throughput, top-1 accuracy and the share of probes accepted as the right user at the backend threshold.
+A fraction of the faces of every user with several faces is held out as probes. Without a stored gallery, or with
+--synthetic, clustered synthetic embeddings are used instead.
+
+    python benchmarks/classifier_backends.py --backends svc linear nearest centroid
+    python benchmarks/classifier_backends.py --synthetic --users 2000 --faces 10
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import argparse
+import time
+import numpy as np
+from config import cfg
+from face_engine.gallery import Gallery
+from face_engine.store import EmbeddingStore
+from face_engine.backends import BACKENDS, create_backend
+
+
+def load_gallery(args, rng):
+    """
+    Loads the alive rows of the stored gallery, or draws a synthetic one.
+    Args:
+        args (argparse.Namespace): The command line arguments.
+        rng (numpy.random.Generator): The random generator.
+    Returns:
+        tuple: The (N, D) float32 embeddings and (N,) int64 user IDs.
+    """
+    if not args.synthetic and os.path.isfile(os.path.join(cfg.recognizer.embedding_store_path, 'manifest.json')):
+        store = EmbeddingStore(cfg.recognizer.embedding_store_path)
+        embeddings, labels, _, ids = store.load()
+        if embeddings is not None:
+            alive = ~np.isin(ids, store.deleted())
+            print(f'[INFO] stored gallery: {int(alive.sum())} embeddings of {len(np.unique(labels[alive]))} users')
+            return np.asarray(embeddings[alive]), np.asarray(labels[alive])
+    print(f'[INFO] synthetic gallery: {args.users * args.faces} embeddings of {args.users} users')
+    centres = rng.standard_normal((args.users, 1, args.dim), dtype=np.float32)
+    embeddings = centres + args.noise * rng.standard_normal((args.users, args.faces, args.dim), dtype=np.float32)
+    return embeddings.reshape(-1, args.dim), np.repeat(np.arange(args.users, dtype=np.int64), args.faces)
+
+
+def split(labels, holdout, rng):
+    """
+    Holds out a share of the faces of every user with at least two faces.
+    Args:
+        labels (numpy.ndarray): The (N,) user IDs.
+        holdout (float): The share of the faces of a user to hold out, at least one.
+        rng (numpy.random.Generator): The random generator.
+    Returns:
+        tuple: The indices of the training rows and of the probe rows.
+    """
+    probes = []
+    for user_id in np.unique(labels):
+        rows = rng.permutation(np.flatnonzero(labels == user_id))
+        if len(rows) > 1:
+            probes.extend(rows[:max(1, int(holdout * len(rows)))].tolist())
+    test = np.zeros(len(labels), dtype=bool)
+    test[probes] = True
+    return np.flatnonzero(~test), np.flatnonzero(test)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS))
+    parser.add_argument('--holdout', type=float, default=0.2)
+    parser.add_argument('--latency-probes', type=int, default=200)
+    parser.add_argument('--synthetic', action='store_true')
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--faces', type=int, default=10)
+    parser.add_argument('--dim', type=int, default=512)
+    parser.add_argument('--noise', type=float, default=0.4)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    embeddings, labels = load_gallery(args, rng)
+    train, test = split(labels, args.holdout, rng)
+    gallery = Gallery()
+    gallery.add(embeddings[train], labels[train])
+    probes, truth = embeddings[test], labels[test]
+
+    for name in args.backends:
+        backend = create_backend(name)
+        start = time.perf_counter()
+        backend.fit(gallery)
+        fit = time.perf_counter() - start
+        start = time.perf_counter()
+        candidates = backend.score_batch(probes, k=1)
+        batched = time.perf_counter() - start
+        latencies = []
+        for probe in probes[:args.latency_probes]:
+            start = time.perf_counter()
+            backend.score_batch(probe[np.newaxis], k=1)
+            latencies.append(time.perf_counter() - start)
+        predicted = np.asarray([pairs[0][0] if pairs else -1 for pairs in candidates])
+        scores = np.asarray([pairs[0][1] if pairs else 0.0 for pairs in candidates])
+        accuracy = np.mean(predicted == truth)
+        accepted = np.mean((predicted == truth) & (scores > backend.threshold))
+        print(f'{name:>9} | fit {fit:7.2f}s | p50 {np.percentile(latencies, 50) * 1000:6.2f} ms | '
+              f'p99 {np.percentile(latencies, 99) * 1000:6.2f} ms | batch {len(probes) / batched:8.0f} probes/s | '
+              f'top-1 {accuracy:.4f} | accepted at {backend.threshold} {accepted:.4f}')
+
+
+if __name__ == '__main__':
+    main()
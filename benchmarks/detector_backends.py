@@ -0,0 +1,88 @@
+"""
+Compares the PyTorch and ONNX Runtime face detector backends on a folder of images.
+Reports per-image latency for both backends and how well the ONNX detections match the PyTorch ones.
+
+    python benchmarks/detector_backends.py --images test_images/Biden --repeat 20
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import argparse
+import time
+import numpy as np
+import cv2
+from config import cfg
+from face_engine.detector import Inference
+
+
+def box_iou(a, b):
+    """
+    Computes the IoU matrix between two sets of [x, y, w, h] boxes.
+    Args:
+        a (numpy.ndarray): An (N, 4) array of boxes.
+        b (numpy.ndarray): An (M, 4) array of boxes.
+    Returns:
+        numpy.ndarray: An (N, M) IoU matrix.
+    """
+    a1, a2 = a[:, None, :2], a[:, None, :2] + a[:, None, 2:]
+    b1, b2 = b[None, :, :2], b[None, :, :2] + b[None, :, 2:]
+    inter = np.clip(np.minimum(a2, b2) - np.maximum(a1, b1), 0, None).prod(2)
+    return inter / (a[:, None, 2:].prod(2) + b[None, :, 2:].prod(2) - inter + 1e-9)
+
+
+def time_backend(inference, frames, repeat):
+    """
+    Runs the detector over every frame `repeat` times after one warm-up pass.
+    Args:
+        inference (Inference): The detector to time.
+        frames (list): The frames to run on.
+        repeat (int): How many timed passes to run.
+    Returns:
+        tuple: The per-image latencies in milliseconds and the detections of the last pass.
+    """
+    detections = [inference.detect(frame) for frame in frames]
+    latencies = []
+    for _ in range(repeat):
+        for i, frame in enumerate(frames):
+            start = time.perf_counter()
+            detections[i] = inference.detect(frame)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return np.asarray(latencies), detections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', required=True, help='folder with the images to run on')
+    parser.add_argument('--repeat', type=int, default=10, help='timed passes over the folder per backend')
+    args = parser.parse_args()
+
+    frames = [cv2.imread(os.path.join(args.images, name)) for name in sorted(os.listdir(args.images))]
+    frames = [frame for frame in frames if frame is not None]
+    print(f'[INFO] {len(frames)} images from {args.images}')
+
+    results = {}
+    for backend in ['torch', 'onnx']:
+        cfg.detector.backend = backend
+        latencies, detections = time_backend(Inference(), frames, args.repeat)
+        results[backend] = detections
+        print(f'{backend:>6}: mean {latencies.mean():7.2f} ms | p50 {np.percentile(latencies, 50):7.2f} ms | '
+              f'p95 {np.percentile(latencies, 95):7.2f} ms')
+
+    matched, total, ious, score_diffs = 0, 0, [], []
+    for reference, candidate in zip(results['torch'], results['onnx']):
+        total += len(reference)
+        if len(reference) == 0 or len(candidate) == 0:
+            continue
+        iou = box_iou(reference.boxes, candidate.boxes)
+        best = iou.argmax(1)
+        for i, j in enumerate(best):
+            if iou[i, j] >= 0.9:
+                matched += 1
+                ious.append(iou[i, j])
+                score_diffs.append(abs(reference.scores[i] - candidate.scores[j]))
+    print(f'matched {matched}/{total} torch detections at IoU >= 0.9 | '
+          f'mean IoU {np.mean(ious) if ious else 0:.4f} | max score diff {np.max(score_diffs) if score_diffs else 0:.4f}')
+
+
+if __name__ == '__main__':
+    main()
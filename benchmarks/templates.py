@@ -0,0 +1,81 @@
+"""
+Measures the accuracy / latency trade-off of keeping at most K templates per user, on synthetic embeddings.
+Every identity has a few modes (EX: lighting, glasses) and many noisy enrollment faces around them; probes are held-out
+faces of the same identities, matched by the nearest-neighbour backend.
+
+    python benchmarks/templates.py --users 1000 --faces 100 --k 1 2 4 8 16 0
+
+K = 0 keeps every enrolled face.
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import argparse
+import time
+import numpy as np
+from face_engine.gallery import Gallery
+from face_engine.backends import NearestNeighbourBackend
+from face_engine.templates import select_templates
+
+
+def synthetic_faces(users, faces, modes, dim, noise, rng):
+    """
+    Draws noisy faces around a few modes per identity.
+    Args:
+        users (int): The number of identities.
+        faces (int): The number of faces per identity.
+        modes (int): The number of modes per identity.
+        dim (int): The embedding dimension.
+        noise (float): The standard deviation of the per-face noise.
+        rng (numpy.random.Generator): The random generator.
+    Returns:
+        numpy.ndarray: The (users, faces, dim) float32 embeddings.
+    """
+    centres = rng.standard_normal((users, 1, dim), dtype=np.float32)
+    offsets = 0.6 * rng.standard_normal((users, modes, dim), dtype=np.float32)
+    owners = rng.integers(0, modes, (users, faces))
+    return centres + np.take_along_axis(offsets, owners[..., None], axis=1) + \
+        noise * rng.standard_normal((users, faces, dim), dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--faces', type=int, default=100, help='enrolled faces per user')
+    parser.add_argument('--probes', type=int, default=5, help='held-out probe faces per user')
+    parser.add_argument('--modes', type=int, default=3)
+    parser.add_argument('--dim', type=int, default=512)
+    parser.add_argument('--noise', type=float, default=2.0)
+    parser.add_argument('--k', type=int, nargs='+', default=[1, 2, 4, 8, 16, 0])
+    parser.add_argument('--policy', nargs='+', default=['medoids', 'centroids'])
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    faces = synthetic_faces(args.users, args.faces + args.probes, args.modes, args.dim, args.noise, rng)
+    enrolled, probes = faces[:, :args.faces], faces[:, args.faces:].reshape(-1, args.dim)
+    truth = np.repeat(np.arange(args.users), args.probes)
+
+    for policy in args.policy:
+        for k in args.k:
+            if k == 0 and policy != args.policy[0]:
+                continue
+            start = time.perf_counter()
+            gallery = Gallery()
+            for user_id in range(args.users):
+                templates = enrolled[user_id] if k == 0 else select_templates(enrolled[user_id], k, policy)
+                gallery.add(templates, user_id)
+            build = time.perf_counter() - start
+            backend = NearestNeighbourBackend(gallery)
+            latencies = []
+            predictions = []
+            for probe in probes:
+                start = time.perf_counter()
+                predictions.append(backend.predict(probe)[0])
+                latencies.append(time.perf_counter() - start)
+            accuracy = np.mean(np.asarray(predictions) == truth)
+            print(f'{"all" if k == 0 else policy:>9} K={k or args.faces:<4} | rows {len(gallery):>7} | '
+                  f'{gallery.embeddings.nbytes / 2 ** 20:7.1f} MiB | build {build:5.1f}s | top-1 {accuracy:.4f} | '
+                  f'p50 {np.percentile(latencies, 50) * 1000:.2f} ms | p99 {np.percentile(latencies, 99) * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Measures the memory every worker process spends on the gallery and the trained model, loaded either as private copies
+(the former pickle loading) or memory-mapped from the embedding store and the uncompressed model file, whose pages
+are then shared by all workers through the page cache.
+A synthetic gallery is written to a temporary store; every worker loads it with the model, reads every page, waits
+for the others and reports its RSS, PSS (shared pages split between the processes mapping them) and USS (private
+pages) growth over its start-up memory.
+
+    python benchmarks/worker_memory.py --workers 4 --users 500 --faces 20
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import argparse
+import tempfile
+import multiprocessing
+import numpy as np
+import joblib
+from face_engine.gallery import Gallery
+from face_engine.store import EmbeddingStore
+from face_engine.backends import create_backend
+from face_engine.registry import proportional_memory
+
+MODES = ['copy', 'mmap']
+
+
+def load_worker(mode, store_path, model_path, backend, barrier, results):
+    """
+    Loads the gallery and the model in one worker process and reports its memory growth.
+    Args:
+        mode (str): 'copy' loads private arrays, 'mmap' maps the files.
+        store_path (str): The directory of the embedding store.
+        model_path (str): The saved model.
+        backend (str): The name of the backend that saved the model.
+        barrier (multiprocessing.Barrier): Synchronises the measurement of all workers.
+        results (multiprocessing.Queue): Receives the {'rss', 'pss', 'uss'} growth in bytes.
+    """
+    before = proportional_memory()
+    embeddings, labels, norms, ids = EmbeddingStore(store_path).load()
+    clf = create_backend(backend)
+    if mode == 'copy':
+        gallery = Gallery.from_arrays(np.array(embeddings), np.array(labels), np.array(norms), np.array(ids))
+        clf.model = joblib.load(model_path)['model']
+    else:
+        gallery = Gallery.from_arrays(embeddings, labels, norms, ids)
+        clf.load(model_path)
+    checksum = float(gallery.embeddings.sum()) + float(gallery.norms.sum())
+    candidates = clf.score_batch(gallery.embeddings[:8], k=1)
+    barrier.wait()
+    after = proportional_memory()
+    barrier.wait()
+    results.put({key: after[key] - before[key] for key in after} if after and before else None)
+    return checksum, candidates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--backend', default='svc', choices=['svc', 'linear'])
+    parser.add_argument('--mode', nargs='+', default=MODES, choices=MODES)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--faces', type=int, default=20)
+    parser.add_argument('--dim', type=int, default=512)
+    args = parser.parse_args()
+    if proportional_memory() is None:
+        print('[ERROR] /proc/self/smaps_rollup is not available, PSS cannot be measured on this platform')
+        return
+    rng = np.random.default_rng(0)
+    centres = rng.standard_normal((args.users, 1, args.dim), dtype=np.float32)
+    embeddings = (centres + 0.4 * rng.standard_normal((args.users, args.faces, args.dim), dtype=np.float32))
+    embeddings = embeddings.reshape(-1, args.dim)
+    labels = np.repeat(np.arange(args.users, dtype=np.int64), args.faces)
+
+    with tempfile.TemporaryDirectory() as root:
+        store = EmbeddingStore(os.path.join(root, 'embeddings'))
+        store.rewrite(embeddings, labels)
+        gallery = Gallery()
+        gallery.add(embeddings, labels)
+        clf = create_backend(args.backend)
+        print(f'[INFO] fitting {args.backend} on {len(labels)} embeddings of {args.users} users')
+        clf.fit(gallery)
+        model_path = os.path.join(root, 'model.pkl')
+        clf.save(model_path)
+        print(f'[INFO] gallery {embeddings.nbytes / 2 ** 20:.1f} MiB | model file '
+              f'{os.path.getsize(model_path) / 2 ** 20:.1f} MiB | {args.workers} workers')
+
+        context = multiprocessing.get_context('spawn')
+        for mode in args.mode:
+            barrier = context.Barrier(args.workers)
+            results = context.Queue()
+            workers = [context.Process(target=load_worker, args=(mode, store.path, model_path, args.backend,
+                                                                  barrier, results))
+                       for _ in range(args.workers)]
+            for worker in workers:
+                worker.start()
+            reports = [results.get() for _ in workers]
+            for worker in workers:
+                worker.join()
+            for key in ['rss', 'pss', 'uss']:
+                growth = np.asarray([report[key] for report in reports]) / 2 ** 20
+                print(f'{mode:>5} | {key} per worker {growth.mean():7.1f} MiB | all workers {growth.sum():7.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
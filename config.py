@@ -17,24 +17,33 @@ __C.app = edict()
 __C.app.allowed_extensions = ['jpeg', 'png', 'jpg']
 __C.app.port = 8080
 __C.app.host = '0.0.0.0'
+__C.app.preload_models = True  # build the models on a background thread when the server starts (python3 app.py) instead of on first request; importing app.py never loads them
 __C.app.VALID_API_KEYS = ['4fd3efa18991cf343d2dfc1b7b698ac4', '1335286ed1ba18f28dd029983c624107',
                           '2b723b784e95601787f9a821461f4d35', '3b8e459a0842d308ff3abde4a8a59dcd',
                           '37be65937e12d1cb23f3d4a0880b5fca']
 
 __C.detector = edict()
 __C.detector.weight_file = f"{__C.base.path}face_engine/model_data/yolov8n-face.pt"  # model.pt path(s)
+__C.detector.backend = 'torch'  # ['torch', 'onnx'] 'onnx' exports weight_file to onnx_file once and runs it with onnxruntime
+__C.detector.onnx_file = f"{__C.base.path}face_engine/model_data/yolov8n-face.onnx"
+__C.detector.onnx_providers = ['CPUExecutionProvider']  # EX: ['OpenVINOExecutionProvider', 'CPUExecutionProvider']
+__C.detector.onnx_threads = 0  # intra-op threads for onnxruntime, 0 lets onnxruntime decide
 __C.detector.classes = [0]  # filter by class: --class 0, or --class 0 2 3
 __C.detector.OBJECTNESS_CONFIDANCE = 0.2
 __C.detector.NMS_THRESHOLD = 0.45
 __C.detector.device = 'cpu'  # if GPU give the device ID; EX: , else 'cpu'
-__C.detector.rotate_frame = False
-__C.detector.frame_resize = (640, 640)
+__C.detector.rotate_frame = False  # False or degrees to rotate the decoded frame clockwise: [90, 180, 270]
+__C.detector.frame_resize = (640, 640)  # (height, width) frames are letterboxed to before detection
+__C.detector.roi = None  # optional region of interest as (x1, y1, x2, y2) fractions of the frame; EX: (0.25, 0, 0.75, 1)
+__C.detector.reduced_decode = True  # decode large JPEGs at 1/2, 1/4 or 1/8 scale for detection
+__C.detector.cascade = False  # detect at the smallest cascade size first, re-run larger only if nothing was found
+__C.detector.cascade_sizes = [(320, 320), (640, 640)]
 
 
 # overlay Flags
 __C.flags = edict()
 __C.flags.image_show = False
-__C.flags.render_detections = True
+__C.flags.render_detections = True  # only used by Inference.infer()/render() for debug output
 __C.flags.render_labels = True
 
 __C.permission = edict()
@@ -54,6 +63,34 @@ __C.permission.user_permission_levels = [
 __C.recognizer = edict()
 __C.recognizer.distance_type = 'Euclidean'  # ['Cosine', 'Euclidean']  # available options for calculate the distance between images for get matches
 __C.recognizer.model = "Facenet512"  # ["VGGFace", "OpenFace", "Facenet", "FbDeepFace", "ArcFace", "Facenet512", "DeepID", "DlibResNet", "DlibWrapper", "SFaceWrapper"]  # face recognition algorithm options.
-__C.recognizer.threshold = 0.87
-__C.recognizer.model_path = f'{__C.base.path}face_engine/model_data/model_svc.pkl'
-__C.recognizer.embedding_file_path = f'{__C.base.path}face_engine/model_data/embeddings.pkl'
+__C.recognizer.classifier = 'svc'  # ['svc', 'linear', 'nearest', 'centroid'] 'nearest' and 'centroid' need no retraining on enrollment
+__C.recognizer.threshold = 0.87  # minimal probability for the 'svc' classifier
+__C.recognizer.match_threshold = 0.7  # minimal similarity (1 for identical faces) for the 'nearest' and 'centroid' classifiers
+__C.recognizer.linear_threshold = 0.5  # minimal probability for the 'linear' classifier
+__C.recognizer.linear_c = 10.0  # inverse regularisation strength of the 'linear' classifier
+__C.recognizer.top_k = 3  # candidate users scored per access request and logged with the decision
+__C.recognizer.permission_pruning = False  # search only the users holding the permission an access request requires
+__C.recognizer.permission_partition_ttl = 10  # seconds a worker reuses the users of a permission before reloading them, so changes made through other workers are seen
+__C.recognizer.ann = False  # let the 'nearest' classifier search an approximate nearest-neighbour index on large galleries
+__C.recognizer.ann_min_size = 20000  # gallery rows from which the ANN index is used instead of a brute-force scan
+__C.recognizer.ann_nlist = 1024  # clusters of the IVF index
+__C.recognizer.ann_nprobe = 16  # clusters scanned per query; higher improves recall at the cost of latency
+__C.recognizer.ann_candidates = 10  # candidates retrieved from the index per probe
+__C.recognizer.ann_index_path = f'{__C.base.path}face_engine/model_data/ann_index.npz'
+__C.recognizer.weights_dir = None  # local DEEPFACE_HOME holding .deepface/weights/; when set, weights are never downloaded
+__C.recognizer.templates_per_user = 0  # keep at most this many representative embeddings per user, 0 keeps every face
+__C.recognizer.template_policy = 'medoids'  # ['medoids', 'centroids'] how the kept embeddings are chosen
+__C.recognizer.batch_size = 32  # faces per recognition model call when encoding many images
+__C.recognizer.skip_detection = False  # embed YOLO crops directly instead of re-detecting them in DeepFace; the store and the model record it, and the faces are re-encoded and the model refitted when it changes
+__C.recognizer.async_training = True  # retrain the 'svc' classifier on a background thread after enrollment, then swap the new model in
+__C.recognizer.model_path = f'{__C.base.path}face_engine/model_data/model_svc.pkl'  # the 'svc' or 'linear' model, saved with its backend name and refitted when the other backend is selected
+__C.recognizer.embedding_file_path = f'{__C.base.path}face_engine/model_data/embeddings.pkl'  # legacy pickle, migrated to the embedding store on start-up
+__C.recognizer.embedding_store_path = f'{__C.base.path}face_engine/model_data/embeddings/'  # append-only, memory-mapped gallery shared by the workers
+__C.recognizer.store_max_segments = 8  # appended segments kept before the small ones are merged
+__C.recognizer.compaction_ratio = 0.1  # share of removed gallery rows that starts a background compaction
+__C.recognizer.bootstrap_workers = None  # processes used by python -m face_engine.bootstrap, None uses every CPU core; the server itself always encodes in process
+__C.recognizer.bootstrap_checkpoint = 100  # users encoded per commit to the store while it is built; an interrupted build resumes from the last commit
+__C.recognizer.result_cache_size = 256  # recognition results kept for retried, byte-identical access request images
+__C.recognizer.result_cache_ttl = 30  # seconds a cached recognition result stays valid
+__C.recognizer.model_version = 1  # bump when the weights of the recognition model change, so cached embeddings are recomputed
+__C.recognizer.embedding_cache_path = f'{__C.base.path}face_engine/model_data/embedding_cache.sqlite'  # None disables the cache
@@ -0,0 +1,222 @@
+import numpy as np
+
+
+def normalize(vectors):
+    """
+    Scales every row to unit L2 norm.
+    Args:
+        vectors (numpy.ndarray): An (N, D) array.
+    Returns:
+        numpy.ndarray: The (N, D) float32 unit vectors.
+    """
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    return vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+
+
+class IVFIndex:
+    """
+    An inverted-file (IVF-flat) approximate nearest-neighbour index over cosine distance, in pure NumPy.
+    The vectors are split into nlist clusters by spherical k-means; a query only scans the nprobe clusters whose
+    centroids are closest to it. Raising nprobe trades latency for recall, nprobe == nlist is an exact search.
+    Vectors are stored normalised in per-cluster buffers that grow geometrically, so inserts and deletes are
+    O(1) amortised and never retrain the clusters.
+    Attributes:
+        dim (int): The vector dimension.
+        nlist (int): The number of clusters.
+        nprobe (int): The default number of clusters scanned per query.
+        centroids (numpy.ndarray): The (nlist, dim) unit cluster centroids, None until trained.
+    Methods:
+        __init__(dim, nlist, nprobe): Initializes an empty, untrained index.
+        train(vectors, iterations, seed): Learns the cluster centroids from sample vectors.
+        add(ids, vectors): Inserts vectors under the given integer IDs.
+        remove(ids): Deletes the vectors with the given IDs.
+        remapped(mapping): Returns a copy of the index with its IDs renumbered.
+        ids(): Returns the IDs of the indexed vectors.
+        search(queries, k, nprobe): Returns the IDs and cosine distances of the approximate k nearest vectors.
+        save(path): Writes the index to an .npz file.
+        load(path): Reads an index written by save().
+    """
+    def __init__(self, dim, nlist=256, nprobe=8):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.centroids = None
+        self._ids = [np.empty(0, dtype=np.int64) for _ in range(nlist)]
+        self._vectors = [np.empty((0, dim), dtype=np.float32) for _ in range(nlist)]
+        self._sizes = np.zeros(nlist, dtype=np.int64)
+        self._where = {}  # id -> (cluster, position)
+
+    def __len__(self):
+        return len(self._where)
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def train(self, vectors, iterations=10, seed=0):
+        """
+        Learns the cluster centroids with spherical k-means on (a sample of) the given vectors.
+        Args:
+            vectors (numpy.ndarray): An (N, dim) array of training vectors.
+            iterations (int): The number of k-means iterations.
+            seed (int): The random seed for sampling and initialisation.
+        """
+        rng = np.random.default_rng(seed)
+        vectors = normalize(vectors)
+        if len(vectors) > 64 * self.nlist:
+            vectors = vectors[rng.choice(len(vectors), 64 * self.nlist, replace=False)]
+        self.nlist = min(self.nlist, len(vectors))
+        self._ids, self._vectors = self._ids[:self.nlist], self._vectors[:self.nlist]
+        self._sizes = self._sizes[:self.nlist]
+        centroids = vectors[rng.choice(len(vectors), self.nlist, replace=False)]
+        for _ in range(iterations):
+            assignment = (vectors @ centroids.T).argmax(1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, vectors)
+            empty = np.bincount(assignment, minlength=self.nlist) == 0
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+            centroids = normalize(sums)
+        self.centroids = centroids
+
+    def add(self, ids, vectors):
+        """
+        Inserts vectors under the given integer IDs; an existing ID is replaced.
+        Args:
+            ids (numpy.ndarray): The (N,) integer IDs, EX: gallery row indices.
+            vectors (numpy.ndarray): The (N, dim) vectors.
+        """
+        if not self.is_trained:
+            raise ValueError('[ERROR] the index must be trained before adding vectors')
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        vectors = normalize(vectors)
+        self.remove([i for i in ids.tolist() if i in self._where])
+        clusters = (vectors @ self.centroids.T).argmax(1)
+        for cluster in np.unique(clusters):
+            members = np.flatnonzero(clusters == cluster)
+            self._append(int(cluster), ids[members], vectors[members])
+
+    def _append(self, cluster, ids, vectors):
+        size = self._sizes[cluster]
+        if size + len(ids) > len(self._ids[cluster]):
+            capacity = max(size + len(ids), 2 * len(self._ids[cluster]), 16)
+            grown_ids = np.empty(capacity, dtype=np.int64)
+            grown_vectors = np.empty((capacity, self.dim), dtype=np.float32)
+            grown_ids[:size] = self._ids[cluster][:size]
+            grown_vectors[:size] = self._vectors[cluster][:size]
+            self._ids[cluster], self._vectors[cluster] = grown_ids, grown_vectors
+        self._ids[cluster][size: size + len(ids)] = ids
+        self._vectors[cluster][size: size + len(ids)] = vectors
+        for offset, item in enumerate(ids.tolist()):
+            self._where[item] = (cluster, size + offset)
+        self._sizes[cluster] = size + len(ids)
+
+    def remove(self, ids):
+        """
+        Deletes the vectors with the given IDs by moving the last vector of their cluster into their slot.
+        Unknown IDs are ignored.
+        Args:
+            ids (list): The integer IDs to delete.
+        """
+        for item in np.asarray(ids, dtype=np.int64).reshape(-1).tolist():
+            location = self._where.pop(item, None)
+            if location is None:
+                continue
+            cluster, position = location
+            last = self._sizes[cluster] - 1
+            if position != last:
+                moved = int(self._ids[cluster][last])
+                self._ids[cluster][position] = moved
+                self._vectors[cluster][position] = self._vectors[cluster][last]
+                self._where[moved] = (cluster, position)
+            self._sizes[cluster] = last
+
+    def remapped(self, mapping):
+        """
+        Returns a copy of the index with every ID renumbered, EX: to follow the rows of a compacted gallery.
+        The clusters are kept, so nothing is retrained.
+        Args:
+            mapping (numpy.ndarray): The new ID of every old ID, indexed by old ID; IDs mapped to -1 are dropped.
+        Returns:
+            IVFIndex: The renumbered index.
+        """
+        index = IVFIndex(self.dim, self.nlist, self.nprobe)
+        index.centroids = self.centroids
+        for cluster in range(self.nlist):
+            ids = mapping[self._ids[cluster][:self._sizes[cluster]]]
+            keep = ids >= 0
+            if keep.any():
+                index._append(cluster, ids[keep], self._vectors[cluster][:self._sizes[cluster]][keep])
+        return index
+
+    def ids(self):
+        """
+        Returns the IDs of the indexed vectors.
+        Returns:
+            numpy.ndarray: The sorted int64 IDs.
+        """
+        return np.sort(np.fromiter(self._where, dtype=np.int64, count=len(self._where)))
+
+    def search(self, queries, k=10, nprobe=None):
+        """
+        Returns the approximate k nearest vectors of each query by cosine distance.
+        Args:
+            queries (numpy.ndarray): A (P, dim) array of queries, or a single (dim,) query.
+            k (int): The number of neighbours per query.
+            nprobe (int, optional): The number of clusters scanned per query, defaults to self.nprobe.
+        Returns:
+            tuple: The (P, k) IDs and (P, k) cosine distances, closest first and padded with -1 / inf when fewer
+                   than k vectors were scanned; (k,) arrays for a single query.
+        """
+        single = np.ndim(queries) == 1
+        queries = normalize(queries)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        if self.is_trained and len(self) != 0:
+            probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+            for q, (query, clusters) in enumerate(zip(queries, probes)):
+                clusters = [c for c in clusters if self._sizes[c] != 0]
+                if not clusters:
+                    continue
+                candidate_ids = np.concatenate([self._ids[c][:self._sizes[c]] for c in clusters])
+                candidates = np.concatenate([self._vectors[c][:self._sizes[c]] for c in clusters])
+                candidate_distances = 1 - candidates @ query
+                n = min(k, len(candidate_ids))
+                nearest = np.argpartition(candidate_distances, n - 1)[:n] if n < len(candidate_ids) \
+                    else np.arange(n)
+                nearest = nearest[np.argsort(candidate_distances[nearest])]
+                ids[q, :n] = candidate_ids[nearest]
+                distances[q, :n] = candidate_distances[nearest]
+        return (ids[0], distances[0]) if single else (ids, distances)
+
+    def save(self, path):
+        """
+        Writes the index to an .npz file.
+        Args:
+            path (str): The file to write.
+        """
+        ids = np.concatenate([self._ids[c][:self._sizes[c]] for c in range(self.nlist)])
+        vectors = np.concatenate([self._vectors[c][:self._sizes[c]] for c in range(self.nlist)])
+        with open(path, 'wb') as f:
+            np.savez(f, params=np.asarray([self.dim, self.nlist, self.nprobe]), centroids=self.centroids,
+                     ids=ids, vectors=vectors, sizes=self._sizes)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads an index written by save().
+        Args:
+            path (str): The file to read.
+        Returns:
+            IVFIndex: The loaded index.
+        """
+        data = np.load(path)
+        dim, nlist, nprobe = (int(value) for value in data['params'])
+        index = cls(dim, nlist, nprobe)
+        index.centroids = data['centroids']
+        offsets = np.concatenate([[0], np.cumsum(data['sizes'])])
+        for cluster in range(nlist):
+            start, end = offsets[cluster], offsets[cluster + 1]
+            if end > start:
+                index._append(cluster, data['ids'][start:end], data['vectors'][start:end])
+        return index
@@ -0,0 +1,613 @@
+import os
+import uuid
+import joblib
+import numpy as np
+from sklearn.svm import SVC
+from sklearn.linear_model import LogisticRegression
+from config import cfg
+from face_engine.similarity import pairwise_distances, top_k
+from face_engine.ann import IVFIndex, normalize
+from face_engine.embedding_cache import model_key
+from face_engine.store import MEMORY_MAPPING
+
+CANDIDATES_PER_USER = 8  # nearest gallery rows scanned per requested user when ranking the top-k users
+
+
+class SVCBackend:
+    """
+    Recognises faces with a kernel SVM with probability calibration. Adding users requires a full refit; removed users
+    are excluded from the predictions until the next fit.
+    Attributes:
+        name (str): The key of the backend in BACKENDS, saved with the model so another backend never loads it.
+        model (SVC): The SVM classifier.
+        excluded (set): The IDs of the users removed since the last fit.
+        incremental (bool): Always False, the SVM must be refitted when the gallery changes.
+        threshold (float): The minimal probability for a match, cfg.recognizer.threshold.
+    Methods:
+        fit(gallery): Fits the SVM on the whole gallery.
+        add(embeddings, labels): Does nothing, the SVM only learns new users through fit().
+        remove(user_id, rows): Excludes a user from the predictions.
+        discard_rows(rows): Does nothing, the SVM keeps what it learned until the next fit.
+        compacted(gallery, mapping): Returns the backend itself, the SVM does not refer to gallery rows.
+        prepare(embeddings): Returns the features the model works on, the embeddings themselves.
+        score_batch(embeddings, k, users): Returns the k most probable users of every probe with their probabilities.
+        predict(embedding): Returns the predicted user ID and its probability.
+        save(path): Saves the fitted SVM uncompressed, with the name of the backend and the model key.
+        load(path, gallery): Loads a fitted SVM with its arrays memory-mapped, excluding the users not in the gallery.
+    """
+    name = 'svc'
+    incremental = False
+    mmap_mode = 'c'  # libsvm asks for writable buffers but never writes them, so copy-on-write pages stay shared
+
+    def __init__(self):
+        self.model = SVC(probability=True)
+        self.threshold = cfg.recognizer.threshold
+        self.excluded = set()
+
+    def fit(self, gallery):
+        """
+        Fits the SVM on the alive rows of the gallery.
+        Args:
+            gallery (Gallery): The embeddings and user IDs to fit on.
+        """
+        alive = gallery.alive
+        embeddings, labels = self.prepare(gallery.embeddings[alive]), gallery.labels[alive]
+        self.model.fit(embeddings, labels)
+        self.excluded = set()
+        print('[INFO] evaluating the model ....')
+        self.model.score(embeddings, labels)
+
+    def add(self, embeddings, labels):
+        """
+        Does nothing, the SVM only learns new users through fit().
+        """
+
+    def remove(self, user_id, rows=None):
+        """
+        Excludes a user from the predictions until the next fit.
+        Args:
+            user_id (int): The ID of the removed user.
+            rows (numpy.ndarray, optional): Unused, the gallery rows of the user.
+        """
+        self.excluded.add(int(user_id))
+
+    def discard_rows(self, rows):
+        """
+        Does nothing, the SVM keeps what it learned until the next fit.
+        """
+
+    def compacted(self, gallery, mapping):
+        """
+        Returns the backend itself, the SVM does not refer to gallery rows.
+        """
+        return self
+
+    @staticmethod
+    def prepare(embeddings):
+        """
+        Returns the features the model works on, the embeddings themselves.
+        Args:
+            embeddings (numpy.ndarray): An (N, D) array of embeddings.
+        Returns:
+            numpy.ndarray: The (N, D) features.
+        """
+        return embeddings
+
+    def score_batch(self, embeddings, k=1, users=None):
+        """
+        Returns the k most probable users of every probe with their probabilities, from a single predict_proba call.
+        Probabilities are mapped to user IDs through the classes of the SVM, and removed users are skipped.
+        Args:
+            embeddings (numpy.ndarray): A (P, D) matrix of probes.
+            k (int): The number of candidates per probe.
+            users (set, optional): Restricts the candidates to these user IDs; the probabilities stay calibrated over
+                                   every class.
+        Returns:
+            list: For every probe, up to k (user ID, probability) pairs, most probable first.
+        """
+        probabilities = self.model.predict_proba(self.prepare(np.atleast_2d(embeddings)))
+        if self.excluded:
+            probabilities[:, np.isin(self.model.classes_, list(self.excluded))] = 0.0
+        if users is not None:
+            probabilities[:, ~np.isin(self.model.classes_, list(users))] = 0.0
+        indices, negated = top_k(-probabilities, k)
+        return [[(int(self.model.classes_[i]), float(-p)) for i, p in zip(row, scores) if p < 0]
+                for row, scores in zip(indices.tolist(), negated.tolist())]
+
+    def predict(self, embedding):
+        """
+        Returns the most probable user ID that was not removed, and its probability.
+        Args:
+            embedding (numpy.ndarray): The probe embedding.
+        Returns:
+            tuple: The predicted user ID and its probability, or (None, 0.0) if every user was removed.
+        """
+        candidates = self.score_batch(embedding, k=1)[0]
+        return candidates[0] if candidates else (None, 0.0)
+
+    def save(self, path):
+        """
+        Saves the fitted SVM uncompressed, so load() can memory-map its arrays, together with the name of the backend,
+        since every trained backend saves to cfg.recognizer.model_path, and the key of the model that encoded the
+        embeddings it was fitted on (see face_engine.embedding_cache.model_key).
+        Args:
+            path (str): The file to save to.
+        """
+        joblib.dump({'backend': self.name, 'model_key': model_key(), 'model': self.model}, path, compress=0)
+
+    def load(self, path, gallery=None):
+        """
+        Loads a fitted SVM with its arrays (support vectors, coefficients) memory-mapped from the file, so every worker
+        process loading the same file shares their pages instead of holding a private copy. On Windows the arrays are
+        read into memory, so a later training can replace the file (see face_engine.store.MEMORY_MAPPING).
+        The model may hold users removed since it was fitted: their rows are compacted out of the store while the
+        excluded set only lives in memory, so the classes without any row in the gallery are excluded again.
+        Args:
+            path (str): The file to load from.
+            gallery (Gallery, optional): The gallery the model serves.
+        Raises:
+            ValueError: If the file holds the model of another backend, EX: an SVM saved before switching to
+                        'linear', or a model fitted on embeddings of another model key, EX: before
+                        cfg.recognizer.skip_detection was changed.
+        """
+        saved = joblib.load(path, mmap_mode=self.mmap_mode if MEMORY_MAPPING else None)
+        if not isinstance(saved, dict):
+            # models saved before the backend name was stored with them
+            saved = {'backend': 'svc' if isinstance(saved, SVC) else 'linear', 'model': saved}
+        if saved['backend'] != self.name:
+            raise ValueError(f"[ERROR] {path} holds a model of the {saved['backend']} backend, not {self.name}")
+        if saved.get('model_key', model_key()) != model_key():
+            raise ValueError(f"[ERROR] {path} was fitted on embeddings of {saved['model_key']}, not {model_key()}")
+        self.model = saved['model']
+        if self.model.classes_.dtype.kind not in 'iu':
+            # models trained before the gallery held int64 user IDs were fitted on the folder names, EX: '12'
+            self.model.classes_ = self.model.classes_.astype(np.int64)
+        self.excluded = set()
+        if gallery is not None:
+            self.excluded = set(self.model.classes_.tolist()) - set(gallery.users().tolist())
+
+
+class NearestNeighbourBackend:
+    """
+    Recognises faces by their nearest gallery embedding and a similarity threshold, without any training.
+    The backend reads the classifier's gallery directly, so enrolling or removing faces costs O(new faces) and never a
+    refit. The score of a match is 1 - cosine distance for cfg.recognizer.distance_type 'Cosine', and 1 - d / 2 for the
+    Euclidean distance d between L2-normalised embeddings otherwise; both are 1 for identical faces.
+    Once the gallery reaches cfg.recognizer.ann_min_size rows (with cfg.recognizer.ann enabled), candidates are
+    retrieved from an IVF index instead of a brute-force scan. Removed rows are skipped by both searches. The index is
+    saved keyed by store row ID, so a saved index is reused after rows were enrolled or removed since it was saved.
+    Attributes:
+        gallery (Gallery): The gallery searched at prediction time.
+        index (IVFIndex): The approximate nearest-neighbour index over the gallery rows, or None for brute force.
+        incremental (bool): Always True, gallery changes are visible without fitting.
+        threshold (float): The minimal score for a match, cfg.recognizer.match_threshold.
+    Methods:
+        fit(gallery): Binds the backend to a gallery and builds or loads its index when needed.
+        add(embeddings, labels): Inserts the newest gallery rows into the index.
+        remove(user_id, rows): Deletes removed gallery rows from the index.
+        discard_rows(rows): Deletes gallery rows from the index.
+        compacted(gallery, mapping): Returns a backend over a compacted gallery, with the index renumbered.
+        scores(embeddings): Returns the score of every probe against every gallery row.
+        score_batch(embeddings, k, users): Returns the k best matching users of every probe with their scores.
+        predict(embedding): Returns the user ID of the nearest gallery embedding and its score.
+        save(path): Saves the index to cfg.recognizer.ann_index_path.
+        load(path, gallery): Does nothing, the gallery is the model and the index is loaded by fit().
+    """
+    incremental = True
+    max_missing_ratio = 0.5  # a saved index missing more of the gallery than this is retrained instead of updated
+
+    def __init__(self, gallery=None):
+        self.gallery = gallery
+        self.index = None
+        self.threshold = cfg.recognizer.match_threshold
+
+    def fit(self, gallery):
+        """
+        Binds the backend to a gallery, and builds or loads its index once the gallery is large enough.
+        Args:
+            gallery (Gallery): The gallery to search.
+        """
+        self.gallery = gallery
+        self.index = None
+        if cfg.recognizer.ann and len(gallery) >= cfg.recognizer.ann_min_size:
+            self.build_index()
+
+    def build_index(self):
+        """
+        Loads the saved index and brings it up to date with the gallery: the rows it holds that are no longer alive
+        are dropped and the alive rows it misses are inserted. A new index is trained on the gallery rows when there
+        is no saved index or it misses too much of the gallery.
+        """
+        if os.path.isfile(cfg.recognizer.ann_index_path):
+            index = IVFIndex.load(cfg.recognizer.ann_index_path)
+            if index.dim == self.gallery.dim:
+                gallery = self.gallery
+                stored = np.flatnonzero(gallery.alive & (gallery.ids >= 0))
+                mapping = np.full(max(int(gallery.ids.max(initial=-1)), int(index.ids().max(initial=-1))) + 1, -1,
+                                  dtype=np.int64)
+                mapping[gallery.ids[stored]] = stored
+                index = index.remapped(mapping)  # store row IDs -> gallery rows
+                missing = np.setdiff1d(np.flatnonzero(gallery.alive), index.ids())
+                if len(missing) <= self.max_missing_ratio * (len(gallery) - gallery.deleted):
+                    index.add(missing, gallery.embeddings[missing])
+                    print(f'[INFO] loaded the ANN index, {len(missing)} embeddings added since it was saved')
+                    self.index = index
+                    return
+        print(f'[INFO] building the ANN index over {len(self.gallery)} embeddings ....')
+        rows = np.flatnonzero(self.gallery.alive)
+        index = IVFIndex(self.gallery.dim, nlist=cfg.recognizer.ann_nlist, nprobe=cfg.recognizer.ann_nprobe)
+        index.train(self.gallery.embeddings[rows])
+        index.add(rows, self.gallery.embeddings[rows])
+        self.index = index
+        self.save(cfg.recognizer.ann_index_path)
+
+    def add(self, embeddings, labels):
+        """
+        Inserts the newest gallery rows into the index; the rows themselves are read from the bound gallery.
+        Args:
+            embeddings (numpy.ndarray): The (N, D) embeddings just appended to the gallery.
+            labels (numpy.ndarray): Their user IDs.
+        """
+        if self.index is not None:
+            self.index.add(np.arange(len(self.gallery) - len(embeddings), len(self.gallery)), embeddings)
+        elif cfg.recognizer.ann and len(self.gallery) >= cfg.recognizer.ann_min_size:
+            self.build_index()
+
+    def remove(self, user_id, rows):
+        """
+        Deletes removed gallery rows from the index; the brute-force search reads the alive flags of the gallery.
+        Args:
+            user_id (int): The ID of the removed user.
+            rows (numpy.ndarray): The gallery rows of the user.
+        """
+        self.discard_rows(rows)
+
+    def discard_rows(self, rows):
+        """
+        Deletes gallery rows from the index, EX: templates replaced by new ones.
+        Args:
+            rows (numpy.ndarray): The discarded gallery rows.
+        """
+        if self.index is not None:
+            self.index.remove(rows)
+
+    def compacted(self, gallery, mapping):
+        """
+        Returns a backend over a compacted gallery, with the index renumbered instead of rebuilt. The rows of the
+        compacted gallery that no old row maps to (EX: appended by another worker) are inserted into the index.
+        Args:
+            gallery (Gallery): The compacted gallery.
+            mapping (numpy.ndarray): The new row of every old row, -1 for the dropped rows.
+        Returns:
+            NearestNeighbourBackend: The backend over the compacted gallery.
+        """
+        backend = NearestNeighbourBackend(gallery)
+        if self.index is not None:
+            backend.index = self.index.remapped(mapping)
+            added = np.setdiff1d(np.flatnonzero(gallery.alive), mapping[mapping >= 0])
+            if len(added) != 0:
+                backend.index.add(added, gallery.embeddings[added])
+        return backend
+
+    @staticmethod
+    def to_scores(distances):
+        """
+        Converts cosine distances into scores that are 1 for identical faces.
+        Args:
+            distances (numpy.ndarray): The cosine distances.
+        Returns:
+            numpy.ndarray: The scores.
+        """
+        if cfg.recognizer.distance_type == 'Cosine':
+            return 1 - distances
+        return 1 - np.sqrt(2 * np.maximum(distances, 0)) / 2
+
+    def scores(self, embeddings):
+        """
+        Returns the score of every probe against every gallery row.
+        Args:
+            embeddings (numpy.ndarray): A (P, D) matrix of probes, or a single (D,) probe.
+        Returns:
+            numpy.ndarray: The (P, G) scores, or (G,) for a single probe.
+        """
+        return self.to_scores(pairwise_distances(embeddings, self.gallery.embeddings, metric='Cosine',
+                                                 gallery_norms=self.gallery.norms))
+
+    def score_batch(self, embeddings, k=1, users=None):
+        """
+        Returns the k best matching users of every probe with their scores; a user scores as their nearest row.
+        Users are collected from the CANDIDATES_PER_USER * k nearest rows (or the ANN candidates), so fewer than k
+        users are returned when the nearest rows belong to fewer users.
+        Args:
+            embeddings (numpy.ndarray): A (P, D) matrix of probes.
+            k (int): The number of candidates per probe.
+            users (set, optional): Restricts the search to the rows of these user IDs, scanned exactly.
+        Returns:
+            list: For every probe, up to k (user ID, score) pairs, best first.
+        """
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        gallery = self.gallery
+        if gallery is None or len(gallery) == gallery.deleted:
+            return [[] for _ in embeddings]
+        if users is not None:
+            subset = gallery.rows_of(users)
+            scores = self.to_scores(pairwise_distances(embeddings, gallery.embeddings[subset], metric='Cosine',
+                                                       gallery_norms=gallery.norms[subset]))
+            rows, negated = top_k(-scores, CANDIDATES_PER_USER * k)
+            rows, scores = subset[rows], -negated
+        elif self.index is not None:
+            rows, distances = self.index.search(embeddings, k=max(k, cfg.recognizer.ann_candidates))
+            scores = self.to_scores(distances)
+        else:
+            scores = self.scores(embeddings)
+            if gallery.deleted:
+                scores = np.where(gallery.alive, scores, -np.inf)
+            rows, negated = top_k(-scores, CANDIDATES_PER_USER * k)
+            scores = -negated
+        labels, alive = gallery.labels, gallery.alive
+        results = []
+        for row, row_scores in zip(rows.tolist(), scores.tolist()):
+            best = {}
+            for item, score in zip(row, row_scores):
+                if item < 0 or not alive[item]:
+                    continue
+                best.setdefault(int(labels[item]), float(score))
+                if len(best) == k:
+                    break
+            results.append(list(best.items()))
+        return results
+
+    def predict(self, embedding):
+        """
+        Returns the user ID of the nearest gallery embedding and its score.
+        Args:
+            embedding (numpy.ndarray): The probe embedding.
+        Returns:
+            tuple: The user ID of the nearest gallery embedding and its score, or (None, 0.0) for an empty gallery.
+        """
+        candidates = self.score_batch(embedding, k=1)[0]
+        return candidates[0] if candidates else (None, 0.0)
+
+    def save(self, path):
+        """
+        Saves the index to cfg.recognizer.ann_index_path keyed by store row ID, so it stays valid whatever rows are
+        added or compacted away afterwards; the rows not saved to the store yet are left out. The gallery itself is
+        saved by the Classifier.
+        Args:
+            path (str): Unused, the model path of the classifier.
+        """
+        if self.index is not None:
+            temp = f'{cfg.recognizer.ann_index_path}.{uuid.uuid4().hex}.tmp'
+            self.index.remapped(self.gallery.ids).save(temp)
+            os.replace(temp, cfg.recognizer.ann_index_path)
+
+    def load(self, path, gallery=None):
+        """
+        Does nothing, the gallery is the model and the index is loaded by fit().
+        """
+
+
+class LinearBackend(SVCBackend):
+    """
+    Recognises faces with a multinomial logistic regression on L2-normalised embeddings. It fits in roughly linear time
+    in the gallery size and predicts with one (D, users) matrix product, against the kernel SVM that is quadratic to fit
+    and scans its support vectors per prediction. The probabilities are calibrated by the model itself.
+    Adding users requires a refit; removed users are excluded from the predictions until the next fit.
+    Attributes:
+        name (str): 'linear'.
+        model (LogisticRegression): The linear classifier.
+        threshold (float): The minimal probability for a match, cfg.recognizer.linear_threshold.
+    Methods:
+        prepare(embeddings): Returns the L2-normalised embeddings.
+    """
+    name = 'linear'
+    mmap_mode = 'r'
+
+    def __init__(self):
+        super().__init__()
+        self.model = LogisticRegression(C=cfg.recognizer.linear_c, max_iter=1000)
+        self.threshold = cfg.recognizer.linear_threshold
+
+    @staticmethod
+    def prepare(embeddings):
+        """
+        Returns the L2-normalised embeddings, so the decision depends on the direction of a face embedding only.
+        Args:
+            embeddings (numpy.ndarray): An (N, D) array of embeddings.
+        Returns:
+            numpy.ndarray: The (N, D) unit vectors.
+        """
+        return normalize(embeddings)
+
+
+class CentroidBackend:
+    """
+    Recognises faces by the nearest user centroid, the mean of the L2-normalised embeddings of each user.
+    The centroids are running sums, so enrolling, replacing or removing faces updates only the users concerned and
+    never needs a refit; a prediction is one (D, users) matrix product. Scores follow NearestNeighbourBackend.to_scores.
+    Attributes:
+        gallery (Gallery): The gallery the centroids were built from, read when rows are discarded.
+        users (numpy.ndarray): The user ID of every centroid.
+        centroids (numpy.ndarray): The (users, D) unit centroids.
+        incremental (bool): Always True, gallery changes are applied without fitting.
+        threshold (float): The minimal score for a match, cfg.recognizer.match_threshold.
+    Methods:
+        fit(gallery): Builds the centroids of every user of the gallery.
+        add(embeddings, labels): Adds embeddings to the centroids of their users.
+        remove(user_id, rows): Drops the centroid of a user.
+        discard_rows(rows): Subtracts gallery rows from the centroids of their users.
+        compacted(gallery, mapping): Returns the backend bound to the compacted gallery.
+        score_batch(embeddings, k, users): Returns the k nearest users of every probe with their scores.
+        predict(embedding): Returns the user ID of the nearest centroid and its score.
+        save(path): Does nothing, the centroids are rebuilt from the gallery.
+        load(path, gallery): Does nothing, the centroids are rebuilt from the gallery.
+    """
+    incremental = True
+
+    def __init__(self):
+        self.gallery = None
+        self.threshold = cfg.recognizer.match_threshold
+        self._clear()
+
+    def _clear(self):
+        self.size = 0
+        self._positions = {}  # user ID -> centroid row
+        self._users = np.empty(0, dtype=np.int64)
+        self._sums = np.empty((0, 0), dtype=np.float64)
+        self._counts = np.empty(0, dtype=np.int64)
+        self._centroids = np.empty((0, 0), dtype=np.float32)
+
+    @property
+    def users(self):
+        return self._users[:self.size]
+
+    @property
+    def centroids(self):
+        return self._centroids[:self.size]
+
+    def fit(self, gallery):
+        """
+        Builds the centroids of every user of the gallery from its alive rows.
+        Args:
+            gallery (Gallery): The gallery to build the centroids from.
+        """
+        self._clear()
+        self.gallery = gallery
+        alive = gallery.alive
+        self.add(gallery.embeddings[alive], gallery.labels[alive])
+
+    def _reserve(self, users, dim):
+        if users <= len(self._users) and dim == self._sums.shape[1]:
+            return
+        capacity = max(users, 2 * len(self._users), 64)
+        grown = (np.zeros(capacity, dtype=np.int64), np.zeros((capacity, dim), dtype=np.float64),
+                 np.zeros(capacity, dtype=np.int64), np.zeros((capacity, dim), dtype=np.float32))
+        if self.size != 0:
+            for old, new in zip((self._users, self._sums, self._counts, self._centroids), grown):
+                new[:self.size] = old[:self.size]
+        self._users, self._sums, self._counts, self._centroids = grown
+
+    def _update(self, embeddings, labels, sign):
+        embeddings = normalize(embeddings)
+        labels = np.asarray(labels, dtype=np.int64).reshape(-1)
+        if len(labels) == 0:
+            return
+        new_users = [user_id for user_id in np.unique(labels).tolist() if user_id not in self._positions]
+        self._reserve(self.size + len(new_users), embeddings.shape[1])
+        for user_id in new_users:
+            self._positions[user_id] = self.size
+            self._users[self.size] = user_id
+            self.size += 1
+        positions = np.asarray([self._positions[user_id] for user_id in labels.tolist()])
+        np.add.at(self._sums, positions, sign * embeddings.astype(np.float64))
+        np.add.at(self._counts, positions, sign)
+        changed = np.unique(positions)
+        self._centroids[changed] = normalize(self._sums[changed])
+        self._centroids[changed[self._counts[changed] <= 0]] = 0
+
+    def add(self, embeddings, labels):
+        """
+        Adds embeddings to the centroids of their users, creating the centroids of new users.
+        Args:
+            embeddings (numpy.ndarray): The (N, D) embeddings just appended to the gallery.
+            labels (numpy.ndarray): Their user IDs.
+        """
+        self._update(embeddings, labels, 1)
+
+    def remove(self, user_id, rows=None):
+        """
+        Drops the centroid of a user.
+        Args:
+            user_id (int): The ID of the removed user.
+            rows (numpy.ndarray, optional): Unused, the gallery rows of the user.
+        """
+        position = self._positions.get(int(user_id))
+        if position is not None:
+            self._sums[position] = 0
+            self._counts[position] = 0
+            self._centroids[position] = 0
+
+    def discard_rows(self, rows):
+        """
+        Subtracts gallery rows from the centroids of their users, EX: templates replaced by new ones.
+        Args:
+            rows (numpy.ndarray): The discarded gallery rows.
+        """
+        if len(rows) != 0:
+            self._update(self.gallery.embeddings[rows], self.gallery.labels[rows], -1)
+
+    def compacted(self, gallery, mapping):
+        """
+        Returns a backend with the centroids rebuilt from the compacted gallery, which may hold rows appended or lack
+        rows deleted by another worker.
+        Args:
+            gallery (Gallery): The compacted gallery.
+            mapping (numpy.ndarray): Unused, the new row of every old row.
+        Returns:
+            CentroidBackend: The backend over the compacted gallery.
+        """
+        backend = CentroidBackend()
+        backend.fit(gallery)
+        return backend
+
+    def score_batch(self, embeddings, k=1, users=None):
+        """
+        Returns the k nearest users of every probe with their scores.
+        Args:
+            embeddings (numpy.ndarray): A (P, D) matrix of probes.
+            k (int): The number of candidates per probe.
+            users (set, optional): Restricts the candidates to these user IDs.
+        Returns:
+            list: For every probe, up to k (user ID, score) pairs, best first.
+        """
+        embeddings = normalize(embeddings)
+        if self.size == 0:
+            return [[] for _ in embeddings]
+        scores = NearestNeighbourBackend.to_scores(1 - embeddings @ self.centroids.T)
+        valid = self._counts[:self.size] > 0
+        if users is not None:
+            valid &= np.isin(self.users, list(users))
+        scores = np.where(valid, scores, -np.inf)
+        indices, negated = top_k(-scores, k)
+        return [[(int(self.users[i]), float(-score)) for i, score in zip(row, row_scores) if score != np.inf]
+                for row, row_scores in zip(indices.tolist(), negated.tolist())]
+
+    def predict(self, embedding):
+        """
+        Returns the user ID of the nearest centroid and its score.
+        Args:
+            embedding (numpy.ndarray): The probe embedding.
+        Returns:
+            tuple: The user ID of the nearest centroid and its score, or (None, 0.0) without any centroid.
+        """
+        candidates = self.score_batch(embedding, k=1)[0]
+        return candidates[0] if candidates else (None, 0.0)
+
+    def save(self, path):
+        """
+        Does nothing, the centroids are rebuilt from the gallery by fit().
+        """
+
+    def load(self, path, gallery=None):
+        """
+        Does nothing, the centroids are rebuilt from the gallery by fit().
+        """
+
+
+BACKENDS = {'svc': SVCBackend, 'linear': LinearBackend, 'nearest': NearestNeighbourBackend,
+            'centroid': CentroidBackend}
+
+
+def create_backend(name):
+    """
+    Creates the classifier backend selected by name.
+    Args:
+        name (str): One of the keys of BACKENDS, EX: cfg.recognizer.classifier.
+    Returns:
+        object: The backend instance.
+    Raises:
+        ValueError: If the name is not a known backend.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f'[ERROR] {name} is not valid. please use either one of these: {list(BACKENDS)}')
+    return BACKENDS[name]()
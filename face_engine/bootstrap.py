@@ -0,0 +1,221 @@
+"""
+Builds the embedding store from the face images in cfg.db.database, one user per task on a pool of processes.
+
+    python -m face_engine.bootstrap --workers 8
+
+Completed users are committed to the store in batches, so an interrupted run resumes with the users not yet stored.
+"""
+import os
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import cv2
+from config import cfg
+from face_engine.encoder import Encoder
+from face_engine.gallery import to_vector
+from face_engine.embedding_cache import EmbeddingCache, content_hash, model_key
+from face_engine.store import EmbeddingStore
+from face_engine.templates import select_templates
+
+_encoder = None
+_cache = None
+
+
+def open_embedding_cache():
+    """
+    Opens the persistent embedding cache of the configured recognition model.
+    Returns:
+        EmbeddingCache: The cache, or None when cfg.recognizer.embedding_cache_path is not set.
+    """
+    if not cfg.recognizer.embedding_cache_path:
+        return None
+    return EmbeddingCache(cfg.recognizer.embedding_cache_path, model_key())
+
+
+def encode_files(encoder, paths, cache=None):
+    """
+    Generates embeddings for image files, reusing the persistent embedding cache for content already encoded.
+    Only new or changed files go through the recognition model; their embeddings are added to the cache.
+    Args:
+        encoder (Encoder): The encoder generating the embeddings.
+        paths (list): The paths to the image files to encode.
+        cache (EmbeddingCache, optional): The persistent embedding cache.
+    Returns:
+        list: One float32 embedding per path in the same order, None for the files that could not be encoded.
+    """
+    if cache is None:
+        return [None if face_encode is None else to_vector(face_encode)
+                for face_encode in encoder.encode_batch(paths, batch_size=cfg.recognizer.batch_size)]
+
+    hashes = []
+    contents = []
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                contents.append(f.read())
+            hashes.append(content_hash(contents[-1]))
+        except OSError as e:
+            print(f'[ERROR] {path} : {e}')
+            contents.append(None)
+            hashes.append(None)
+    cache.reset_stats()
+    cached = cache.get_many([key for key in hashes if key is not None])
+    missing = [i for i, key in enumerate(hashes) if key is not None and key not in cached]
+    if encoder.skip_detection:
+        images = [cv2.imdecode(np.frombuffer(contents[i], np.uint8), cv2.IMREAD_COLOR) for i in missing]
+    else:
+        images = [paths[i] for i in missing]
+    encoded = {}
+    for i, face_encode in zip(missing, encoder.encode_batch(images, batch_size=cfg.recognizer.batch_size)):
+        if face_encode is not None:
+            encoded[hashes[i]] = to_vector(face_encode)
+        else:
+            print(f'[ERROR] {paths[i]} : could not be encoded')
+    cache.put_many(encoded)
+    return [cached.get(key, encoded.get(key)) if key is not None else None for key in hashes]
+
+
+def user_images(user_id):
+    """
+    Lists the face images of a user.
+    Args:
+        user_id (str): The ID of the user, the name of their folder in cfg.db.database.
+    Returns:
+        list: The paths to the face images of the user.
+    """
+    return [f'{cfg.db.database}{user_id}/{image}' for image in sorted(os.listdir(f'{cfg.db.database}{user_id}'))]
+
+
+def _init_worker(encoder=None):
+    global _encoder, _cache
+    _encoder = encoder or Encoder(Model=cfg.recognizer.model, Distance=cfg.recognizer.distance_type,
+                                  SkipDetection=cfg.recognizer.skip_detection)
+    _cache = open_embedding_cache()
+
+
+def _encode_user(user_id):
+    embeddings = [face_encode for face_encode in encode_files(_encoder, user_images(user_id), _cache)
+                  if face_encode is not None]
+    if not embeddings:
+        return user_id, None
+    if cfg.recognizer.templates_per_user:
+        return user_id, select_templates(np.stack(embeddings), cfg.recognizer.templates_per_user,
+                                         cfg.recognizer.template_policy)
+    return user_id, np.stack(embeddings)
+
+
+def pending_marker(store):
+    """
+    Returns the file marking a bootstrap of the store as started but not finished.
+    Args:
+        store (EmbeddingStore): The embedding store.
+    Returns:
+        str: The path of the marker file.
+    """
+    return os.path.join(store.path, 'bootstrap.pending')
+
+
+def is_pending(store):
+    """
+    Tells whether a bootstrap of the store was interrupted and must be resumed.
+    Args:
+        store (EmbeddingStore): The embedding store.
+    Returns:
+        bool: True if the marker of an unfinished bootstrap exists.
+    """
+    return os.path.isfile(pending_marker(store))
+
+
+def bootstrap(store, workers=None, checkpoint_every=None, encoder=None):
+    """
+    Encodes the faces of every user in cfg.db.database into the store, skipping the users it already holds.
+    Users are encoded in parallel, one per task, and committed to the store every checkpoint_every users, so a crash
+    loses at most the users encoded since the last commit. Progress is reported as faces/s and ETA.
+    The process pool is spawned, so it must only be started from a script guarded by __main__ such as main(), never
+    while a model is being loaded: every child re-runs the main script (EX: app.py) on start-up.
+    Args:
+        store (EmbeddingStore): The embedding store to fill.
+        workers (int, optional): The number of encoding processes, defaults to cfg.recognizer.bootstrap_workers or the
+                                 number of CPU cores; 1 encodes in the calling process.
+        checkpoint_every (int, optional): The number of users per commit, defaults to cfg.recognizer.bootstrap_checkpoint.
+        encoder (Encoder, optional): The encoder used when encoding in the calling process, built when not given.
+    Returns:
+        int: The number of users encoded by this run.
+    """
+    workers = workers or cfg.recognizer.bootstrap_workers or os.cpu_count() or 1
+    checkpoint_every = checkpoint_every or cfg.recognizer.bootstrap_checkpoint
+    open(pending_marker(store), 'a').close()
+    _, labels, _, _ = store.load()
+    stored = set() if labels is None else set(np.unique(labels).tolist())
+    users = []
+    for user_id in sorted(os.listdir(cfg.db.database)):
+        if not os.path.isdir(f'{cfg.db.database}{user_id}'):
+            continue
+        if not user_id.isdigit():
+            print(f'[ERROR] skipping {cfg.db.database}{user_id} : the folder name is not a user ID')
+        elif int(user_id) not in stored:
+            users.append(user_id)
+    faces = {user_id: len(os.listdir(f'{cfg.db.database}{user_id}')) for user_id in users}
+    total = sum(faces.values())
+    print(f'[INFO] bootstrapping {len(users)} users ({total} faces) with {workers} workers, '
+          f'{len(stored)} users already stored')
+
+    pending_embeddings, pending_labels = [], []
+    done_faces = 0
+    start = time.perf_counter()
+
+    def commit():
+        if pending_embeddings:
+            store.append(np.concatenate(pending_embeddings), np.concatenate(pending_labels))
+            pending_embeddings.clear()
+            pending_labels.clear()
+
+    def completed(count, user_id, embeddings):
+        nonlocal done_faces
+        if embeddings is not None:
+            pending_embeddings.append(embeddings)
+            pending_labels.append(np.full(len(embeddings), int(user_id), dtype=np.int64))
+        done_faces += faces[user_id]
+        if count % checkpoint_every == 0 or count == len(users):
+            commit()
+            elapsed = time.perf_counter() - start
+            rate = done_faces / elapsed if elapsed else 0.0
+            eta = (total - done_faces) / rate if rate else 0.0
+            print(f'[INFO] {count}/{len(users)} users | {done_faces}/{total} faces | {rate:.1f} faces/s | '
+                  f'ETA {eta:.0f}s')
+
+    if workers == 1:
+        _init_worker(encoder)
+        for count, user_id in enumerate(users, 1):
+            completed(count, *_encode_user(user_id))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker) as executor:
+            futures = [executor.submit(_encode_user, user_id) for user_id in users]
+            for count, future in enumerate(as_completed(futures), 1):
+                completed(count, *future.result())
+    commit()
+    if not store.exists():
+        store.rewrite(np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=np.int64))
+    os.remove(pending_marker(store))
+    return len(users)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=None, help='encoding processes, defaults to the CPU cores')
+    parser.add_argument('--checkpoint-every', type=int, default=None, help='users encoded per commit to the store')
+    args = parser.parse_args()
+    store = EmbeddingStore(cfg.recognizer.embedding_store_path, max_segments=cfg.recognizer.store_max_segments,
+                           model_key=model_key())
+    if store.stale():
+        print(f'[INFO] re-encoding every user: the store holds embeddings of {store.manifest["model_key"]}')
+        store.rewrite(np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=np.int64))
+    bootstrap(store, workers=args.workers, checkpoint_every=args.checkpoint_every)
+    store.compact()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+from collections import OrderedDict
+import threading
+import time
+
+
+class ResultCache:
+    """
+    A bounded, thread-safe LRU cache whose entries expire after a fixed time to live.
+    Attributes:
+        maxsize (int): The maximum number of entries kept; the least recently used entry is evicted first.
+        ttl (float): Seconds an entry stays valid after it was stored.
+        hits (int): The number of lookups answered from the cache.
+        misses (int): The number of lookups that found nothing or an expired entry.
+    Methods:
+        __init__(maxsize, ttl): Initializes an empty cache.
+        get(key): Returns the cached value for key, or None.
+        put(key, value): Stores a value under key.
+        clear(): Drops every entry.
+    """
+    def __init__(self, maxsize=256, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Returns the cached value for key and marks it as recently used.
+        Args:
+            key (hashable): The cache key.
+        Returns:
+            object: The cached value, or None if the key is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        """
+        Stores a value under key, evicting the least recently used entry if the cache is full.
+        Args:
+            key (hashable): The cache key.
+            value (object): The value to cache.
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Drops every entry, EX: after the classifier was retrained and cached predictions went stale.
+        """
+        with self._lock:
+            self._entries.clear()
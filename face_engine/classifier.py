@@ -4,78 +4,274 @@
 import os
 from config import cfg
 from face_engine.encoder import Encoder
-from sklearn.svm import SVC
+from face_engine.gallery import Gallery, to_vector
+from face_engine.store import EmbeddingStore
+from face_engine.bootstrap import bootstrap, encode_files, is_pending, open_embedding_cache
+from face_engine.embedding_cache import content_hash, model_key
+from face_engine.backends import create_backend
+from face_engine.trainer import TrainingWorker
+from face_engine.templates import select_templates
+import threading
 import joblib
-import pickle
 import numpy as np
 
 
 class Classifier:
     """
-    A classifier for encoding facial images and training a Support Vector Machine (SVM) model to recognize faces.
+    A classifier for encoding facial images and recognizing faces against the enrolled gallery.
+    The recognition backend is selected by cfg.recognizer.classifier (see face_engine.backends.BACKENDS): a kernel SVM
+    or a logistic regression that are retrained on enrollment, or a nearest-neighbour or nearest-centroid search over
+    the gallery that needs no training.
     Attributes:
         reco (Encoder): An encoder to generate facial embeddings.
-        names (list): A list of labels (user IDs) corresponding to the facial embeddings.
-        encodings (list): A list of facial embeddings.
-        clf (SVC): An SVM classifier with probability support.
+        gallery (Gallery): The facial embeddings as one float32 matrix with a parallel int64 array of user IDs.
+        store (EmbeddingStore): The append-only on-disk store the gallery is loaded from and saved to.
+        names (numpy.ndarray): The labels (user IDs) corresponding to the facial embeddings, a view on the gallery.
+        encodings (numpy.ndarray): The (N, D) float32 facial embeddings, a view on the gallery.
+        clf (SVCBackend | LinearBackend | NearestNeighbourBackend | CentroidBackend): The recognition backend.
+        embedding_cache (EmbeddingCache): The persistent embedding cache, or None when it is disabled.
+        model_version (int): The number of models trained since start-up; bumped on every swap.
+        trainer (TrainingWorker): The background worker that retrains the backend on request.
 
     Methods:
         __init__(): Initializes the classifier, loads existing embeddings and model if available.
         get_all_embeddings(): Generates embeddings for all faces in the database.
-        save_embeddings(): Saves the current embeddings and labels to a file.
+        encode_files(paths): Generates embeddings for image files through the persistent embedding cache.
+        add_embeddings(embeddings, user_id): Appends embeddings of a user to the gallery.
+        add_faces(faces, user_id, blobs): Enrolls cropped faces of a user straight from memory.
+        remove_user(user_id): Removes a user from recognition immediately, without retraining.
+        load_gallery(): Loads the gallery from the embedding store.
+        schedule_compaction(): Starts a background compaction once enough rows are removed.
+        compact(): Drops the removed rows from the gallery, the backend index and the store.
+        save_embeddings(): Appends the embeddings added since the last save to the store.
         get_user_embeddings(user_id): Generates embeddings for a specific user.
-        train(): Trains the SVM model using the current embeddings and labels.
+        train(): Trains a new backend on a snapshot of the gallery and swaps it in.
+        request_training(callback): Enqueues a retrain on the background worker and returns immediately.
+        score(embedding, k, users): Returns the k best matching users of a probe with their scores.
+        score_batch(embeddings, k, users): Returns the k best matching users of every probe with their scores.
+        predict(embedding): Returns the recognized user ID and its score.
     """
     
     def __init__(self):
-        self.reco = Encoder(Model=cfg.recognizer.model, Distance=cfg.recognizer.distance_type)
-        self.names = []
-        self.encodings = []
-        self.clf = SVC(probability=True)
-        if not os.path.isfile(cfg.recognizer.embedding_file_path):
-            if len(os.listdir(cfg.db.database)) != 0:
-                print(f'Not found: {cfg.recognizer.embedding_file_path} and {len(os.listdir(cfg.db.database))} records existing in Database,'
-                      f' start generating embeddings for existing faces')
-                self.get_all_embeddings()
-        else:
-            data = joblib.load(cfg.recognizer.embedding_file_path)
-            self.encodings = data['encodings']
-            self.names = data['labels']
-            print(f'Loaded Embeddings: {np.asarray(self.encodings).shape} and labels: {len(self.names)} belongs to : '
-                  f'{np.unique(np.asarray(self.names))} unique peoples')
+        self.reco = Encoder(Model=cfg.recognizer.model, Distance=cfg.recognizer.distance_type,
+                            SkipDetection=cfg.recognizer.skip_detection)
+        self.gallery = Gallery()
+        self.clf = create_backend(cfg.recognizer.classifier)
+        self.model_version = 0
+        self.trainer = TrainingWorker(self)
+        self._train_lock = threading.Lock()
+        self.embedding_cache = open_embedding_cache()
+        self.store = EmbeddingStore(cfg.recognizer.embedding_store_path, max_segments=cfg.recognizer.store_max_segments,
+                                    model_key=model_key())
+        self._stored = 0
+        self._lock = threading.RLock()
+        self._compaction = None
+        rebuilt = False
+        if self.store.stale():
+            print(f'[INFO] {cfg.recognizer.embedding_store_path} holds embeddings of {self.store.manifest["model_key"]}, '
+                  f're-encoding the faces with {model_key()}')
+            self.store.rewrite(np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=np.int64))
+            self.get_all_embeddings()
+            rebuilt = True
+        elif is_pending(self.store):
+            print(f'[INFO] resuming the unfinished build of {cfg.recognizer.embedding_store_path}')
+            self.get_all_embeddings()
+            rebuilt = True
+        elif self.store.exists():
+            self.load_gallery()
+            print(f'Loaded Embeddings: {self.encodings.shape} and labels: {len(self.names)} belongs to : '
+                  f'{np.unique(self.names)} unique peoples')
+        elif os.path.isfile(cfg.recognizer.embedding_file_path) and not cfg.recognizer.skip_detection:
+            # the legacy embeddings were encoded by DeepFace.represent, which detects the face again
+            print(f'[INFO] migrating {cfg.recognizer.embedding_file_path} to {cfg.recognizer.embedding_store_path}')
+            self.gallery = Gallery.from_dict(joblib.load(cfg.recognizer.embedding_file_path))
+            self.save_embeddings()
+            self.load_gallery()
+        elif len(os.listdir(cfg.db.database)) != 0:
+            print(f'Not found: {cfg.recognizer.embedding_store_path} and {len(os.listdir(cfg.db.database))} records existing in Database,'
+                  f' start generating embeddings for existing faces')
+            self.get_all_embeddings()
+            rebuilt = True
+
+        if self.clf.incremental:
+            self.clf.fit(self.gallery)
+        elif os.path.isfile(cfg.recognizer.model_path):
+            refit = rebuilt  # the saved model was fitted on embeddings encoded before
+            if not refit:
+                try:
+                    self.clf.load(cfg.recognizer.model_path, self.gallery)  # removed users stay removed on restart
+                except ValueError as e:
+                    print(e)
+                    refit = True
+            if refit and len(self.gallery.users()) > 1:
+                print(f'[INFO] refitting the {cfg.recognizer.classifier} backend on the gallery')
+                self.train()
 
-        if os.path.isfile(cfg.recognizer.model_path):
-            self.clf = joblib.load(cfg.recognizer.model_path)
+    @property
+    def encodings(self):
+        return self.gallery.embeddings
+
+    @property
+    def names(self):
+        return self.gallery.labels
 
     def get_all_embeddings(self):
         """
         Generates facial embeddings for all faces in the database.
-        Iterates through all user directories in the database, encodes each image, and stores the resulting embeddings
-        and labels. Saves the embeddings to a file.
-        """
-        print('[INFO] extracting encodings ....')
-        for ID in os.listdir(f'{cfg.db.database}'):
-            if os.path.isdir(f'{cfg.db.database}{ID}'):
-                print(f'[INFO] encoding {ID}')
-                for image in os.listdir(f'{cfg.db.database}{ID}'):
-                    try:
-                        face_encode = self.reco.encode(f'{cfg.db.database}{ID}/{image}')
-                        self.names.append(ID)
-                        self.encodings.append(face_encode)
-                    except Exception as e:
-                        print(f'[ERROR] {cfg.db.database}{ID}/{image} : {e}')
-        print(f'Generated Embeddings: {np.asarray(self.encodings).shape} and labels: {len(self.names)} belongs to : '
-              f'{np.unique(np.asarray(self.names))} unique peoples')
+        Encodes the users into the embedding store in this process (see face_engine.bootstrap), resuming an interrupted
+        run, and loads the gallery from it. Large databases should be encoded beforehand in parallel with
+        python -m face_engine.bootstrap; a process pool is never started while the classifier is being built.
+        """
+        print('[INFO] extracting encodings in process; run python -m face_engine.bootstrap first to encode in parallel')
+        bootstrap(self.store, workers=1, encoder=self.reco)
+        self.load_gallery()
+        print(f'Generated Embeddings: {self.encodings.shape} and labels: {len(self.names)} belongs to : '
+              f'{np.unique(self.names)} unique peoples')
+
+    def encode_files(self, paths):
+        """
+        Generates embeddings for image files, reusing the persistent embedding cache for content already encoded.
+        Args:
+            paths (list): The paths to the image files to encode.
+        Returns:
+            list: One float32 embedding per path in the same order, None for the files that could not be encoded.
+        """
+        embeddings = encode_files(self.reco, paths, self.embedding_cache)
+        if self.embedding_cache is not None:
+            print(f'[INFO] embedding cache: {self.embedding_cache.hits} hits | {self.embedding_cache.misses} misses')
+        return embeddings
+
+    def add_embeddings(self, embeddings, user_id):
+        """
+        Appends embeddings of a user to the gallery.
+        With cfg.recognizer.templates_per_user set, a user holding more embeddings than that is reduced to as many
+        templates (see face_engine.templates): only the rows of this user are recomputed, and the rows they replace
+        are tombstoned.
+        Args:
+            embeddings (list): The embeddings of the user, in any format returned by the Encoder.
+            user_id (int): The ID of the user the embeddings belong to.
+        """
+        if len(embeddings) != 0:
+            embeddings = np.stack([to_vector(embedding) for embedding in embeddings])
+            with self._lock:
+                limit = cfg.recognizer.templates_per_user
+                rows = self.gallery.rows_of([int(user_id)]) if limit else []
+                if limit and len(rows) + len(embeddings) > limit:
+                    if len(rows):  # an empty gallery has no dimension yet to concatenate with
+                        embeddings = np.concatenate([self.gallery.embeddings[rows], embeddings])
+                        self.save_embeddings()
+                        self.gallery.remove(int(user_id))
+                        self.clf.discard_rows(rows)
+                        self.store.delete(self.gallery.ids[rows])
+                    embeddings = select_templates(embeddings, limit, cfg.recognizer.template_policy)
+                self.gallery.add(embeddings, int(user_id))
+                self.clf.add(embeddings, np.full(len(embeddings), int(user_id)))
+            if limit:
+                self.schedule_compaction()
+
+    def add_faces(self, faces, user_id, blobs=None):
+        """
+        Enrolls cropped faces of a user straight from memory: encodes only these faces, in batches, and appends their
+        embeddings to the gallery and the store, without reading the user's folder back from disk.
+        With the embedding cache enabled, the embeddings are also cached under the hashes of the saved image bytes, so
+        a later rebuild from the face images (see get_all_embeddings) does not encode them again.
+        Args:
+            faces (list): The cropped BGR faces (numpy.ndarray) of the user.
+            user_id (int): The ID of the user the faces belong to.
+            blobs (list, optional): The encoded image bytes saved for each face, in the same order.
+        Returns:
+            int: The number of faces enrolled.
+        """
+        if len(faces) == 0:
+            return 0
+        embeddings = [None if face_encode is None else to_vector(face_encode)
+                      for face_encode in self.reco.encode_batch(faces, batch_size=cfg.recognizer.batch_size)]
+        if self.embedding_cache is not None and blobs is not None:
+            self.embedding_cache.put_many({content_hash(blob): face_encode for blob, face_encode in zip(blobs, embeddings)
+                                           if face_encode is not None})
+        embeddings = [face_encode for face_encode in embeddings if face_encode is not None]
+        print(f'[INFO] encoded {len(embeddings)} of {len(faces)} new faces of {user_id}')
+        self.add_embeddings(embeddings, user_id)
         self.save_embeddings()
+        return len(embeddings)
+
+    def remove_user(self, user_id):
+        """
+        Removes a user from recognition immediately, without retraining.
+        The rows of the user are tombstoned in the gallery, the backend and the store; they are dropped physically by
+        compact(), which runs in the background once cfg.recognizer.compaction_ratio of the gallery rows are removed.
+        Args:
+            user_id (int): The ID of the user to remove.
+        """
+        with self._lock:
+            self.save_embeddings()
+            rows = self.gallery.remove(int(user_id))
+            self.clf.remove(int(user_id), rows)
+            self.store.delete(self.gallery.ids[rows])
+        print(f'[INFO] removed {len(rows)} embeddings of {user_id}')
+        self.schedule_compaction()
+
+    def schedule_compaction(self):
+        """
+        Starts compact() on a background thread once cfg.recognizer.compaction_ratio of the gallery rows are removed.
+        """
+        ratio = self.gallery.deleted / max(len(self.gallery), 1)
+        if ratio >= cfg.recognizer.compaction_ratio and (self._compaction is None or not self._compaction.is_alive()):
+            self._compaction = threading.Thread(target=self.compact, name='gallery-compaction', daemon=True)
+            self._compaction.start()
+
+    def load_gallery(self):
+        """
+        Loads the gallery from the embedding store, memory-mapped, and applies the saved tombstones.
+        The store is merged into a single segment first: several segments would be concatenated into private arrays,
+        copying the whole gallery into every worker.
+        """
+        self.store.compact()
+        self.gallery = Gallery.from_arrays(*self.store.load())
+        self.gallery.remove_rows(np.flatnonzero(np.isin(self.gallery.ids, self.store.deleted())))
+        self._stored = len(self.gallery)
+
+    def compact(self):
+        """
+        Drops the removed rows physically: compacts the store, which drops the rows deleted by every worker and keeps
+        the rows they appended, reloads the gallery from it memory-mapped, renumbers the backend by store row ID and
+        swaps them in. Predictions keep using the previous gallery until the swap.
+        """
+        with self._lock:
+            if self.gallery.deleted == 0:
+                return
+            self.save_embeddings()
+            self.store.compact()
+            previous = self.gallery
+            gallery = Gallery.from_arrays(*self.store.load())  # shared with the other workers
+            gallery.remove_rows(np.flatnonzero(np.isin(gallery.ids, self.store.deleted())))
+            mapping = np.full(len(previous), -1, dtype=np.int64)
+            if len(gallery):
+                # store row IDs increase along the store, so the new row of every previous row is found by bisection
+                position = np.minimum(np.searchsorted(gallery.ids, previous.ids), len(gallery) - 1)
+                found = previous.alive & (gallery.ids[position] == previous.ids)
+                mapping[found] = position[found]
+            gone = set(previous.users().tolist()) - set(gallery.users().tolist())  # EX: removed by another worker
+            gallery.removed = (previous.removed | gone) - set(gallery.users().tolist())
+            clf = self.clf.compacted(gallery, mapping)
+            for user_id in gone:
+                clf.remove(user_id, np.empty(0, dtype=np.int64))
+            print(f'[INFO] compacted the gallery from {len(previous)} to {len(gallery)} embeddings')
+            self.gallery, self.clf, self._stored = gallery, clf, len(gallery)
+        if clf.incremental:
+            clf.save(cfg.recognizer.model_path)
 
     def save_embeddings(self):
         """
-        Saves the current facial embeddings and labels to a file.
-        Stores the encodings and labels as a dictionary in a pickle file specified by the configuration.
+        Appends the facial embeddings and labels added since the last save to the embedding store.
+        Only the new rows are written; calling it again without new rows writes nothing.
         """
-        data = {"encodings": self.encodings, "labels": self.names}
-        with open(cfg.recognizer.embedding_file_path, "wb") as f:
-            f.write(pickle.dumps(data))
+        with self._lock:
+            size = len(self.gallery)
+            if size > self._stored:
+                ids = self.store.append(self.encodings[self._stored:size], self.names[self._stored:size])
+                self.gallery.set_ids(self._stored, ids)
+                self._stored = size
 
     def get_user_embeddings(self, user_id):
         """
@@ -87,27 +283,83 @@ class Classifier:
         user_path = f'{cfg.db.database}{user_id}'
         if os.path.isdir(user_path):
             print(f'[INFO] encoding {user_id}')
-            for image in os.listdir(f'{cfg.db.database}{user_id}'):
-                try:
-                    face_encode = self.reco.encode(f'{cfg.db.database}{user_id}/{image}')
-                    self.names.append(user_id)
-                    self.encodings.append(face_encode)
-                except Exception as e:
-                    print(f'[ERROR] {cfg.db.database}{user_id}/{image} : {e}')
+            paths = [f'{cfg.db.database}{user_id}/{image}' for image in os.listdir(f'{cfg.db.database}{user_id}')]
+            embeddings = self.encode_files(paths)
+            self.add_embeddings([face_encode for face_encode in embeddings if face_encode is not None], user_id)
             self.save_embeddings()
         else:
             print(f'Error: no user found {user_id} in {user_path}')
 
     def train(self):
         """
-        Trains the SVM model using the current facial embeddings and labels.
-        Fits the SVM model to the embeddings, evaluates its performance, and saves the trained model to a file.
-        Also saves the embeddings to ensure they are up to date.
+        Trains a new backend on a snapshot of the current facial embeddings and labels, and swaps it in.
+        The new model is fitted and saved off to the side while the current one keeps serving predictions; it replaces
+        the saved model file with os.replace and self.clf with a single assignment, so readers never see a partially
+        trained or partially written model. Also saves the embeddings to ensure they are up to date.
         """
-        print('[INFO] training the model ....')
-        self.clf.fit(self.encodings, self.names)
-        print('[INFO] evaluating the model ....')
-        self.clf.score(self.encodings, self.names)
-        print('[INFO] saving the model ....')
-        joblib.dump(self.clf, cfg.recognizer.model_path)
-        self.save_embeddings()
+        with self._train_lock:
+            print('[INFO] training the model ....')
+            clf = create_backend(cfg.recognizer.classifier)
+            with self._lock:
+                gallery = self.gallery if clf.incremental else self.gallery.copy()
+            clf.fit(gallery)
+            print('[INFO] saving the model ....')
+            version_path = f'{cfg.recognizer.model_path}.{os.getpid()}.v{self.model_version + 1}'  # one per worker
+            clf.save(version_path)
+            if os.path.isfile(version_path):
+                os.replace(version_path, cfg.recognizer.model_path)
+                if not clf.incremental:
+                    clf.load(cfg.recognizer.model_path, gallery)  # serve from the mapped file, not the private fit
+            with self._lock:
+                for user_id in self.gallery.removed - gallery.removed:
+                    clf.remove(user_id, np.empty(0, dtype=np.int64))
+                self.clf = clf
+            self.model_version += 1
+            print(f'[INFO] model version {self.model_version} in use')
+            self.save_embeddings()
+
+    def request_training(self, callback=None):
+        """
+        Enqueues a retrain on the background worker and returns immediately. Requests made while a model is being
+        trained are coalesced into one more training run.
+        Args:
+            callback (callable, optional): Called after the new model is swapped in.
+        """
+        self.trainer.request(callback)
+
+    def score(self, embedding, k=1, users=None):
+        """
+        Scores a probe once and returns its k best matching users.
+        Args:
+            embedding (list | numpy.ndarray): The probe embedding, in any format returned by the Encoder.
+            k (int): The number of candidates.
+            users (set, optional): Restricts the candidates to these user IDs, EX: the users holding a permission.
+        Returns:
+            list: Up to k (user ID, score) pairs, best first; compare the scores with clf.threshold to accept a match.
+        """
+        return self.clf.score_batch(to_vector(embedding)[np.newaxis], k=k, users=users)[0]
+
+    def score_batch(self, embeddings, k=1, users=None):
+        """
+        Scores many probes in one backend call and returns the k best matching users of each.
+        Args:
+            embeddings (list): The probe embeddings, in any format returned by the Encoder.
+            k (int): The number of candidates per probe.
+            users (set, optional): Restricts the candidates to these user IDs.
+        Returns:
+            list: For every probe, up to k (user ID, score) pairs, best first.
+        """
+        if len(embeddings) == 0:
+            return []
+        return self.clf.score_batch(np.stack([to_vector(embedding) for embedding in embeddings]), k=k, users=users)
+
+    def predict(self, embedding):
+        """
+        Returns the recognized user ID and its score.
+        Args:
+            embedding (list | numpy.ndarray): The probe embedding, in any format returned by the Encoder.
+        Returns:
+            tuple: The predicted user ID and its score, or (None, 0.0) without any candidate.
+        """
+        candidates = self.score(embedding, k=1)
+        return candidates[0] if candidates else (None, 0.0)
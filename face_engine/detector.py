@@ -1,5 +1,7 @@
-from ultralytics import YOLO
 from config import cfg
+from face_engine import preprocess
+import numpy as np
+import threading
 import cv2
 
 
@@ -7,16 +9,36 @@ class Inference:
     """
     An inference class for running object detection using a YOLO model.
     Attributes:
-        model (YOLO): The YOLO model used for object detection.
+        model (YOLO | OnnxDetector): The YOLO model used for object detection, selected by cfg.detector.backend.
+        backend (str): The detector backend in use, either 'torch' or 'onnx'.
         names (list): A list of class names for detected objects.
+        cascade_sizes (list): The detector input sizes tried in order when cfg.detector.cascade is enabled.
+        cascade_stats (list): Per cascade stage counts of frames run and frames with a detection.
         COLORS (dict): A dictionary of colors for drawing bounding boxes and labels.
     Methods:
         __init__(): Initializes the Inference instance and loads the YOLO model.
         infer(frame): Runs the YOLO model on a given frame and processes the detection results.
+        infer_batch(frames): Runs the YOLO model on a list of frames in one forward pass.
+        detect(frame): Runs the YOLO model on a given frame without drawing and returns Detections.
+        detect_batch(frames): Runs the YOLO model on a list of frames without drawing and returns Detections.
+        detect_at(frames, size): Runs the YOLO model on a list of frames at a given input size.
+        cascade_hit_rates(): Reports the per-stage hit rates of the detection cascade.
+        render(frame, detections): Draws detections on a frame for debug output.
     """
     def __init__(self):
-        self.model = YOLO(cfg.detector.weight_file)
+        self.backend = cfg.detector.backend
+        if self.backend == 'onnx':
+            from face_engine.onnx_detector import OnnxDetector
+            self.model = OnnxDetector()
+        elif self.backend == 'torch':
+            from ultralytics import YOLO
+            self.model = YOLO(cfg.detector.weight_file)
+        else:
+            raise ValueError(f'[ERROR] {cfg.detector.backend} is not valid. please use either one of these: {["torch", "onnx"]}')
         self.names = ['face']
+        self.cascade_sizes = sorted((tuple(size) for size in cfg.detector.cascade_sizes), key=max)
+        self.cascade_stats = [{'size': size, 'frames': 0, 'hits': 0} for size in self.cascade_sizes]
+        self.lock = threading.Lock()
         self.COLORS = {'green': [64, 255, 64],
                        'blue': [255, 128, 0],
                        'coral': [0, 128, 255],
@@ -38,50 +60,192 @@ class Inference:
             tuple: A tuple containing the processed frame, list of bounding boxes, list of confidence scores,
                    and list of class IDs.
         """
-        
-        # Run the model
-        # frame_out, boxes, scores, names, class_ids = self.detector.infer(frame)
-        processed_boxes = []
-        processed_confidence = []
-        processed_class_id = []
-        names = []
-        results = self.model.predict(source=frame, conf=cfg.detector.OBJECTNESS_CONFIDANCE,
-                                     iou=cfg.detector.NMS_THRESHOLD,
-                                     classes=cfg.detector.classes,
-                                     device=cfg.detector.device)
-        for result in results:
-            boxes = result.boxes.xywh.tolist()  # box with xywh format, (N, 4)
-            class_ids = result.boxes.cls.tolist()  # cls, (N, 1)
-            confidences = result.boxes.conf.tolist()  # confidence score, (N, 1)
-            for i, box in enumerate(boxes):
-                class_id = int(class_ids[i])
-                names.append(self.names[class_id])
-                confidence = confidences[i]
-                w = box[2]
-                h = box[3]
-                x = box[0] - w / 2
-                y = box[1] - h / 2
-                p1, p2 = (int(x), int(y)), (int(x + w), int(y + h))
-                line_width = 3 or max(round(sum(frame.shape) / 2 * 0.003), 2)  # line width
-                color = self.COLORS[list(self.COLORS)[int(class_id) % len(self.COLORS)]]
-                if cfg.flags.render_detections:
-                    cv2.rectangle(frame, p1, p2, color, thickness=line_width, lineType=cv2.LINE_AA)
-                if cfg.flags.render_labels:
-                    label = "{}: {:.4f}".format(self.names[class_id], confidence)
-                    cv2.putText(frame, label, (int(x), int(y) - 10), cv2.FONT_HERSHEY_SIMPLEX, 2, color, line_width)
-
-                processed_boxes.append([x, y, w, h])
-                processed_confidence.append(confidence)
-                processed_class_id.append(class_id)
-
-        return frame, processed_boxes, processed_confidence, processed_class_id
+        return self.infer_batch([frame])[0]
+
+    def infer_batch(self, frames):
+        """
+        Runs the YOLO model on several frames in a single forward pass.
+        The frames are handed to the model as one batch, so N uploads cost one model invocation instead of N.
+        Args:
+            frames (list): A list of input images/frames (numpy.ndarray) for object detection.
+        Returns:
+            list: One (frame, boxes, scores, class_ids) tuple per input frame, in the same order as the input,
+                  where each tuple has the same layout as the return value of infer().
+        """
+        outputs = []
+        for frame, detections in zip(frames, self.detect_batch(frames)):
+            if cfg.flags.render_detections or cfg.flags.render_labels:
+                frame = self.render(frame, detections)
+            outputs.append((frame, detections.boxes.tolist(), detections.scores.tolist(),
+                            detections.class_ids.tolist()))
+        return outputs
+
+    def detect(self, frame):
+        """
+        Runs the YOLO model on a given frame without drawing anything on it.
+        Args:
+            frame (numpy.ndarray): The input image/frame for object detection. It is left untouched.
+        Returns:
+            Detections: The detected boxes, confidence scores and class IDs.
+        """
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames):
+        """
+        Runs the YOLO model on several frames in a single forward pass without drawing anything on them.
+        Each frame is cropped to cfg.detector.roi and letterboxed to cfg.detector.frame_resize first, and the boxes
+        are mapped back to the coordinates of the input frame.
+        With cfg.detector.cascade enabled, the frames are first run at the smallest of cfg.detector.cascade_sizes and
+        only the frames without any detection are re-run at the next size.
+        Args:
+            frames (list): A list of input images/frames (numpy.ndarray) for object detection.
+        Returns:
+            list: One Detections object per input frame, in the same order as the input.
+        """
+        if len(frames) == 0:
+            return []
+        if not cfg.detector.cascade:
+            return self.detect_at(frames, cfg.detector.frame_resize)
+
+        detections = [None] * len(frames)
+        pending = list(range(len(frames)))
+        for stage, size in enumerate(self.cascade_sizes):
+            stage_detections = self.detect_at([frames[i] for i in pending], size)
+            for i, item in zip(pending, stage_detections):
+                detections[i] = item
+            last_stage = stage == len(self.cascade_sizes) - 1
+            misses = [i for i, item in zip(pending, stage_detections) if len(item) == 0]
+            with self.lock:
+                self.cascade_stats[stage]['frames'] += len(pending)
+                self.cascade_stats[stage]['hits'] += len(pending) - len(misses)
+            if not misses or last_stage:
+                break
+            pending = misses
+        return detections
+
+    def detect_at(self, frames, size):
+        """
+        Runs the YOLO model on several frames at a given input size.
+        Args:
+            frames (list): A list of input images/frames (numpy.ndarray) for object detection.
+            size (tuple): The (height, width) the frames are letterboxed to.
+        Returns:
+            list: One Detections object per input frame, with boxes in the coordinates of the input frame.
+        """
+        prepared = [preprocess.prepare(frame, size) for frame in frames]
+        inputs = [padded for padded, _ in prepared]
+        if self.backend == 'onnx':
+            detections = self.model.detect_batch(inputs, imgsz=tuple(size))
+        else:
+            results = self.model.predict(source=inputs, conf=cfg.detector.OBJECTNESS_CONFIDANCE,
+                                         iou=cfg.detector.NMS_THRESHOLD,
+                                         classes=cfg.detector.classes,
+                                         device=cfg.detector.device,
+                                         imgsz=list(size))
+            detections = [Detections.from_result(result) for result in results]
+        return [Detections(preprocess.restore_boxes(item.boxes, meta), item.scores, item.class_ids)
+                for item, (_, meta) in zip(detections, prepared)]
+
+    def cascade_hit_rates(self):
+        """
+        Reports, per cascade stage, how many frames it ran on and how many of them it found a face in.
+        Returns:
+            list: One dict per stage with 'size', 'frames', 'hits' and 'hit_rate'.
+        """
+        with self.lock:
+            return [dict(stats, hit_rate=stats['hits'] / stats['frames'] if stats['frames'] else 0.0)
+                    for stats in self.cascade_stats]
+
+    def render(self, frame, detections):
+        """
+        Draws bounding boxes and labels for the given detections on the frame, according to cfg.flags.
+        This is meant for debug output only; the recognition path works on untouched frames.
+        Args:
+            frame (numpy.ndarray): The image/frame to draw on (modified in place).
+            detections (Detections): The detections to draw.
+        Returns:
+            numpy.ndarray: The frame with the detections drawn on it.
+        """
+        line_width = 3 or max(round(sum(frame.shape) / 2 * 0.003), 2)  # line width
+        for (x, y, w, h), confidence, class_id in zip(detections.boxes, detections.scores, detections.class_ids):
+            p1, p2 = (int(x), int(y)), (int(x + w), int(y + h))
+            color = self.COLORS[list(self.COLORS)[int(class_id) % len(self.COLORS)]]
+            if cfg.flags.render_detections:
+                cv2.rectangle(frame, p1, p2, color, thickness=line_width, lineType=cv2.LINE_AA)
+            if cfg.flags.render_labels:
+                label = "{}: {:.4f}".format(self.names[class_id], confidence)
+                cv2.putText(frame, label, (int(x), int(y) - 10), cv2.FONT_HERSHEY_SIMPLEX, 2, color, line_width)
+        return frame
+
+
+class Detections:
+    """
+    A compact container for the detections of a single frame.
+    Attributes:
+        boxes (numpy.ndarray): An (N, 4) float32 array of boxes in [x, y, w, h] format, (x, y) being the top-left corner.
+        scores (numpy.ndarray): An (N,) float32 array of confidence scores.
+        class_ids (numpy.ndarray): An (N,) int32 array of class IDs.
+    Methods:
+        from_result(result): Builds a Detections object from a YOLO result.
+        scaled(factor): Returns a copy of the detections with the boxes multiplied by factor.
+        crops(frame): Returns the image regions of the frame covered by the boxes.
+    """
+    __slots__ = ('boxes', 'scores', 'class_ids')
+
+    def __init__(self, boxes, scores, class_ids):
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+        self.class_ids = np.asarray(class_ids, dtype=np.int32).reshape(-1)
+
+    def __len__(self):
+        return len(self.boxes)
+
+    @classmethod
+    def from_result(cls, result):
+        """
+        Builds a Detections object from a YOLO result.
+        Args:
+            result (ultralytics.engine.results.Results): The YOLO result for a single frame.
+        Returns:
+            Detections: The detections of the frame with boxes converted to top-left [x, y, w, h].
+        """
+        boxes = result.boxes.xywh.cpu().numpy().astype(np.float32)  # box with center xywh format, (N, 4)
+        boxes[:, :2] -= boxes[:, 2:] / 2
+        return cls(boxes, result.boxes.conf.cpu().numpy(), result.boxes.cls.cpu().numpy())
+
+    def scaled(self, factor):
+        """
+        Returns a copy of the detections with the boxes multiplied by factor.
+        Used to map boxes found on a reduced decode back to the full-resolution image.
+        Args:
+            factor (float): The scale factor.
+        Returns:
+            Detections: The scaled detections.
+        """
+        return Detections(self.boxes * factor, self.scores, self.class_ids)
+
+    def crops(self, frame):
+        """
+        Returns the image regions of the frame covered by the boxes, clipped to the frame borders.
+        Args:
+            frame (numpy.ndarray): The frame the detections belong to.
+        Returns:
+            list: A list of numpy.ndarray views into the frame, one per box.
+        """
+        height, width = frame.shape[:2]
+        crops = []
+        for x, y, w, h in self.boxes.astype(np.int32):
+            x1, y1 = max(x, 0), max(y, 0)
+            x2, y2 = min(x + w, width), min(y + h, height)
+            crops.append(frame[y1: y2, x1: x2])
+        return crops
 
 
 if __name__ == '__main__':
     inference = Inference()
     im_path = f'../obama1.jpg'
     im = cv2.imread(im_path)
-    frame_out, boxes, _, _ = inference.infer(im)
-    for box in boxes:
-        x, y, w, h = [int(item) for item in box]
-        cv2.imwrite(f'../data/out.jpg', frame_out[y: y + h, x: x+w])
+    detections = inference.detect(im)
+    for cropped_face in detections.crops(im):
+        cv2.imwrite(f'../data/out.jpg', cropped_face)
+    cv2.imwrite(f'../data/out_rendered.jpg', inference.render(im.copy(), detections))
@@ -0,0 +1,94 @@
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+from config import cfg
+
+
+def content_hash(data):
+    """
+    Hashes the content of an image file.
+    Args:
+        data (bytes): The encoded image.
+    Returns:
+        str: The hex SHA-256 digest of the content.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def model_key():
+    """
+    Returns the key of the configured recognition model: its name, its version and the preprocessing mode, 'crop' when
+    cfg.recognizer.skip_detection embeds the crops directly and 'detect' when DeepFace detects the face again.
+    Embeddings made under different keys are not comparable.
+    Returns:
+        str: The model key, EX: 'Facenet512|1|detect'.
+    """
+    mode = 'crop' if cfg.recognizer.skip_detection else 'detect'
+    return f'{cfg.recognizer.model}|{cfg.recognizer.model_version}|{mode}'
+
+
+class EmbeddingCache:
+    """
+    An on-disk cache of face embeddings keyed by (image content hash, model key), stored in SQLite.
+    The model key combines the recognition model name, its version and the preprocessing mode, so changing any of them
+    misses the cache instead of returning embeddings from another model, and switching back hits again.
+    Attributes:
+        path (str): The SQLite database file.
+        model_key (str): The model key rows are stored and looked up under.
+        hits (int): The number of lookups answered from the cache.
+        misses (int): The number of lookups not found in the cache.
+    Methods:
+        __init__(path, model_key): Opens (or creates) the cache database.
+        get_many(hashes): Looks up embeddings by content hash.
+        put_many(items): Stores embeddings by content hash.
+        reset_stats(): Resets the hit and miss counters.
+    """
+    def __init__(self, path, model_key):
+        self.path = path
+        self.model_key = model_key
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS embeddings '
+                         '(hash TEXT, model TEXT, vector BLOB, PRIMARY KEY (hash, model))')
+        self._db.commit()
+
+    def get_many(self, hashes):
+        """
+        Looks up embeddings by content hash and counts hits and misses.
+        Args:
+            hashes (list): The content hashes to look up.
+        Returns:
+            dict: The float32 embeddings found, by content hash.
+        """
+        found = {}
+        unique = list(set(hashes))
+        with self._lock:
+            for start in range(0, len(unique), 500):
+                chunk = unique[start: start + 500]
+                rows = self._db.execute(f'SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN '
+                                        f'({",".join("?" * len(chunk))})', [self.model_key, *chunk]).fetchall()
+                found.update((key, np.frombuffer(vector, dtype=np.float32)) for key, vector in rows)
+            self.hits += sum(1 for key in hashes if key in found)
+            self.misses += sum(1 for key in hashes if key not in found)
+        return found
+
+    def put_many(self, items):
+        """
+        Stores embeddings by content hash.
+        Args:
+            items (dict): The embeddings to store, by content hash.
+        """
+        rows = [(key, self.model_key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()]
+        with self._lock:
+            self._db.executemany('INSERT OR REPLACE INTO embeddings (hash, model, vector) VALUES (?, ?, ?)', rows)
+            self._db.commit()
+
+    def reset_stats(self):
+        """
+        Resets the hit and miss counters.
+        """
+        self.hits = 0
+        self.misses = 0
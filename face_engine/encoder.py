@@ -1,26 +1,38 @@
 #! /usr/bin/env python
 # coding=utf-8
-from deepface.commons import distance
-from deepface import DeepFace
+from face_engine.registry import models
+from face_engine.similarity import pairwise_distances, top_k
+import numpy as np
+import cv2
 
 
 class Encoder:
     """
     An encoder class for generating facial embeddings and comparing faces using the DeepFace library.
+    DeepFace (and TensorFlow with it) is only imported once an embedding or a distance is computed, so processes that
+    import the encoder without recognising faces never load it.
     Attributes:
         model (str): The name of the facial recognition model to use.
         distance (str): The type of distance metric to use for face comparison.
+        skip_detection (bool): Whether images are treated as already-cropped faces and embedded directly.
     Methods:
-        __init__(Model, Distance): Initializes the Encoder with the specified model and distance metric.
+        __init__(Model, Distance, SkipDetection): Initializes the Encoder with the specified model and distance metric.
         encode(img): Generates an embedding for the given image using the specified model.
-        compare(face1, face2): Compares two facial embeddings using the specified distance metric.
+        encode_face(face): Generates a float32 embedding for an already-cropped face without running face detection.
+        encode_batch(images, batch_size): Generates embeddings for many images with one model call per batch.
+        get_net(): Returns the shared recognition model from the model registry.
+        preprocess(face): Resizes, pads and normalises a cropped face to the model input.
+        compare(face1, face2, face2_norms): Compares facial embeddings one-to-one, one-to-many or many-to-many.
+        nearest(probes, gallery, k, gallery_norms): Finds the k gallery embeddings closest to each probe.
     """
-    def __init__(self, Model='VGG-Face', Distance='Euclidean'):
+    def __init__(self, Model='VGG-Face', Distance='Euclidean', SkipDetection=False):
         """
         Initializes the Encoder instance with a specified model and distance metric.
         Args:
             Model (str): The name of the facial recognition model to use (default is 'VGG-Face').
             Distance (str): The type of distance metric to use for face comparison (default is 'Euclidean').
+            SkipDetection (bool): If True, encode() treats its input as an already-cropped face and skips the face
+                                  detection DeepFace.represent would run again (default is False).
         Raises:
             ValueError: If the specified model or distance metric is not valid.
         """
@@ -45,33 +57,137 @@ class Encoder:
             raise ValueError(f'[ERROR] {Model} is not valid. please use either one of these: {face_models}')
         else:
             self.model = Model
+        self.skip_detection = SkipDetection
 
     def encode(self, img):
         """
         Generates an embedding for the given image using the specified model.
         Args:
-            img (str): The path to the image file to encode.
+            img (str | numpy.ndarray): The path to the image file to encode, or the BGR image itself.
         Returns:
-            list: A list of embedding objects generated by the model.
+            list | numpy.ndarray: The embedding generated by DeepFace.represent, or a float32 vector when
+                                  skip_detection is enabled.
         """
-        embedding_objs = DeepFace.represent(img_path=img,
-                                            model_name=self.model, enforce_detection=False)
+        if self.skip_detection:
+            face = cv2.imread(img) if isinstance(img, str) else img
+            return self.encode_face(face)
+        from deepface import DeepFace
+
+        embedding_objs = DeepFace.represent(img_path=img, model_name=self.model, model=self.get_net(),
+                                            enforce_detection=False)
         return embedding_objs
 
-    def compare(self, face1, face2):
+    def encode_face(self, face):
         """
-        Compares two facial embeddings using the specified distance metric.
+        Generates an embedding for an already-cropped face, going straight to the recognition model.
+        Unlike DeepFace.represent, no face detection or alignment is run on the crop.
         Args:
-            face1 (numpy.ndarray): The first facial embedding.
-            face2 (numpy.ndarray): The second facial embedding.
+            face (numpy.ndarray): The cropped BGR face image.
         Returns:
-            float: The distance between the two embeddings based on the specified metric.
+            numpy.ndarray: The float32 embedding vector.
         """
-        if self.distance == 'Cosine':
-            dst = distance.findCosineDistance(face1, face2)
-        else:
-            dst = distance.findEuclideanDistance(face1, face2)
-        return dst
+        return self.get_net().predict_on_batch(self.preprocess(face)[np.newaxis])[0].astype(np.float32)
+
+    def encode_batch(self, images, batch_size=32):
+        """
+        Generates embeddings for many images, running the recognition model once per batch of preprocessed faces.
+        Images that cannot be read or encoded are reported and returned as None, so one bad file does not fail the
+        whole batch. Without skip_detection the images go through encode() one by one.
+        Args:
+            images (list): The paths to the image files to encode, or the BGR images themselves.
+            batch_size (int): The number of faces stacked into one model call (default is 32).
+        Returns:
+            list: One embedding per image in the same order as the input, None for the images that failed.
+        """
+        embeddings = [None] * len(images)
+        if not self.skip_detection:
+            for i, img in enumerate(images):
+                try:
+                    embeddings[i] = self.encode(img)
+                except Exception as e:
+                    print(f'[ERROR] {img if isinstance(img, str) else i} : {e}')
+            return embeddings
+
+        for start in range(0, len(images), batch_size):
+            indices, faces = [], []
+            for i in range(start, min(start + batch_size, len(images))):
+                img = images[i]
+                try:
+                    face = cv2.imread(img) if isinstance(img, str) else img
+                    if face is None or face.size == 0:
+                        raise ValueError('could not read the image')
+                    faces.append(self.preprocess(face))
+                    indices.append(i)
+                except Exception as e:
+                    print(f'[ERROR] {img if isinstance(img, str) else i} : {e}')
+            if faces:
+                predictions = self.get_net().predict(np.stack(faces), batch_size=batch_size).astype(np.float32)
+                for i, embedding in zip(indices, predictions):
+                    embeddings[i] = embedding
+        return embeddings
+
+    def get_net(self):
+        """
+        Returns the recognition model, shared with every other Encoder of the process through the model registry.
+        Returns:
+            keras.Model: The recognition model.
+        """
+        return models.get(self.model)
+
+    def preprocess(self, face):
+        """
+        Resizes a cropped face to the model input keeping its aspect ratio, pads it with black pixels and normalises
+        it the same way DeepFace.represent does after detection.
+        Args:
+            face (numpy.ndarray): The cropped BGR face image.
+        Returns:
+            numpy.ndarray: The (height, width, 3) float32 model input.
+        """
+        from deepface.commons import functions
 
+        input_x, input_y = functions.find_input_shape(self.get_net())
+        factor = min(input_y / face.shape[0], input_x / face.shape[1])
+        face = cv2.resize(face, (int(face.shape[1] * factor), int(face.shape[0] * factor)))
+        diff_0, diff_1 = input_y - face.shape[0], input_x - face.shape[1]
+        face = np.pad(face, ((diff_0 // 2, diff_0 - diff_0 // 2), (diff_1 // 2, diff_1 - diff_1 // 2), (0, 0)),
+                      'constant')
+        if face.shape[0:2] != (input_y, input_x):
+            face = cv2.resize(face, (input_x, input_y))
+        face = face.astype(np.float32) / 255
+        return functions.normalize_input(img=face, normalization='base')
 
+    def compare(self, face1, face2, face2_norms=None):
+        """
+        Compares facial embeddings using the specified distance metric.
+        Two single embeddings give one distance. If either side is a matrix of embeddings, all distances are computed
+        at once with a matrix product, EX: one probe against the whole gallery, or a batch of probes against it.
+        Args:
+            face1 (numpy.ndarray): The first facial embedding, or a (P, D) matrix of probe embeddings.
+            face2 (numpy.ndarray): The second facial embedding, or a (G, D) matrix of gallery embeddings.
+            face2_norms (numpy.ndarray, optional): The precomputed squared norms of face2, EX: Gallery.norms.
+        Returns:
+            float | numpy.ndarray: The distance between the two embeddings, or the (G,) / (P, G) distances.
+        """
+        if np.ndim(face1) == 1 and np.ndim(face2) == 1:
+            from deepface.commons import distance
+
+            if self.distance == 'Cosine':
+                dst = distance.findCosineDistance(face1, face2)
+            else:
+                dst = distance.findEuclideanDistance(face1, face2)
+            return dst
+        return pairwise_distances(face1, face2, metric=self.distance, gallery_norms=face2_norms)
 
+    def nearest(self, probes, gallery, k=1, gallery_norms=None):
+        """
+        Finds the k gallery embeddings closest to each probe.
+        Args:
+            probes (numpy.ndarray): A single (D,) probe or a (P, D) matrix of probes.
+            gallery (numpy.ndarray): The (G, D) gallery embeddings.
+            k (int): The number of neighbours to return per probe (default is 1).
+            gallery_norms (numpy.ndarray, optional): The precomputed squared norms of the gallery.
+        Returns:
+            tuple: The gallery row indices and distances of the neighbours, closest first; (k,) arrays for a single
+                   probe, (P, k) arrays otherwise.
+        """
+        return top_k(self.compare(probes, gallery, gallery_norms), k)
@@ -0,0 +1,285 @@
+import numpy as np
+from face_engine.similarity import squared_norms
+
+
+def to_vector(encoding):
+    """
+    Converts an embedding in any of the formats produced by DeepFace or the Encoder into a float32 vector.
+    Args:
+        encoding (list | dict | numpy.ndarray): A plain list of floats, a DeepFace embedding object (or a list of them,
+                                                of which the first face is used), or an array.
+    Returns:
+        numpy.ndarray: The (D,) float32 embedding.
+    """
+    if isinstance(encoding, list) and len(encoding) != 0 and isinstance(encoding[0], dict):
+        encoding = encoding[0]
+    if isinstance(encoding, dict):
+        encoding = encoding['embedding']
+    return np.asarray(encoding, dtype=np.float32).reshape(-1)
+
+
+class Gallery:
+    """
+    The recognition gallery: every enrolled face embedding as one row of a contiguous float32 matrix, with a parallel
+    int64 array of user IDs. Appends grow the backing buffers geometrically, so adding faces is amortised O(new rows).
+    Removing a user only clears the alive flag of their rows (a tombstone); queries must skip the rows that are not
+    alive, and copy() drops them physically.
+    Attributes:
+        dim (int): The embedding dimension, fixed by the first rows added.
+        size (int): The number of rows in the gallery.
+        embeddings (numpy.ndarray): The (size, dim) float32 embedding matrix.
+        labels (numpy.ndarray): The (size,) int64 user IDs.
+        norms (numpy.ndarray): The (size,) squared L2 norms of the embeddings.
+        alive (numpy.ndarray): The (size,) bool flags of the rows that were not removed.
+        ids (numpy.ndarray): The (size,) int64 EmbeddingStore row IDs of the rows, -1 for the rows not saved yet.
+        deleted (int): The number of removed rows still held by the gallery.
+        removed (set): The IDs of the removed users that were not enrolled again since.
+    Methods:
+        __init__(capacity): Initializes an empty gallery.
+        add(embeddings, labels, ids): Appends embeddings with their user IDs.
+        set_ids(start, ids): Records the store row IDs of rows once they are saved.
+        users(): Returns the IDs of the users with alive rows.
+        rows_of(user_ids): Returns the alive rows of some users.
+        remove(user_id): Marks every row of a user as removed.
+        remove_rows(rows): Marks rows as removed.
+        copy(): Returns an independent snapshot of the alive rows.
+        from_arrays(embeddings, labels, norms, ids): Builds a gallery on existing arrays without copying them.
+        from_dict(data): Builds a gallery from a saved {'encodings', 'labels'} dictionary.
+        to_dict(): Returns the gallery as an {'encodings', 'labels'} dictionary of arrays.
+    """
+    def __init__(self, capacity=1024):
+        self.dim = None
+        self.size = 0
+        self._capacity = capacity
+        self._embeddings = None
+        self._labels = np.empty(0, dtype=np.int64)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._alive = np.empty(0, dtype=bool)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._rows = None  # user ID -> row indices, built on the first removal
+        self.deleted = 0
+        self.removed = set()
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def embeddings(self):
+        """
+        numpy.ndarray: The (size, dim) float32 embedding matrix, as a view on the backing buffer.
+        """
+        if self._embeddings is None:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return self._embeddings[:self.size]
+
+    @property
+    def labels(self):
+        """
+        numpy.ndarray: The (size,) int64 user IDs, as a view on the backing buffer.
+        """
+        return self._labels[:self.size]
+
+    @property
+    def norms(self):
+        """
+        numpy.ndarray: The (size,) precomputed squared L2 norms of the embeddings, for distance computations.
+        """
+        return self._norms[:self.size]
+
+    @property
+    def alive(self):
+        """
+        numpy.ndarray: The (size,) bool flags of the rows that were not removed.
+        """
+        return self._alive[:self.size]
+
+    @property
+    def ids(self):
+        """
+        numpy.ndarray: The (size,) int64 EmbeddingStore row IDs of the rows, -1 for the rows not saved yet.
+        """
+        return self._ids[:self.size]
+
+    def _reserve(self, rows):
+        if self._embeddings is not None and rows <= len(self._embeddings):
+            return
+        capacity = max(rows, self._capacity, 2 * (0 if self._embeddings is None else len(self._embeddings)))
+        embeddings = np.empty((capacity, self.dim), dtype=np.float32)
+        labels = np.empty(capacity, dtype=np.int64)
+        norms = np.empty(capacity, dtype=np.float32)
+        alive = np.empty(capacity, dtype=bool)
+        ids = np.empty(capacity, dtype=np.int64)
+        embeddings[:self.size] = self.embeddings
+        labels[:self.size] = self.labels
+        norms[:self.size] = self.norms
+        alive[:self.size] = self.alive
+        ids[:self.size] = self.ids
+        self._embeddings, self._labels, self._norms, self._alive, self._ids = embeddings, labels, norms, alive, ids
+
+    def add(self, embeddings, labels, ids=None):
+        """
+        Appends embeddings with their user IDs.
+        Args:
+            embeddings (numpy.ndarray): An (N, D) array, or a single (D,) embedding.
+            labels (int | numpy.ndarray): One user ID for all rows, or an (N,) array of user IDs.
+            ids (numpy.ndarray, optional): The (N,) store row IDs of rows already saved, -1 (not saved) by default.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim == 1:
+            embeddings = embeddings[np.newaxis]
+        if len(embeddings) == 0:
+            return
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+        elif embeddings.shape[1] != self.dim:
+            raise ValueError(f'[ERROR] embedding dimension {embeddings.shape[1]} does not match the gallery: {self.dim}')
+        labels = np.broadcast_to(np.asarray(labels, dtype=np.int64), (len(embeddings),))
+        self._reserve(self.size + len(embeddings))
+        self._embeddings[self.size: self.size + len(embeddings)] = embeddings
+        self._labels[self.size: self.size + len(embeddings)] = labels
+        self._norms[self.size: self.size + len(embeddings)] = squared_norms(embeddings)
+        self._alive[self.size: self.size + len(embeddings)] = True
+        self._ids[self.size: self.size + len(embeddings)] = -1 if ids is None else ids
+        if self._rows is not None:
+            for user_id in np.unique(labels).tolist():
+                self._rows.setdefault(user_id, []).extend((self.size + np.flatnonzero(labels == user_id)).tolist())
+        self.removed.difference_update(np.unique(labels).tolist())
+        self.size += len(embeddings)
+
+    def set_ids(self, start, ids):
+        """
+        Records the store row IDs of the rows start to start + len(ids), once they are saved to the store.
+        Args:
+            start (int): The first row.
+            ids (numpy.ndarray): The row IDs returned by EmbeddingStore.append().
+        """
+        self._ids[start: start + len(ids)] = ids
+
+    def _user_rows(self):
+        if self._rows is None:
+            order = np.argsort(self.labels, kind='stable')
+            users, starts = np.unique(self.labels[order], return_index=True)
+            self._rows = {user: rows.tolist() for user, rows in zip(users.tolist(), np.split(order, starts[1:]))}
+        return self._rows
+
+    def users(self):
+        """
+        Returns the IDs of the users with alive rows.
+        Returns:
+            numpy.ndarray: The sorted int64 user IDs.
+        """
+        return np.unique(self.labels[self.alive])
+
+    def rows_of(self, user_ids):
+        """
+        Returns the alive rows of some users, EX: to search only the users holding a permission.
+        Args:
+            user_ids (iterable): The IDs of the users.
+        Returns:
+            numpy.ndarray: The sorted indices of their alive rows.
+        """
+        rows = self._user_rows()
+        selected = [rows[user_id] for user_id in user_ids if user_id in rows]
+        if not selected:
+            return np.empty(0, dtype=np.int64)
+        selected = np.sort(np.concatenate(selected).astype(np.int64))
+        return selected[self._alive[selected]]
+
+    def remove(self, user_id):
+        """
+        Marks every row of a user as removed, in O(rows of the user) once the user index is built.
+        Args:
+            user_id (int): The ID of the user to remove.
+        Returns:
+            numpy.ndarray: The indices of the rows that were removed by this call.
+        """
+        rows = np.asarray(self._user_rows().pop(int(user_id), []), dtype=np.int64)
+        rows = rows[self._alive[rows]]
+        self._alive[rows] = False
+        self.deleted += len(rows)
+        self.removed.add(int(user_id))
+        return rows
+
+    def remove_rows(self, rows):
+        """
+        Marks rows as removed, EX: the tombstones saved in an EmbeddingStore. Users left without alive rows are
+        added to the removed users.
+        Args:
+            rows (numpy.ndarray): The indices of the rows to remove.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        rows = rows[rows < self.size]
+        if len(rows) == 0:
+            return
+        rows = rows[self._alive[rows]]
+        self._alive[rows] = False
+        self.deleted += len(rows)
+        self.removed.update(set(self.labels[rows].tolist()) - set(self.labels[self.alive].tolist()))
+        self._rows = None
+
+    def copy(self):
+        """
+        Returns an independent snapshot of the alive rows, unaffected by later changes, EX: to train on in the
+        background or to compact the gallery.
+        Returns:
+            Gallery: A gallery holding a copy of the current alive rows and the removed users.
+        """
+        size, embeddings, labels, alive, ids = self.size, self._embeddings, self._labels, self._alive, self._ids
+        gallery = Gallery(capacity=max(size, 1))
+        gallery.dim = self.dim
+        if size != 0:
+            alive = alive[:size].copy()
+            gallery.add(embeddings[:size][alive], labels[:size][alive], ids[:size][alive])
+        gallery.removed = set(self.removed)
+        return gallery
+
+    @classmethod
+    def from_arrays(cls, embeddings, labels, norms=None, ids=None):
+        """
+        Builds a gallery on existing arrays without copying them, EX: read-only memory maps of an EmbeddingStore.
+        The arrays are only read; the first append moves the rows into a private, growable buffer.
+        Args:
+            embeddings (numpy.ndarray): The (N, D) float32 embeddings.
+            labels (numpy.ndarray): The (N,) int64 user IDs.
+            norms (numpy.ndarray, optional): The (N,) squared L2 norms, computed when not given.
+            ids (numpy.ndarray, optional): The (N,) store row IDs, -1 (not saved) when not given.
+        Returns:
+            Gallery: The gallery over the given rows.
+        """
+        gallery = cls()
+        if embeddings is None or len(embeddings) == 0:
+            return gallery
+        gallery.dim = embeddings.shape[1]
+        gallery.size = len(embeddings)
+        gallery._embeddings = embeddings
+        gallery._labels = labels
+        gallery._norms = squared_norms(embeddings) if norms is None else norms
+        gallery._alive = np.ones(len(embeddings), dtype=bool)
+        gallery._ids = np.full(len(embeddings), -1, dtype=np.int64) if ids is None else ids
+        return gallery
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Builds a gallery from a saved {'encodings', 'labels'} dictionary.
+        Older embedding files holding lists of DeepFace embedding objects and string user IDs are converted.
+        Args:
+            data (dict): The saved encodings and labels.
+        Returns:
+            Gallery: The gallery holding the saved rows.
+        """
+        gallery = cls()
+        encodings = data['encodings']
+        if not isinstance(encodings, np.ndarray):
+            encodings = [to_vector(encoding) for encoding in encodings]
+        if len(encodings) != 0:
+            gallery.add(np.asarray(encodings, dtype=np.float32), np.asarray(data['labels']).astype(np.int64))
+        return gallery
+
+    def to_dict(self):
+        """
+        Returns the gallery as an {'encodings', 'labels'} dictionary of arrays.
+        Returns:
+            dict: The (size, dim) float32 encodings and (size,) int64 labels.
+        """
+        return {"encodings": np.ascontiguousarray(self.embeddings), "labels": np.ascontiguousarray(self.labels)}
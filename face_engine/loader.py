@@ -0,0 +1,91 @@
+import threading
+import time
+
+
+class LazyModel:
+    """
+    Defers building a model until it is first used, or builds it ahead of time on a background thread.
+    Attribute access is forwarded to the built model, so a LazyModel can be used wherever the model itself is used;
+    the first access blocks until the model is ready.
+    Attributes:
+        name (str): The name the model is reported under.
+        factory (callable): Builds the model.
+        warmup (callable): Optional callable run once on the freshly built model, EX: an inference on a dummy frame.
+        state (str): One of 'not_loaded', 'loading', 'ready' or 'failed'.
+        error (str): The error message of the last failed load, if any.
+        load_time (float): Seconds it took to build and warm up the model.
+    Methods:
+        __init__(name, factory, warmup): Initializes the LazyModel without building the model.
+        get(): Returns the model, building it first if needed.
+        load_async(): Starts building the model on a background thread.
+        status(): Returns the load state of the model.
+    """
+    def __init__(self, name, factory, warmup=None):
+        self.name = name
+        self.factory = factory
+        self.warmup = warmup
+        self.state = 'not_loaded'
+        self.error = None
+        self.load_time = None
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, item):
+        return getattr(self.get(), item)
+
+    def get(self):
+        """
+        Returns the model, building it first if needed. Concurrent callers wait for a single build.
+        Returns:
+            object: The model built by factory.
+        """
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._load()
+        return self._instance
+
+    def _load(self):
+        self.state = 'loading'
+        start = time.monotonic()
+        try:
+            instance = self.factory()
+            if self.warmup is not None:
+                self.warmup(instance)
+        except Exception as e:
+            self.state = 'failed'
+            self.error = str(e)
+            raise
+        self.load_time = time.monotonic() - start
+        self.error = None
+        self._instance = instance
+        self.state = 'ready'
+        print(f'[INFO] {self.name} ready in {self.load_time:.2f}s')
+
+    def load_async(self):
+        """
+        Starts building the model on a daemon thread, so the caller is not blocked.
+        Returns:
+            threading.Thread: The thread building the model.
+        """
+        def load():
+            try:
+                self.get()
+            except Exception as e:
+                print(f'[ERROR] loading {self.name} : {e}')
+
+        thread = threading.Thread(target=load, name=f'load-{self.name}', daemon=True)
+        thread.start()
+        return thread
+
+    def status(self):
+        """
+        Returns the load state of the model.
+        Returns:
+            dict: A dictionary containing 'state', 'load_time' and 'error'.
+        """
+        return {
+            'state': self.state,
+            'load_time': self.load_time,
+            'error': self.error
+        }
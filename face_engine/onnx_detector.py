@@ -0,0 +1,128 @@
+import os
+import shutil
+import numpy as np
+from config import cfg
+from face_engine.detector import Detections
+from face_engine.preprocess import letterbox
+
+
+def non_max_suppression(boxes, scores, iou_threshold, max_det=300):
+    """
+    Greedy non-maximum suppression.
+    Args:
+        boxes (numpy.ndarray): An (N, 4) array of boxes in [x1, y1, x2, y2] format.
+        scores (numpy.ndarray): An (N,) array of confidence scores.
+        iou_threshold (float): Boxes overlapping a kept box by more than this IoU are dropped.
+        max_det (int): The maximum number of boxes to keep.
+    Returns:
+        numpy.ndarray: The indices of the kept boxes, ordered by decreasing score.
+    """
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0 and len(keep) < max_det:
+        i = order[0]
+        keep.append(i)
+        xx1 = np.maximum(boxes[i, 0], boxes[order[1:], 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[order[1:], 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[order[1:], 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[order[1:], 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / (areas[i] + areas[order[1:]] - inter + 1e-9)
+        order = order[1:][iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+class OnnxDetector:
+    """
+    Runs the YOLO face detector through ONNX Runtime instead of PyTorch.
+    The ONNX graph is exported once from cfg.detector.weight_file and reused afterwards. Pre-processing, box decoding
+    and NMS are done here so the results follow the same Detections contract as the PyTorch backend.
+    Attributes:
+        session (onnxruntime.InferenceSession): The ONNX Runtime session running the detector.
+        input_name (str): The name of the model input.
+        imgsz (tuple): The (height, width) the frames are letterboxed to.
+        num_classes (int): The number of classes predicted by the model.
+    Methods:
+        __init__(num_classes): Exports the model if needed and creates the ONNX Runtime session.
+        export(): Exports cfg.detector.weight_file to cfg.detector.onnx_file.
+        detect_batch(frames): Runs the detector on a list of frames in one forward pass.
+    """
+    def __init__(self, num_classes=1):
+        import onnxruntime as ort
+
+        if not os.path.isfile(cfg.detector.onnx_file):
+            self.export()
+        options = ort.SessionOptions()
+        if cfg.detector.onnx_threads:
+            options.intra_op_num_threads = cfg.detector.onnx_threads
+        self.session = ort.InferenceSession(cfg.detector.onnx_file, sess_options=options,
+                                            providers=cfg.detector.onnx_providers)
+        self.input_name = self.session.get_inputs()[0].name
+        self.imgsz = tuple(cfg.detector.frame_resize)
+        self.num_classes = num_classes
+
+    @staticmethod
+    def export():
+        """
+        Exports cfg.detector.weight_file to cfg.detector.onnx_file with dynamic batch and input size.
+        """
+        from ultralytics import YOLO
+        print(f'[INFO] exporting {cfg.detector.weight_file} to {cfg.detector.onnx_file} ....')
+        exported = YOLO(cfg.detector.weight_file).export(format='onnx', dynamic=True, imgsz=cfg.detector.frame_resize)
+        if os.path.abspath(exported) != os.path.abspath(cfg.detector.onnx_file):
+            shutil.move(exported, cfg.detector.onnx_file)
+
+    def detect_batch(self, frames, imgsz=None):
+        """
+        Runs the detector on a list of frames in one forward pass.
+        Args:
+            frames (list): A list of input images/frames (numpy.ndarray).
+            imgsz (tuple, optional): The (height, width) to letterbox to, defaults to cfg.detector.frame_resize.
+        Returns:
+            list: One Detections object per input frame, with boxes in the coordinates of the input frame.
+        """
+        if len(frames) == 0:
+            return []
+        imgsz = imgsz or self.imgsz
+        # like ultralytics, only use minimal (stride) padding when every frame in the batch has the same shape
+        auto = len(set(frame.shape for frame in frames)) == 1
+        batch, meta = [], []
+        for frame in frames:
+            padded, ratio, pad = letterbox(frame, imgsz, auto=auto)
+            batch.append(padded)
+            meta.append((ratio, pad, frame.shape[:2]))
+        blob = np.stack(batch)[..., ::-1].transpose(0, 3, 1, 2)  # BGR to RGB, BHWC to BCHW
+        blob = np.ascontiguousarray(blob, dtype=np.float32) / 255.0
+        outputs = self.session.run(None, {self.input_name: blob})[0]
+        return [self.decode(output, *item) for output, item in zip(outputs, meta)]
+
+    def decode(self, output, ratio, pad, shape):
+        """
+        Decodes the raw output of one frame into Detections.
+        Args:
+            output (numpy.ndarray): The (4 + num_classes + extra, anchors) model output for the frame.
+            ratio (float): The letterbox resize ratio.
+            pad (tuple): The letterbox (left, top) padding.
+            shape (tuple): The (height, width) of the original frame.
+        Returns:
+            Detections: The detections in original frame coordinates.
+        """
+        output = output.T
+        class_scores = output[:, 4: 4 + self.num_classes]
+        class_ids = class_scores.argmax(1)
+        scores = class_scores[np.arange(len(class_scores)), class_ids]
+        mask = (scores >= cfg.detector.OBJECTNESS_CONFIDANCE) & np.isin(class_ids, cfg.detector.classes)
+        centers, scores, class_ids = output[mask, :4], scores[mask], class_ids[mask]
+
+        xyxy = np.empty_like(centers)
+        xyxy[:, :2] = centers[:, :2] - centers[:, 2:] / 2
+        xyxy[:, 2:] = centers[:, :2] + centers[:, 2:] / 2
+        # offset boxes per class so NMS never suppresses across classes
+        keep = non_max_suppression(xyxy + class_ids[:, None] * 4096, scores, cfg.detector.NMS_THRESHOLD)
+        xyxy, scores, class_ids = xyxy[keep], scores[keep], class_ids[keep]
+
+        xyxy[:, [0, 2]] = ((xyxy[:, [0, 2]] - pad[0]) / ratio).clip(0, shape[1])
+        xyxy[:, [1, 3]] = ((xyxy[:, [1, 3]] - pad[1]) / ratio).clip(0, shape[0])
+        boxes = np.concatenate([xyxy[:, :2], xyxy[:, 2:] - xyxy[:, :2]], axis=1)
+        return Detections(boxes, scores, class_ids)
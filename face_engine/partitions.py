@@ -0,0 +1,75 @@
+import threading
+import time
+
+
+class PermissionPartitions:
+    """
+    The gallery users partitioned by permission level, so recognition for a restricted door only searches the users
+    that may pass it. A partition is loaded from the database on first use and then kept up to date by on_change(),
+    registered as a permission listener (see services.permission_service.add_permission_listener). Listeners only
+    see the changes made through their own process, so a partition is also reloaded once it is older than ttl
+    seconds, bounding how long a permission granted through another worker goes unseen.
+    Attributes:
+        loader (callable): Returns the IDs of the users holding a permission level, EX: get_users_with_permission.
+        ttl (float): Seconds a loaded partition is used before it is reloaded; 0 reloads it on every use.
+    Methods:
+        __init__(loader, ttl): Initializes the partitions, none is loaded yet.
+        users(permission_level): Returns the IDs of the users holding a permission level.
+        on_change(user_id, permission_level, granted): Applies a granted or revoked permission.
+        remove_user(user_id): Removes a user from every partition.
+        clear(): Drops every loaded partition.
+    """
+    def __init__(self, loader, ttl=10):
+        self.loader = loader
+        self.ttl = ttl
+        self._partitions = {}
+        self._expires = {}
+        self._lock = threading.Lock()
+
+    def users(self, permission_level):
+        """
+        Returns the IDs of the users holding a permission level, loading the partition on first use or once expired.
+        Args:
+            permission_level (str): The permission level.
+        Returns:
+            frozenset: The IDs of the users holding the permission level.
+        """
+        with self._lock:
+            if permission_level not in self._partitions or self._expires[permission_level] <= time.monotonic():
+                self._partitions[permission_level] = set(int(user_id) for user_id in self.loader(permission_level))
+                self._expires[permission_level] = time.monotonic() + self.ttl
+            return frozenset(self._partitions[permission_level])
+
+    def on_change(self, user_id, permission_level, granted):
+        """
+        Applies a granted or revoked permission to the loaded partitions.
+        Args:
+            user_id (int): The ID of the user.
+            permission_level (str): The permission level, or None when every permission of the user was revoked.
+            granted (bool): True if the permission was granted, False if it was revoked.
+        """
+        with self._lock:
+            if permission_level is None:
+                for partition in self._partitions.values():
+                    partition.discard(int(user_id))
+            elif permission_level in self._partitions:
+                if granted:
+                    self._partitions[permission_level].add(int(user_id))
+                else:
+                    self._partitions[permission_level].discard(int(user_id))
+
+    def remove_user(self, user_id):
+        """
+        Removes a user from every partition, EX: when the user is deleted.
+        Args:
+            user_id (int): The ID of the user.
+        """
+        self.on_change(user_id, None, False)
+
+    def clear(self):
+        """
+        Drops every loaded partition; they are loaded again on next use.
+        """
+        with self._lock:
+            self._partitions.clear()
+            self._expires.clear()
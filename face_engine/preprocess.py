@@ -0,0 +1,151 @@
+import struct
+import numpy as np
+import cv2
+from config import cfg
+
+
+ROTATIONS = {90: cv2.ROTATE_90_CLOCKWISE, 180: cv2.ROTATE_180, 270: cv2.ROTATE_90_COUNTERCLOCKWISE}
+REDUCED_FLAGS = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4,
+                 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+
+def jpeg_size(blob):
+    """
+    Reads the width and height of a JPEG image from its header without decoding it.
+    Args:
+        blob (bytes): The encoded image.
+    Returns:
+        tuple: The (width, height) of the image, or None if the blob is not a JPEG or has no frame header.
+    """
+    if blob[:2] != b'\xff\xd8':
+        return None
+    i = 2
+    while i + 9 < len(blob):
+        if blob[i] != 0xFF:
+            return None
+        marker = blob[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        length = struct.unpack('>H', blob[i + 2: i + 4])[0]
+        # SOF0 - SOF15 carry the frame size, except DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>HH', blob[i + 5: i + 9])
+            return width, height
+        i += 2 + length
+    return None
+
+
+def reduction_factor(size):
+    """
+    Picks the largest JPEG decode reduction (1, 2, 4 or 8) that keeps the detection input at least as large as
+    the largest size the detector runs at, taking the configured region of interest into account.
+    Args:
+        size (tuple): The (width, height) of the full-resolution image.
+    Returns:
+        int: The reduction factor.
+    """
+    x1, y1, x2, y2 = cfg.detector.roi or (0, 0, 1, 1)
+    long_side = max(size[0] * (x2 - x1), size[1] * (y2 - y1))
+    sizes = cfg.detector.cascade_sizes if cfg.detector.cascade else [cfg.detector.frame_resize]
+    target = max(max(item) for item in sizes)
+    for factor in (8, 4, 2):
+        if long_side / factor >= target:
+            return factor
+    return 1
+
+
+def decode_image(blob, reduce=True):
+    """
+    Decodes an uploaded image, at a reduced scale when it is a JPEG much larger than the detector input.
+    Applies cfg.detector.rotate_frame, so the full-resolution and reduced decodes always share the same orientation.
+    Args:
+        blob (bytes): The encoded image.
+        reduce (bool): Whether a reduced decode is allowed; cfg.detector.reduced_decode must also be enabled.
+    Returns:
+        tuple: The decoded image (None if the blob cannot be decoded) and the factor its coordinates must be
+               multiplied by to get back to full resolution.
+    """
+    factor = 1
+    if reduce and cfg.detector.reduced_decode:
+        size = jpeg_size(blob)
+        if size is not None:
+            factor = reduction_factor(size)
+    image = cv2.imdecode(np.frombuffer(blob, np.uint8), REDUCED_FLAGS[factor])
+    if image is not None and cfg.detector.rotate_frame:
+        image = cv2.rotate(image, ROTATIONS[cfg.detector.rotate_frame])
+    return image, factor
+
+
+def crop_roi(frame):
+    """
+    Crops a frame to cfg.detector.roi, given as (x1, y1, x2, y2) fractions of the frame size.
+    Args:
+        frame (numpy.ndarray): The input image/frame.
+    Returns:
+        tuple: The cropped frame (a view) and the (x, y) offset of the crop within the frame.
+    """
+    if not cfg.detector.roi:
+        return frame, (0, 0)
+    height, width = frame.shape[:2]
+    x1, y1, x2, y2 = cfg.detector.roi
+    left, top = int(x1 * width), int(y1 * height)
+    return frame[top: int(y2 * height), left: int(x2 * width)], (left, top)
+
+
+def letterbox(frame, new_shape, auto=False, stride=32, color=(114, 114, 114)):
+    """
+    Resizes a frame keeping its aspect ratio and pads it to the requested shape, the way ultralytics does.
+    Args:
+        frame (numpy.ndarray): The input image/frame.
+        new_shape (tuple): The target (height, width).
+        auto (bool): If True, only pad up to the next multiple of stride instead of the full target shape.
+        stride (int): The model stride used when auto is True.
+        color (tuple): The padding colour.
+    Returns:
+        tuple: The letterboxed frame, the resize ratio and the (left, top) padding.
+    """
+    height, width = frame.shape[:2]
+    ratio = min(new_shape[0] / height, new_shape[1] / width)
+    new_unpad = int(round(width * ratio)), int(round(height * ratio))
+    dw, dh = new_shape[1] - new_unpad[0], new_shape[0] - new_unpad[1]
+    if auto:
+        dw, dh = np.mod(dw, stride), np.mod(dh, stride)
+    dw /= 2
+    dh /= 2
+    if (width, height) != new_unpad:
+        frame = cv2.resize(frame, new_unpad, interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    frame = cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return frame, ratio, (left, top)
+
+
+def prepare(frame, new_shape):
+    """
+    Runs the detector pre-processing on a frame: region of interest crop followed by a letterbox to new_shape.
+    Args:
+        frame (numpy.ndarray): The input image/frame.
+        new_shape (tuple): The (height, width) the detector runs at.
+    Returns:
+        tuple: The letterboxed frame and the (ratio, pad, offset, shape) needed by restore_boxes().
+    """
+    roi, offset = crop_roi(frame)
+    padded, ratio, pad = letterbox(roi, new_shape)
+    return padded, (ratio, pad, offset, roi.shape[:2])
+
+
+def restore_boxes(boxes, meta):
+    """
+    Maps [x, y, w, h] boxes from letterboxed detector coordinates back to the frame given to prepare().
+    Args:
+        boxes (numpy.ndarray): An (N, 4) array of boxes in letterboxed coordinates.
+        meta (tuple): The (ratio, pad, offset, shape) returned by prepare().
+    Returns:
+        numpy.ndarray: An (N, 4) float32 array of boxes in frame coordinates.
+    """
+    ratio, pad, offset, shape = meta
+    xyxy = np.concatenate([boxes[:, :2], boxes[:, :2] + boxes[:, 2:]], axis=1)
+    xyxy[:, [0, 2]] = ((xyxy[:, [0, 2]] - pad[0]) / ratio).clip(0, shape[1]) + offset[0]
+    xyxy[:, [1, 3]] = ((xyxy[:, [1, 3]] - pad[1]) / ratio).clip(0, shape[0]) + offset[1]
+    return np.concatenate([xyxy[:, :2], xyxy[:, 2:] - xyxy[:, :2]], axis=1).astype(np.float32)
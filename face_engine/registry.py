@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+from config import cfg
+
+
+# weight files DeepFace 0.0.75 expects under <DEEPFACE_HOME>/.deepface/weights/ for each model
+WEIGHT_FILES = {
+    "VGG-Face": "vgg_face_weights.h5",
+    "Facenet": "facenet_weights.h5",
+    "Facenet512": "facenet512_weights.h5",
+    "OpenFace": "openface_weights.h5",
+    "DeepFace": "VGGFace2_DeepFace_weights_val-0.9034.h5",
+    "DeepID": "deepid_keras_weights.h5",
+    "ArcFace": "arcface_weights.h5",
+    "Dlib": "dlib_face_recognition_resnet_model_v1.dat",
+    "SFace": "face_recognition_sface_2021dec.onnx",
+}
+
+
+def resident_memory():
+    """
+    Returns the resident set size of the current process.
+    Returns:
+        int: The RSS in bytes, or None where /proc is not available.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def proportional_memory():
+    """
+    Returns the memory of the current process with shared pages split between the processes mapping them.
+    Returns:
+        dict: The 'rss', 'pss' (proportional set size) and 'uss' (private pages only) in bytes, or None where
+              /proc/self/smaps_rollup is not available.
+    """
+    fields = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    fields[parts[0].rstrip(':')] = int(parts[1]) * 1024
+    except OSError:
+        return None
+    return {'rss': fields.get('Rss'), 'pss': fields.get('Pss'),
+            'uss': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)}
+
+
+class ModelRegistry:
+    """
+    Builds each face recognition model once per process and shares it between all Encoder instances.
+    When a weights directory is configured, the weights are loaded from it and a missing file is an error instead of
+    a download.
+    Attributes:
+        weights_dir (str): The directory used as DEEPFACE_HOME, or None to keep the DeepFace default.
+        models (dict): The built models by name.
+        load_stats (dict): Load time, weight memory and RSS growth of each built model by name.
+    Methods:
+        __init__(weights_dir): Initializes an empty registry.
+        get(name): Returns the model, building it on first use.
+        preload(names): Builds the given models ahead of the first request.
+        stats(): Returns the load statistics of every built model.
+    """
+    def __init__(self, weights_dir=None):
+        self.weights_dir = weights_dir
+        self.models = {}
+        self.load_stats = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        """
+        Returns the model, building it on first use. Concurrent callers wait for a single build.
+        Args:
+            name (str): The DeepFace model name, EX: 'Facenet512'.
+        Returns:
+            keras.Model: The recognition model.
+        """
+        model = self.models.get(name)
+        if model is None:
+            with self._lock:
+                model = self.models.get(name)
+                if model is None:
+                    model = self._build(name)
+                    self.models[name] = model
+        return model
+
+    def _build(self, name):
+        if self.weights_dir:
+            weight_file = os.path.join(self.weights_dir, '.deepface', 'weights', WEIGHT_FILES.get(name, ''))
+            if not os.path.isfile(weight_file):
+                raise FileNotFoundError(f'[ERROR] weights for {name} not found: {weight_file}')
+            os.environ['DEEPFACE_HOME'] = self.weights_dir
+        from deepface import DeepFace
+
+        rss_before = resident_memory()
+        start = time.monotonic()
+        model = DeepFace.build_model(name)
+        load_time = time.monotonic() - start
+        rss_after = resident_memory()
+        weights = sum(weight.nbytes for weight in model.get_weights()) if hasattr(model, 'get_weights') else None
+        self.load_stats[name] = {
+            'load_time': load_time,
+            'weights_bytes': weights,
+            'rss_bytes': rss_after - rss_before if rss_before is not None and rss_after is not None else None
+        }
+        print(f'[INFO] loaded {name} in {load_time:.2f}s | weights: {(weights or 0) / 2 ** 20:.1f} MiB')
+        return model
+
+    def preload(self, names):
+        """
+        Builds the given models ahead of the first request.
+        Args:
+            names (list): The DeepFace model names to build.
+        """
+        for name in names:
+            self.get(name)
+
+    def stats(self):
+        """
+        Returns the load statistics of every built model.
+        Returns:
+            dict: A dictionary with 'load_time', 'weights_bytes' and 'rss_bytes' for each model by name.
+        """
+        return dict(self.load_stats)
+
+
+models = ModelRegistry(cfg.recognizer.weights_dir)
@@ -0,0 +1,69 @@
+import numpy as np
+
+
+METRICS = ['Cosine', 'Euclidean']
+
+
+def squared_norms(embeddings):
+    """
+    Computes the squared L2 norm of every row.
+    Args:
+        embeddings (numpy.ndarray): An (N, D) array of embeddings.
+    Returns:
+        numpy.ndarray: The (N,) squared norms.
+    """
+    return np.einsum('ij,ij->i', embeddings, embeddings)
+
+
+def pairwise_distances(probes, gallery, metric='Euclidean', gallery_norms=None):
+    """
+    Computes the distance from every probe to every gallery embedding with a single matrix product.
+    Args:
+        probes (numpy.ndarray): A (P, D) array of probe embeddings, or a single (D,) probe.
+        gallery (numpy.ndarray): A (G, D) array of gallery embeddings.
+        metric (str): Either 'Cosine' or 'Euclidean'.
+        gallery_norms (numpy.ndarray, optional): The precomputed (G,) squared norms of the gallery.
+    Returns:
+        numpy.ndarray: A (P, G) float32 distance matrix, or (G,) distances for a single probe.
+    """
+    if metric not in METRICS:
+        raise ValueError(f'[ERROR] {metric} is not valid. please use either one of these: {METRICS}')
+    single = np.ndim(probes) == 1
+    probes = np.atleast_2d(np.asarray(probes, dtype=np.float32))
+    gallery = np.asarray(gallery, dtype=np.float32)
+    if gallery_norms is None:
+        gallery_norms = squared_norms(gallery)
+    probe_norms = squared_norms(probes)
+    dots = probes @ gallery.T
+    if metric == 'Cosine':
+        distances = 1 - dots / (np.sqrt(probe_norms)[:, None] * np.sqrt(gallery_norms)[None, :] + 1e-12)
+    else:
+        distances = np.sqrt(np.maximum(probe_norms[:, None] + gallery_norms[None, :] - 2 * dots, 0))
+    distances = distances.astype(np.float32, copy=False)
+    return distances[0] if single else distances
+
+
+def top_k(distances, k):
+    """
+    Selects the k smallest distances of every row without sorting the whole row.
+    Args:
+        distances (numpy.ndarray): A (P, G) distance matrix, or (G,) distances of a single probe.
+        k (int): The number of nearest entries to keep; capped at G.
+    Returns:
+        tuple: The (P, k) indices and (P, k) distances of the nearest entries, closest first; (k,) arrays for a
+               single probe.
+    """
+    single = distances.ndim == 1
+    distances = np.atleast_2d(distances)
+    k = min(k, distances.shape[1])
+    if k == 0:
+        indices = np.empty((len(distances), 0), dtype=np.int64)
+    elif k < distances.shape[1]:
+        indices = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    else:
+        indices = np.tile(np.arange(distances.shape[1]), (len(distances), 1))
+    selected = np.take_along_axis(distances, indices, axis=1)
+    order = np.argsort(selected, axis=1)
+    indices = np.take_along_axis(indices, order, axis=1)
+    selected = np.take_along_axis(selected, order, axis=1)
+    return (indices[0], selected[0]) if single else (indices, selected)
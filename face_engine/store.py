@@ -0,0 +1,267 @@
+import os
+import json
+import uuid
+from contextlib import contextmanager
+import numpy as np
+from face_engine.similarity import squared_norms
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, where the store is only used by a single process
+    fcntl = None
+
+# Windows cannot replace or delete a file while a view of it is mapped, and compaction deletes the segments that the
+# gallery being served still reads, as training replaces the model file: files are read into private arrays there,
+# which are not shared between the worker processes.
+MEMORY_MAPPING = os.name != 'nt'
+
+
+class EmbeddingStore:
+    """
+    An append-only, columnar on-disk store of the gallery embeddings, shared by every worker process.
+    Rows are kept in segments of four .npy files (float32 embeddings, int64 user IDs, float32 squared norms and int64
+    row IDs), listed in manifest.json. Appending writes a new segment and then atomically replaces the manifest, so a
+    crash never leaves a half-written gallery and readers only see committed segments. Segments are opened with
+    np.load(mmap_mode='r'), so loading does not copy the embeddings into RAM and processes reading the same store share
+    its pages; except on Windows, see MEMORY_MAPPING.
+    Every row gets a row ID when it is appended, increasing along the store and never reused, so a row is identified
+    the same way by every worker whatever rows the others appended. Deleted rows are recorded as tombstones (row IDs)
+    in the manifest; compaction drops them physically while merging segments. Small trailing segments are merged once
+    there are more than max_segments of them. The manifest records the key of the model the embeddings come from (see
+    face_engine.embedding_cache.model_key), so a store encoded by another model or preprocessing mode is detected.
+    Attributes:
+        path (str): The directory holding the segments and the manifest.
+        max_segments (int): The number of segments above which appends compact the store.
+        model_key (str): The key of the model encoding the embeddings written by this process, or None.
+        manifest (dict): The last committed (or read) manifest:
+                         {'dim', 'segments': [{'name', 'rows'}], 'deleted', 'next_id', 'model_key'}.
+    Methods:
+        __init__(path, max_segments, model_key): Opens (or creates) the store directory.
+        exists(): Tells whether the store has a committed manifest.
+        stale(): Tells whether the committed rows were encoded under another model key.
+        load(): Returns the committed rows, memory-mapped when they are a single segment.
+        append(embeddings, labels): Writes rows as a new segment, commits it and returns their row IDs.
+        delete(ids): Records tombstones for rows.
+        deleted(): Returns the row IDs recorded as deleted.
+        rewrite(embeddings, labels): Replaces every row by a single new segment.
+        compact(full): Merges segments into fewer, larger ones and drops the deleted rows.
+    """
+    def __init__(self, path, max_segments=8, model_key=None):
+        self.path = path
+        self.max_segments = max_segments
+        self.model_key = model_key
+        os.makedirs(path, exist_ok=True)
+        self.manifest = self._read_manifest()
+        if 'next_id' not in self.manifest:
+            self._upgrade()
+
+    def __len__(self):
+        return sum(segment['rows'] for segment in self.manifest['segments'])
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.path, 'manifest.json')
+
+    def exists(self):
+        """
+        Tells whether the store has a committed manifest.
+        Returns:
+            bool: True once rows have been committed, even if the store was emptied afterwards.
+        """
+        return os.path.isfile(self.manifest_path)
+
+    def stale(self):
+        """
+        Tells whether the committed rows were encoded under another model key than self.model_key, EX: after
+        cfg.recognizer.skip_detection was changed. Stores written before the key was recorded are trusted.
+        Returns:
+            bool: True if the manifest records another model key.
+        """
+        recorded = self.manifest.get('model_key')
+        return None not in (recorded, self.model_key) and recorded != self.model_key
+
+    @contextmanager
+    def _locked(self, exclusive):
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.path, 'store.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_manifest(self):
+        if not self.exists():
+            return {'dim': None, 'segments': [], 'deleted': [], 'next_id': 0, 'model_key': None}
+        with open(self.manifest_path) as f:
+            manifest = json.load(f)
+        manifest.setdefault('deleted', [])
+        manifest.setdefault('model_key', None)
+        return manifest
+
+    def _commit(self, manifest):
+        temp = f'{self.manifest_path}.{uuid.uuid4().hex}.tmp'
+        with open(temp, 'w') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.manifest_path)
+        self.manifest = manifest
+
+    def _files(self, name):
+        return [os.path.join(self.path, f'{name}.{column}.npy') for column in ('embeddings', 'labels', 'norms', 'ids')]
+
+    def _upgrade(self):
+        # stores written before row IDs: the ID of a row is its position, which is what the tombstones recorded
+        with self._locked(exclusive=True):
+            manifest = self._read_manifest()
+            if 'next_id' in manifest:
+                self.manifest = manifest
+                return
+            start = 0
+            for segment in manifest['segments']:
+                with open(self._files(segment['name'])[3], 'wb') as f:
+                    np.save(f, np.arange(start, start + segment['rows'], dtype=np.int64))
+                    f.flush()
+                    os.fsync(f.fileno())
+                start += segment['rows']
+            self._commit(dict(manifest, next_id=start))
+
+    def _write_segment(self, embeddings, labels, norms, ids):
+        name = uuid.uuid4().hex
+        for file, column in zip(self._files(name), (embeddings, labels, norms, ids)):
+            with open(file, 'wb') as f:
+                np.save(f, column)
+                f.flush()
+                os.fsync(f.fileno())
+        return {'name': name, 'rows': len(labels)}
+
+    def _read_segment(self, segment):
+        return tuple(np.load(file, mmap_mode='r' if MEMORY_MAPPING else None) for file in self._files(segment['name']))
+
+    def _remove_segments(self, segments):
+        for segment in segments:
+            for file in self._files(segment['name']):
+                if os.path.isfile(file):
+                    os.remove(file)
+
+    def load(self):
+        """
+        Returns the committed rows, deleted ones included (see deleted()). A single segment is returned as read-only
+        memory maps; several segments are concatenated into private arrays, so compact() the store first to share them.
+        Returns:
+            tuple: The (N, D) float32 embeddings, (N,) int64 user IDs, (N,) float32 squared norms and (N,) int64 row
+                   IDs, or (None, None, None, None) for an empty store.
+        """
+        with self._locked(exclusive=False):
+            self.manifest = self._read_manifest()
+            segments = [self._read_segment(segment) for segment in self.manifest['segments'] if segment['rows'] != 0]
+        if not segments:
+            return None, None, None, None
+        if len(segments) == 1:
+            return segments[0]
+        return tuple(np.concatenate(column) for column in zip(*segments))
+
+    def append(self, embeddings, labels):
+        """
+        Writes rows as a new segment and commits it; the existing segments are not touched.
+        Args:
+            embeddings (numpy.ndarray): The (N, D) embeddings to append.
+            labels (int | numpy.ndarray): One user ID for all rows, or an (N,) array of user IDs.
+        Returns:
+            numpy.ndarray: The (N,) int64 row IDs given to the rows.
+        Raises:
+            ValueError: If the embedding dimension does not match the stored rows.
+        """
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if len(embeddings) == 0:
+            return np.empty(0, dtype=np.int64)
+        labels = np.ascontiguousarray(np.broadcast_to(np.asarray(labels, dtype=np.int64), (len(embeddings),)))
+        with self._locked(exclusive=True):
+            manifest = self._read_manifest()
+            if manifest['dim'] is not None and manifest['dim'] != embeddings.shape[1]:
+                raise ValueError(f'[ERROR] embedding dimension {embeddings.shape[1]} does not match the store: '
+                                 f'{manifest["dim"]}')
+            ids = np.arange(manifest['next_id'], manifest['next_id'] + len(labels), dtype=np.int64)
+            segment = self._write_segment(embeddings, labels, squared_norms(embeddings), ids)
+            self._commit(dict(manifest, dim=int(embeddings.shape[1]), segments=manifest['segments'] + [segment],
+                              next_id=int(ids[-1]) + 1, model_key=manifest['model_key'] or self.model_key))
+            if len(self.manifest['segments']) > self.max_segments:
+                self._compact(full=False)
+        return ids
+
+    def delete(self, ids):
+        """
+        Records tombstones for rows; the rows stay in their segments until compaction drops them.
+        Args:
+            ids (numpy.ndarray): The row IDs of the deleted rows, as returned by append() or load().
+        """
+        if len(ids) == 0:
+            return
+        with self._locked(exclusive=True):
+            manifest = self._read_manifest()
+            deleted = sorted(set(manifest['deleted']).union(np.asarray(ids, dtype=np.int64).tolist()))
+            self._commit(dict(manifest, deleted=deleted))
+
+    def deleted(self):
+        """
+        Returns the row IDs recorded as deleted, as of the last read manifest.
+        Returns:
+            numpy.ndarray: The row IDs of the deleted rows.
+        """
+        return np.asarray(self.manifest['deleted'], dtype=np.int64)
+
+    def rewrite(self, embeddings, labels):
+        """
+        Replaces every row by a single new segment with new row IDs and clears the tombstones, EX: to create an empty
+        store or a benchmark gallery.
+        Args:
+            embeddings (numpy.ndarray): The (N, D) embeddings to keep.
+            labels (numpy.ndarray): Their (N,) user IDs.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        labels = np.ascontiguousarray(labels, dtype=np.int64)
+        with self._locked(exclusive=True):
+            manifest = self._read_manifest()
+            ids = np.arange(manifest['next_id'], manifest['next_id'] + len(labels), dtype=np.int64)
+            segments = [self._write_segment(embeddings, labels, squared_norms(embeddings), ids)] if len(labels) else []
+            self._commit({'dim': int(embeddings.shape[1]) if len(labels) else None, 'segments': segments,
+                          'deleted': [], 'next_id': manifest['next_id'] + len(labels), 'model_key': self.model_key})
+            self._remove_segments(manifest['segments'])
+
+    def compact(self, full=True):
+        """
+        Merges segments into fewer, larger ones, dropping the deleted rows of the merged segments. The manifest is
+        re-read under the exclusive lock, so the rows appended and deleted by every worker are kept and dropped.
+        Args:
+            full (bool): Merge every segment into one and drop every deleted row; otherwise only the segments after the
+                         largest one are merged, so frequent small appends do not rewrite the bulk of the gallery.
+        """
+        with self._locked(exclusive=True):
+            self.manifest = self._read_manifest()
+            self._compact(full)
+
+    def _compact(self, full):
+        segments = self.manifest['segments']
+        start = 0
+        if not full:
+            largest = int(np.argmax([segment['rows'] for segment in segments]))
+            if sum(segment['rows'] for segment in segments[largest + 1:]) < segments[largest]['rows']:
+                start = largest + 1
+        merged = segments[start:]
+        deleted = np.asarray(self.manifest['deleted'], dtype=np.int64)
+        if len(merged) < 2 and not (full and merged and len(deleted)):
+            return
+        # empty segments, EX: written by rewrite() before it skipped them, have no embedding dimension to concatenate
+        filled = [self._read_segment(segment) for segment in merged if segment['rows'] != 0]
+        written = []
+        if filled:
+            columns = [np.concatenate(column) for column in zip(*filled)]
+            dropped = np.isin(columns[3], deleted)
+            written = [self._write_segment(*(column[~dropped] for column in columns))]
+            deleted = np.setdiff1d(deleted, columns[3][dropped])
+        deleted = [] if full else np.asarray(deleted).tolist()  # a full merge saw every row
+        self._commit(dict(self.manifest, segments=segments[:start] + written, deleted=deleted))
+        self._remove_segments(merged)
@@ -0,0 +1,60 @@
+import numpy as np
+from face_engine.similarity import pairwise_distances
+
+POLICIES = ['medoids', 'centroids']
+
+
+def kmeans(embeddings, k, iterations=10, seed=0):
+    """
+    Clusters embeddings with k-means (k-means++ initialisation) on the Euclidean distance.
+    Args:
+        embeddings (numpy.ndarray): An (N, D) array with N >= k.
+        k (int): The number of clusters.
+        iterations (int): The number of Lloyd iterations.
+        seed (int): The random seed of the initialisation.
+    Returns:
+        tuple: The (k, D) float32 centroids and the (N,) cluster of every embedding.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = [embeddings[rng.integers(len(embeddings))]]
+    for _ in range(1, k):
+        distances = pairwise_distances(embeddings, np.asarray(centroids)).min(1).astype(np.float64) ** 2
+        total = distances.sum()
+        choice = rng.choice(len(embeddings), p=distances / total) if total > 0 else rng.integers(len(embeddings))
+        centroids.append(embeddings[choice])
+    centroids = np.asarray(centroids, dtype=np.float32)
+    for _ in range(iterations):
+        assignment = pairwise_distances(embeddings, centroids).argmin(1)
+        for cluster in range(k):
+            members = embeddings[assignment == cluster]
+            if len(members) != 0:
+                centroids[cluster] = members.mean(0)
+    return centroids, pairwise_distances(embeddings, centroids).argmin(1)
+
+
+def select_templates(embeddings, k, policy='medoids'):
+    """
+    Reduces the embeddings of one user to at most k representative templates.
+    Args:
+        embeddings (numpy.ndarray): The (N, D) embeddings of the user.
+        k (int): The maximal number of templates.
+        policy (str): 'medoids' keeps the embedding of every k-means cluster closest to all of its other members, so
+                      templates are real faces; 'centroids' keeps the cluster means.
+    Returns:
+        numpy.ndarray: The (min(N, k), D) float32 templates.
+    Raises:
+        ValueError: If the policy is not one of POLICIES.
+    """
+    if policy not in POLICIES:
+        raise ValueError(f'[ERROR] {policy} is not valid. please use either one of these: {POLICIES}')
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if len(embeddings) <= k:
+        return embeddings
+    centroids, assignment = kmeans(embeddings, k)
+    if policy == 'centroids':
+        return centroids[np.unique(assignment)]
+    templates = []
+    for cluster in np.unique(assignment):
+        members = embeddings[assignment == cluster]
+        templates.append(members[pairwise_distances(members, members).sum(1).argmin()])
+    return np.asarray(templates, dtype=np.float32)
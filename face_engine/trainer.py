@@ -0,0 +1,73 @@
+import threading
+
+
+class TrainingWorker:
+    """
+    Retrains the classifier on a background thread, so enrollment requests do not wait for the fit.
+    Requests arriving while a fit is running are coalesced into a single follow-up fit. Each fit builds a new backend
+    off to the side (Classifier.train) and swaps it in with one reference assignment, so concurrent recognition
+    always sees either the previous or the new model, never a half-trained one.
+    Attributes:
+        classifier (Classifier): The classifier to retrain.
+        requested (int): The number of retrains requested so far.
+        completed (int): The number of requests covered by the last finished fit.
+        last_error (str): The error of the last failed fit, if any.
+    Methods:
+        __init__(classifier): Initializes the worker; the thread starts on the first request.
+        request(callback): Enqueues a retrain.
+        wait(timeout): Blocks until every request made so far is covered by a finished fit.
+    """
+    def __init__(self, classifier):
+        self.classifier = classifier
+        self.requested = 0
+        self.completed = 0
+        self.last_error = None
+        self._callbacks = []
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def request(self, callback=None):
+        """
+        Enqueues a retrain and returns immediately.
+        Args:
+            callback (callable, optional): Called without arguments after the new model is swapped in,
+                                           EX: to drop cached predictions of the previous model.
+        """
+        with self._condition:
+            self.requested += 1
+            if callback is not None and callback not in self._callbacks:
+                self._callbacks.append(callback)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='classifier-training', daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def wait(self, timeout=None):
+        """
+        Blocks until every request made so far is covered by a finished fit.
+        Args:
+            timeout (float, optional): The maximum number of seconds to wait.
+        Returns:
+            bool: True if the requests are covered, False on timeout.
+        """
+        with self._condition:
+            target = self.requested
+            return self._condition.wait_for(lambda: self.completed >= target, timeout=timeout)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self.requested > self.completed)
+                target = self.requested
+                callbacks, self._callbacks = self._callbacks, []
+            try:
+                self.classifier.train()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f'[ERROR] background training failed : {e}')
+            for callback in callbacks:
+                callback()
+            with self._condition:
+                self.completed = target
+                self._condition.notify_all()
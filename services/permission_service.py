@@ -1,5 +1,24 @@
 from database_models import AccessPermission, db
 
+_permission_listeners = []
+
+
+def add_permission_listener(listener):
+    """
+    Registers a callable notified after permissions are added or revoked, EX: to keep in-memory indexes up to date.
+    Args:
+        listener (callable): Called as listener(user_id, permission_level, granted); permission_level is None when
+                             every permission of the user was revoked.
+    """
+    _permission_listeners.append(listener)
+
+
+def _notify_permission_listeners(user_id, permission_level, granted):
+    if user_id is None:  # EX: rows stored by registrations in which no face was detected
+        return
+    for listener in _permission_listeners:
+        listener(user_id, permission_level, granted)
+
 
 def add_permission_to_user(user_id, permission_level):
     """
@@ -14,6 +33,7 @@ def add_permission_to_user(user_id, permission_level):
         new_permission = AccessPermission(user_profile_id=user_id, permission_level=permission_level)
         db.session.add(new_permission)
         db.session.commit()
+        _notify_permission_listeners(user_id, permission_level, True)
 
 
 def get_user_permissions(user_id):
@@ -27,6 +47,20 @@ def get_user_permissions(user_id):
     return AccessPermission.query.filter_by(user_profile_id=user_id).all()
 
 
+def get_users_with_permission(permission_level):
+    """
+    Retrieves the IDs of all users holding a specific permission level, skipping the permissions stored without a user.
+    Args:
+        permission_level (str): The permission level to look up.
+    Returns:
+        list: The IDs of the users holding the permission level.
+    """
+    rows = AccessPermission.query.with_entities(AccessPermission.user_profile_id)\
+        .filter_by(permission_level=permission_level).filter(AccessPermission.user_profile_id.isnot(None))\
+        .distinct().all()
+    return [row[0] for row in rows]
+
+
 def validate_access_for_user(user_id, required_permission_level):
     """
     Validates if a user has a specific permission level.
@@ -60,3 +94,4 @@ def revoke_user_permissions(user_id, permission_level=None):
         # also if no specific level is provided it will also revoke all
         AccessPermission.query.filter_by(user_profile_id=user_id).delete()
     db.session.commit()
+    _notify_permission_listeners(user_id, permission_level or None, False)
@@ -0,0 +1,65 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+import pytest
+from face_engine.ann import IVFIndex, normalize
+
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(200, 32))
+    return (centers[rng.integers(0, 200, 3000)] + 0.2 * rng.normal(size=(3000, 32))).astype(np.float32)
+
+
+@pytest.fixture
+def index(vectors):
+    index = IVFIndex(32, nlist=32, nprobe=4)
+    index.train(vectors)
+    index.add(np.arange(len(vectors)), vectors)
+    return index
+
+
+def test_ivf_recall(index, vectors):
+    queries = vectors[:50]
+    exact = np.argsort(1 - normalize(queries) @ normalize(vectors).T, axis=1)[:, :10]
+    ids, distances = index.search(queries, k=10)
+    recall = np.mean([len(set(a) & set(b)) / 10 for a, b in zip(ids, exact)])
+    assert recall > 0.8
+    assert np.all(np.diff(distances, axis=1) >= 0)
+    exhaustive, _ = index.search(queries, k=10, nprobe=index.nlist)
+    assert np.array_equal(exhaustive[:, 0], exact[:, 0])
+
+
+def test_ivf_insert_and_remove(index, vectors):
+    new = np.ones(32, dtype=np.float32)
+    index.add([5000], new[np.newaxis])
+    assert index.search(new, k=1)[0][0] == 5000
+    index.remove([5000, 0, 1])
+    assert len(index) == len(vectors) - 2
+    ids, _ = index.search(vectors[:2], k=5, nprobe=index.nlist)
+    assert not np.isin([0, 1, 5000], ids).any()
+
+
+def test_ivf_save_and_load(index, vectors, tmp_path):
+    path = str(tmp_path / 'index.npz')
+    index.save(path)
+    loaded = IVFIndex.load(path)
+    assert len(loaded) == len(index)
+    assert np.array_equal(loaded.search(vectors[:20], k=5)[0], index.search(vectors[:20], k=5)[0])
+
+
+def test_ivf_remapped_renumbers_ids(index, vectors):
+    mapping = np.arange(len(vectors)) - 1
+    remapped = index.remapped(mapping)
+    assert len(remapped) == len(index) - 1
+    ids, _ = remapped.search(vectors[10], k=1, nprobe=remapped.nlist)
+    assert ids[0] == 9
+
+
+def test_ivf_ids(index, vectors):
+    index.remove([3, 1])
+    ids = index.ids()
+    assert len(ids) == len(vectors) - 2
+    assert ids[:3].tolist() == [0, 2, 4]
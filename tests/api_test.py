@@ -3,6 +3,8 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from app import app, add_access_log, log_access_request
+import utils
+from face_engine.loader import LazyModel
 from werkzeug.datastructures import FileStorage
 from config import cfg
 from database_models import db
@@ -619,3 +621,38 @@ def test_tos_linkRel_profile_endpoints(client):
     response = client.get(url)
     assert response.status_code == 200
 
+
+
+def test_readiness_endpoint(client, monkeypatch):
+    detector = LazyModel('detector', lambda: object())
+    classifier = LazyModel('classifier', lambda: object())
+    monkeypatch.setattr(utils, 'MODELS', [detector, classifier])
+    url = f"{base_url}/health/ready"
+    response = client.get(url)
+    assert response.status_code == 503
+    assert response.json["ready"] is False
+    assert {name: model["state"] for name, model in response.json["models"].items()} == \
+        {"detector": "not_loaded", "classifier": "not_loaded"}
+
+    detector.get()
+    response = client.get(url)
+    assert response.status_code == 503
+    assert response.json["models"]["detector"]["state"] == "ready"
+
+    classifier.get()
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.json["ready"] is True
+
+
+def test_readiness_endpoint_reports_failed_models(client, monkeypatch):
+    def fail():
+        raise RuntimeError('weights not found')
+
+    failed = LazyModel('classifier', fail)
+    failed.load_async().join()
+    monkeypatch.setattr(utils, 'MODELS', [failed])
+    response = client.get(f"{base_url}/health/ready")
+    assert response.status_code == 503
+    assert response.json["models"]["classifier"] == {"state": "failed", "load_time": None,
+                                                     "error": "weights not found"}
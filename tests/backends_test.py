@@ -0,0 +1,217 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import joblib
+import numpy as np
+import pytest
+from face_engine.backends import NearestNeighbourBackend, SVCBackend, create_backend
+from face_engine.gallery import Gallery
+from face_engine.ann import IVFIndex, normalize
+from face_engine.store import EmbeddingStore
+from config import cfg
+
+
+@pytest.fixture
+def gallery():
+    rng = np.random.default_rng(0)
+    gallery = Gallery()
+    for user_id in (3, 7, 9):
+        center = rng.normal(size=32)
+        gallery.add(center + 0.05 * rng.normal(size=(4, 32)), user_id)
+    return gallery
+
+
+def test_nearest_neighbour_backend_recognizes_enrolled_users(gallery):
+    backend = NearestNeighbourBackend()
+    backend.fit(gallery)
+    for row in (0, 5, 11):
+        user_id, score = backend.predict(gallery.embeddings[row] + 0.01)
+        assert user_id == gallery.labels[row]
+        assert score > backend.threshold
+
+
+def test_nearest_neighbour_backend_sees_new_rows_without_fit(gallery):
+    backend = NearestNeighbourBackend(gallery)
+    new_face = np.random.default_rng(1).normal(size=32)
+    gallery.add(new_face, 12)
+    assert backend.predict(new_face)[0] == 12
+
+
+def test_nearest_neighbour_backend_empty_gallery():
+    assert NearestNeighbourBackend(Gallery()).predict(np.ones(4)) == (None, 0.0)
+
+
+def test_nearest_neighbour_backend_skips_removed_users(gallery):
+    backend = NearestNeighbourBackend(gallery)
+    probe = gallery.embeddings[4] + 0.01
+    rows = gallery.remove(7)
+    backend.remove(7, rows)
+    assert backend.predict(probe)[0] != 7
+
+
+def test_svc_backend_excludes_removed_users(gallery):
+    backend = SVCBackend()
+    backend.fit(gallery)
+    probe = gallery.embeddings[4]
+    assert backend.predict(probe)[0] == 7
+    backend.remove(7)
+    user_id, probability = backend.predict(probe)
+    assert user_id in (3, 9)
+    assert 0 <= probability <= 1
+
+
+def test_svc_backend_loads_models_trained_on_folder_names(gallery, tmp_path):
+    backend = SVCBackend()
+    backend.model.fit(gallery.embeddings, gallery.labels.astype(str))
+    path = str(tmp_path / 'model_svc.pkl')
+    backend.save(path)
+    loaded = SVCBackend()
+    loaded.load(path)
+    assert loaded.model.classes_.tolist() == [3, 7, 9]
+    loaded.remove(7)
+    assert loaded.predict(gallery.embeddings[4])[0] in (3, 9)
+    assert [pairs[0][0] for pairs in loaded.score_batch(gallery.embeddings[[0]], users={3})] == [3]
+
+def test_trained_backends_refuse_models_of_another_backend(gallery, tmp_path):
+    svc = create_backend('svc')
+    svc.fit(gallery)
+    path = str(tmp_path / 'model_svc.pkl')
+    svc.save(path)
+    with pytest.raises(ValueError):
+        create_backend('linear').load(path)
+    joblib.dump(svc.model, path, compress=0)  # saved before the backend name was stored with the model
+    with pytest.raises(ValueError):
+        create_backend('linear').load(path)
+    loaded = create_backend('svc')
+    loaded.load(path)
+    assert loaded.score_batch(gallery.embeddings, k=2) == svc.score_batch(gallery.embeddings, k=2)
+
+
+@pytest.mark.parametrize('name', ['svc', 'linear'])
+def test_trained_backends_keep_removed_users_out_after_a_restart(gallery, name, tmp_path):
+    store = EmbeddingStore(str(tmp_path / 'embeddings'))
+    store.rewrite(gallery.embeddings, gallery.labels)
+    backend = create_backend(name)
+    backend.fit(gallery)
+    path = str(tmp_path / 'model.pkl')
+    backend.save(path)
+    store.delete(store.load()[3][gallery.labels == 7])  # remove_user(7), then a restart compacts the store
+    store.compact()
+    restarted = Gallery.from_arrays(*store.load())
+    loaded = create_backend(name)
+    loaded.load(path, restarted)
+    assert loaded.excluded == {7}
+    assert 7 not in [user_id for pairs in loaded.score_batch(gallery.embeddings, k=3) for user_id, _ in pairs]
+
+
+def test_trained_backends_refuse_models_fitted_under_another_preprocessing(gallery, tmp_path, monkeypatch):
+    monkeypatch.setattr(cfg.recognizer, 'skip_detection', False)
+    backend = create_backend('linear')
+    backend.fit(gallery)
+    path = str(tmp_path / 'model.pkl')
+    backend.save(path)
+    monkeypatch.setattr(cfg.recognizer, 'skip_detection', True)
+    with pytest.raises(ValueError):
+        create_backend('linear').load(path)
+
+
+def test_create_backend_rejects_unknown_names():
+    with pytest.raises(ValueError):
+        create_backend('random_forest')
+
+
+def test_score_batch_returns_distinct_top_k_users(gallery):
+    backend = NearestNeighbourBackend(gallery)
+    candidates = backend.score_batch(gallery.embeddings[[0, 5]], k=2)
+    assert [user_id for user_id, _ in candidates[0]][0] == 3
+    assert [user_id for user_id, _ in candidates[1]][0] == 7
+    for pairs in candidates:
+        assert len({user_id for user_id, _ in pairs}) == len(pairs) == 2
+        assert pairs[0][1] >= pairs[1][1]
+
+
+def test_svc_score_batch_maps_probabilities_through_classes(gallery):
+    backend = SVCBackend()
+    backend.fit(gallery)
+    candidates = backend.score_batch(gallery.embeddings[[0, 11]], k=3)
+    assert [pairs[0][0] for pairs in candidates] == [3, 9]
+    for pairs, probabilities in zip(candidates, backend.model.predict_proba(gallery.embeddings[[0, 11]])):
+        expected = dict(zip(backend.model.classes_.tolist(), probabilities.tolist()))
+        assert all(abs(expected[user_id] - probability) < 1e-12 for user_id, probability in pairs)
+
+
+def test_score_batch_restricted_to_users(gallery):
+    probe = gallery.embeddings[0]
+    nearest = NearestNeighbourBackend(gallery).score_batch(probe, k=3, users={7, 9})[0]
+    assert {user_id for user_id, _ in nearest} == {7, 9}
+    svc = SVCBackend()
+    svc.fit(gallery)
+    assert [user_id for user_id, _ in svc.score_batch(probe, k=3, users={9})[0]] == [9]
+    assert NearestNeighbourBackend(gallery).score_batch(probe, k=1, users=set()) == [[]]
+
+
+@pytest.mark.parametrize('name', ['svc', 'linear', 'nearest', 'centroid'])
+def test_backends_share_the_scoring_interface(gallery, name):
+    backend = create_backend(name)
+    backend.fit(gallery)
+    candidates = backend.score_batch(gallery.embeddings[[0, 5, 11]], k=2)
+    assert [pairs[0][0] for pairs in candidates] == [3, 7, 9]
+    assert all(len(pairs) == 2 and pairs[0][1] >= pairs[1][1] for pairs in candidates)
+    assert backend.predict(gallery.embeddings[5])[0] == 7
+
+
+def test_centroid_backend_updates_incrementally(gallery):
+    backend = create_backend('centroid')
+    backend.fit(gallery)
+    new_face = np.random.default_rng(1).normal(size=32)
+    gallery.add(new_face, 12)
+    backend.add(new_face[np.newaxis], [12])
+    assert backend.predict(new_face)[0] == 12
+    backend.remove(12)
+    assert backend.predict(new_face)[0] != 12
+    rows = gallery.rows_of([3])
+    backend.discard_rows(rows[:2])
+    np.testing.assert_allclose(backend.centroids[0], normalize(normalize(gallery.embeddings[rows[2:]]).sum(0))[0],
+                               atol=1e-5)
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='models are not memory-mapped on Windows')
+@pytest.mark.parametrize('name', ['svc', 'linear'])
+def test_trained_backends_load_memory_mapped(gallery, name, tmp_path):
+    backend = create_backend(name)
+    backend.fit(gallery)
+    path = str(tmp_path / 'model.pkl')
+    backend.save(path)
+    loaded = create_backend(name)
+    loaded.load(path)
+    arrays = [value for value in vars(loaded.model).values() if isinstance(value, np.ndarray) and value.size > 64]
+    assert arrays and all(isinstance(value, np.memmap) for value in arrays)
+    assert loaded.score_batch(gallery.embeddings, k=2) == backend.score_batch(gallery.embeddings, k=2)
+
+
+def test_nearest_neighbour_index_is_reused_after_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(cfg.recognizer, 'ann', True)
+    monkeypatch.setattr(cfg.recognizer, 'ann_min_size', 10)
+    monkeypatch.setattr(cfg.recognizer, 'ann_nlist', 4)
+    monkeypatch.setattr(cfg.recognizer, 'ann_nprobe', 4)
+    monkeypatch.setattr(cfg.recognizer, 'ann_index_path', str(tmp_path / 'index.npz'))
+    rng = np.random.default_rng(0)
+    centers = {user_id: rng.normal(size=32) for user_id in (*range(40, 50), 999)}
+    store = EmbeddingStore(str(tmp_path / 'store'))
+    for user_id in range(40, 50):
+        store.append(centers[user_id] + 0.05 * rng.normal(size=(3, 32)), user_id)
+    gallery = Gallery.from_arrays(*store.load())
+    NearestNeighbourBackend().fit(gallery)
+    assert os.path.isfile(cfg.recognizer.ann_index_path)
+
+    # after a restart: one user enrolled and another deleted since the index was saved
+    store.append(centers[999] + 0.05 * rng.normal(size=(3, 32)), 999)
+    store.delete(gallery.ids[gallery.labels == 43])
+    store.compact()
+    gallery = Gallery.from_arrays(*store.load())
+    backend = NearestNeighbourBackend()
+    monkeypatch.setattr(IVFIndex, 'train', lambda *args, **kwargs: pytest.fail('the saved index was retrained'))
+    backend.fit(gallery)
+    assert len(backend.index) == len(gallery) == 30
+    assert backend.predict(centers[999])[0] == 999
+    assert backend.predict(centers[43])[0] != 43
@@ -0,0 +1,85 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import joblib
+import numpy as np
+import pytest
+from config import cfg
+import face_engine.classifier
+from face_engine.bootstrap import bootstrap, is_pending
+from face_engine.classifier import Classifier
+from face_engine.store import EmbeddingStore
+
+
+class StubEncoder:
+    """
+    Encodes every image of a user to a vector filled with the user ID, and fails on one user to simulate a crash.
+    """
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.encoded = []
+
+    def encode_batch(self, images, batch_size=32):
+        if not images:
+            return []
+        user_id = os.path.basename(os.path.dirname(images[0]))
+        if user_id == self.fail_on:
+            raise RuntimeError('interrupted')
+        self.encoded.append(user_id)
+        return [np.full(8, float(user_id), dtype=np.float32) for _ in images]
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(cfg.recognizer, 'embedding_store_path', f'{tmp_path}/embeddings/')
+    monkeypatch.setattr(cfg.recognizer, 'embedding_file_path', f'{tmp_path}/embeddings.pkl')
+    monkeypatch.setattr(cfg.recognizer, 'embedding_cache_path', None)
+    monkeypatch.setattr(cfg.recognizer, 'model_path', f'{tmp_path}/model.pkl')
+    monkeypatch.setattr(cfg.recognizer, 'classifier', 'nearest')
+    monkeypatch.setattr(cfg.recognizer, 'templates_per_user', 0)
+    monkeypatch.setattr(cfg.db, 'database', f'{tmp_path}/database/')
+    for user_id in ('1', '2', '3', 'uploads'):
+        os.makedirs(f'{cfg.db.database}{user_id}')
+        for image in ('a.jpg', 'b.jpg'):
+            open(f'{cfg.db.database}{user_id}/{image}', 'wb').close()
+    return cfg.db.database
+
+
+def interrupted_bootstrap():
+    store = EmbeddingStore(cfg.recognizer.embedding_store_path)
+    with pytest.raises(RuntimeError):
+        bootstrap(store, workers=1, checkpoint_every=1, encoder=StubEncoder(fail_on='2'))
+    return store
+
+
+def test_bootstrap_resumes_after_the_last_checkpoint(database):
+    store = interrupted_bootstrap()
+    assert is_pending(store)
+    assert store.load()[1].tolist() == [1, 1]
+    encoder = StubEncoder()
+    assert bootstrap(store, workers=1, checkpoint_every=1, encoder=encoder) == 2
+    assert encoder.encoded == ['2', '3']  # the non-numeric folder is skipped
+    assert not is_pending(store)
+    assert sorted(store.load()[1].tolist()) == [1, 1, 2, 2, 3, 3]
+
+
+def test_bootstrap_of_an_empty_database_accepts_later_enrollments(database):
+    for user_id in os.listdir(database):
+        for image in os.listdir(f'{database}{user_id}'):
+            os.remove(f'{database}{user_id}/{image}')
+    store = EmbeddingStore(cfg.recognizer.embedding_store_path)
+    bootstrap(store, workers=1, encoder=StubEncoder())
+    store.append(np.ones((2, 8)), 1)
+    store.append(np.ones((1, 8)), 2)
+    store.compact()
+    assert store.load()[1].tolist() == [1, 1, 2]
+
+
+def test_classifier_resumes_an_interrupted_bootstrap_before_migrating(database, monkeypatch):
+    joblib.dump({'encodings': list(np.ones((3, 8))), 'labels': [1, 1, 1]}, cfg.recognizer.embedding_file_path)
+    interrupted_bootstrap()
+    monkeypatch.setattr(face_engine.classifier, 'Encoder', lambda **kwargs: StubEncoder())
+    for _ in range(3):
+        clf = Classifier()
+        assert not is_pending(clf.store)
+        assert sorted(clf.names.tolist()) == [1, 1, 2, 2, 3, 3]
@@ -0,0 +1,37 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import time
+from face_engine.cache import ResultCache
+
+
+def test_result_cache_expires_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    cache = ResultCache(maxsize=4, ttl=30)
+    cache.put('a', 1)
+    now[0] += 29
+    assert cache.get('a') == 1
+    now[0] += 2
+    assert cache.get('a') is None
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_result_cache_evicts_least_recently_used():
+    cache = ResultCache(maxsize=2, ttl=30)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_result_cache_disabled_with_maxsize_zero():
+    cache = ResultCache(maxsize=0, ttl=30)
+    cache.put('a', 1)
+    assert cache.get('a') is None
+    assert len(cache) == 0
@@ -0,0 +1,33 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+import pytest
+from config import cfg
+from face_engine.classifier import Classifier
+
+
+@pytest.fixture
+def classifier_cfg(tmp_path, monkeypatch):
+    monkeypatch.setattr(cfg.recognizer, 'embedding_store_path', f'{tmp_path}/embeddings/')
+    monkeypatch.setattr(cfg.recognizer, 'embedding_file_path', f'{tmp_path}/embeddings.pkl')
+    monkeypatch.setattr(cfg.recognizer, 'embedding_cache_path', None)
+    monkeypatch.setattr(cfg.recognizer, 'model_path', f'{tmp_path}/model.pkl')
+    monkeypatch.setattr(cfg.recognizer, 'templates_per_user', 0)
+    monkeypatch.setattr(cfg.db, 'database', f'{tmp_path}/database/')
+    os.makedirs(cfg.db.database)
+    return cfg.recognizer
+
+
+@pytest.mark.parametrize('name', ['nearest', 'centroid', 'svc', 'linear'])
+def test_templates_of_the_first_user_of_an_empty_gallery(classifier_cfg, name):
+    classifier_cfg.classifier = name
+    classifier_cfg.templates_per_user = 3
+    clf = Classifier()
+    clf.add_embeddings(list(np.random.default_rng(0).normal(size=(5, 16))), 4)
+    assert clf.encodings.shape == (3, 16)
+    assert clf.names.tolist() == [4, 4, 4]
+    clf.add_embeddings(list(np.random.default_rng(1).normal(size=(2, 16))), 4)
+    if clf._compaction is not None:
+        clf._compaction.join()
+    assert len(clf.gallery.rows_of([4])) == 3
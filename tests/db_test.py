@@ -1,12 +1,13 @@
 import pytest
 from services.access_log_service import add_access_log, get_user_access_logs, get_access_log
 from services.access_request_service import log_access_request, get_user_access_requests, get_access_request
-from services.permission_service import add_permission_to_user, validate_access_for_user, get_user_permissions, revoke_user_permissions
+from services.permission_service import add_permission_to_user, validate_access_for_user, get_user_permissions, revoke_user_permissions, \
+    get_users_with_permission, add_permission_listener
 from services.user_service import delete_user_profile, get_user_profile, update_user_facial_data, add_user, \
     get_users_by_name, update_user_name
 
 from sqlalchemy.orm import scoped_session, sessionmaker
-from database_models import db, UserProfile, AccessRequest
+from database_models import db, UserProfile, AccessRequest, AccessPermission
 import threading
 from flask import Flask
 from config import cfg
@@ -212,6 +213,35 @@ def test_revoke_user_permissions_all(session):
     assert len(permissions) == 0
 
 
+def test_get_users_with_permission_and_listeners(session):
+    changes = []
+    add_permission_listener(lambda *change: changes.append(change))
+    first = add_user("Partition User One", b"partition_one_facial_data")
+    second = add_user("Partition User Two", b"partition_two_facial_data")
+    add_permission_to_user(first, "partition-security")
+    add_permission_to_user(second, "partition-security")
+    add_permission_to_user(second, "partition-security")
+    assert set(get_users_with_permission("partition-security")) == {first, second}
+    revoke_user_permissions(first, "partition-security")
+    revoke_user_permissions(second)
+    assert get_users_with_permission("partition-security") == []
+    assert changes[-4:] == [(first, "partition-security", True), (second, "partition-security", True),
+                            (first, "partition-security", False), (second, None, False)]
+
+
+def test_get_users_with_permission_skips_permissions_without_user(session):
+    changes = []
+    add_permission_listener(lambda *change: changes.append(change))
+    db.session.add(AccessPermission(user_profile_id=None, permission_level="partition-orphan"))
+    db.session.commit()
+    user_id = add_user("Partition User Three", b"partition_three_facial_data")
+    add_permission_to_user(user_id, "partition-orphan")
+    add_permission_to_user(None, "partition-orphan-two")
+    assert get_users_with_permission("partition-orphan") == [user_id]
+    assert get_users_with_permission("partition-orphan-two") == []
+    assert changes == [(user_id, "partition-orphan", True)]
+
+
 def test_data_validation(session):
     invalid_user_id = add_user("", b"")
     assert invalid_user_id is not None
@@ -0,0 +1,55 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+import numpy as np
+import pytest
+from config import cfg
+from face_engine.detector import Inference, Detections
+
+SIZES = [(320, 320), (640, 640), (1280, 1280)]
+
+
+class StubInference(Inference):
+    """
+    Runs the cascade of Inference without a model: frame i holds the first stage finding its face, or -1 for none,
+    and its detection is scored i, so the order of the results can be checked.
+    """
+    def __init__(self):
+        self.cascade_sizes = SIZES
+        self.cascade_stats = [{'size': size, 'frames': 0, 'hits': 0} for size in SIZES]
+        self.lock = threading.Lock()
+        self.calls = []
+
+    def detect_at(self, frames, size):
+        stage = SIZES.index(size)
+        self.calls.append((size, [int(frame[0, 0, 1]) for frame in frames]))
+        return [Detections([[0, 0, 4, 4]], [frame[0, 0, 1]], [0]) if 0 <= frame[0, 0, 0] <= stage
+                else Detections([], [], []) for frame in frames]
+
+
+def frames(stages):
+    return [np.dstack([np.full((4, 4), stage), np.full((4, 4), i), np.zeros((4, 4))]).astype(np.int64)
+            for i, stage in enumerate(stages)]
+
+
+@pytest.fixture
+def cascade(monkeypatch):
+    monkeypatch.setattr(cfg.detector, 'cascade', True)
+    return StubInference()
+
+
+def test_cascade_reruns_only_the_misses_at_the_next_size(cascade):
+    detections = cascade.detect_batch(frames([0, 1, -1, 0, 2]))
+    assert cascade.calls == [((320, 320), [0, 1, 2, 3, 4]), ((640, 640), [1, 2, 4]), ((1280, 1280), [2, 4])]
+    assert [item.scores.tolist() for item in detections] == [[0], [1], [], [3], [4]]
+    assert [(stats['frames'], stats['hits']) for stats in cascade.cascade_hit_rates()] == [(5, 2), (3, 1), (2, 1)]
+    assert [stats['hit_rate'] for stats in cascade.cascade_hit_rates()] == [0.4, pytest.approx(1 / 3), 0.5]
+
+
+def test_cascade_stops_once_every_frame_has_a_face(cascade):
+    detections = cascade.detect_batch(frames([0, 0]))
+    assert cascade.calls == [((320, 320), [0, 1])]
+    assert [len(item) for item in detections] == [1, 1]
+    assert cascade.cascade_hit_rates()[1] == {'size': (640, 640), 'frames': 0, 'hits': 0, 'hit_rate': 0.0}
+    assert cascade.detect_batch([]) == []
@@ -0,0 +1,24 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+from face_engine.embedding_cache import EmbeddingCache, content_hash
+
+
+def test_embedding_cache_round_trip(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = EmbeddingCache(path, 'Facenet512|1|crop')
+    key = content_hash(b'image bytes')
+    cache.put_many({key: np.arange(4)})
+    found = EmbeddingCache(path, 'Facenet512|1|crop').get_many([key, content_hash(b'other')])
+    assert list(found) == [key]
+    assert found[key].dtype == np.float32
+    assert found[key].tolist() == [0, 1, 2, 3]
+
+
+def test_embedding_cache_is_keyed_by_model(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    EmbeddingCache(path, 'Facenet512|1|crop').put_many({'abc': np.ones(2)})
+    cache = EmbeddingCache(path, 'Facenet512|2|crop')
+    assert cache.get_many(['abc']) == {}
+    assert (cache.hits, cache.misses) == (0, 1)
@@ -0,0 +1,91 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+import pytest
+from face_engine.gallery import Gallery, to_vector
+
+
+def test_gallery_add_grows_contiguously():
+    gallery = Gallery(capacity=2)
+    gallery.add(np.ones((3, 4)), 1)
+    gallery.add(np.zeros(4), 2)
+    assert len(gallery) == 4
+    assert gallery.embeddings.dtype == np.float32
+    assert gallery.embeddings.shape == (4, 4)
+    assert gallery.labels.tolist() == [1, 1, 1, 2]
+
+
+def test_gallery_rejects_other_dimensions():
+    gallery = Gallery()
+    gallery.add(np.ones((1, 4)), 1)
+    with pytest.raises(ValueError):
+        gallery.add(np.ones((1, 5)), 1)
+
+
+def test_gallery_loads_legacy_embeddings():
+    data = {"encodings": [[{"embedding": [1.0, 2.0], "facial_area": {}, "face_confidence": 1}], [3.0, 4.0]],
+            "labels": ['1', 2]}
+    gallery = Gallery.from_dict(data)
+    assert gallery.embeddings.tolist() == [[1.0, 2.0], [3.0, 4.0]]
+    assert gallery.labels.tolist() == [1, 2]
+    restored = Gallery.from_dict(gallery.to_dict())
+    assert np.array_equal(restored.embeddings, gallery.embeddings)
+
+
+def test_to_vector():
+    assert to_vector([1, 2, 3]).dtype == np.float32
+    assert to_vector({"embedding": [1, 2]}).tolist() == [1.0, 2.0]
+
+
+def test_gallery_copy_is_unaffected_by_later_appends():
+    gallery = Gallery()
+    gallery.add(np.ones((3, 4)), 1)
+    snapshot = gallery.copy()
+    gallery.add(np.zeros((2, 4)), 2)
+    assert len(snapshot) == 3
+    assert snapshot.labels.tolist() == [1, 1, 1]
+    np.testing.assert_array_equal(snapshot.embeddings, np.ones((3, 4)))
+
+
+def test_gallery_remove_tombstones_rows():
+    gallery = Gallery()
+    gallery.add(np.ones((2, 4)), 1)
+    gallery.add(np.zeros((3, 4)), 2)
+    gallery.add(np.ones((1, 4)), 1)
+    assert gallery.remove(1).tolist() == [0, 1, 5]
+    assert gallery.alive.tolist() == [False, False, True, True, True, False]
+    assert gallery.deleted == 3 and gallery.removed == {1}
+    gallery.add(np.ones((1, 4)), 1)
+    assert gallery.removed == set()
+    assert gallery.remove(1).tolist() == [6]
+    snapshot = gallery.copy()
+    assert snapshot.labels.tolist() == [2, 2, 2]
+    assert snapshot.removed == {1}
+
+
+def test_gallery_remove_rows_marks_users_without_rows():
+    gallery = Gallery()
+    gallery.add(np.ones((2, 4)), np.array([1, 2]))
+    gallery.remove_rows([0, 7])
+    assert gallery.alive.tolist() == [False, True]
+    assert gallery.removed == {1}
+
+
+def test_gallery_rows_of_skips_removed_rows():
+    gallery = Gallery()
+    gallery.add(np.ones((2, 4)), np.array([1, 2]))
+    gallery.add(np.ones((2, 4)), np.array([3, 1]))
+    assert gallery.rows_of({1, 3}).tolist() == [0, 2, 3]
+    gallery.remove(3)
+    assert gallery.rows_of([1, 3, 8]).tolist() == [0, 3]
+
+
+def test_gallery_users_skips_removed_users():
+    gallery = Gallery()
+    assert gallery.users().tolist() == []
+    gallery.add(np.ones((2, 4)), 5)
+    gallery.add(np.ones((1, 4)), 3)
+    gallery.add(np.ones((1, 4)), 8)
+    gallery.remove(5)
+    assert gallery.users().tolist() == [3, 8]
@@ -0,0 +1,38 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import types
+import subprocess
+import pytest
+from face_engine.loader import LazyModel
+
+
+def test_lazy_model_builds_once_on_first_use():
+    built = []
+    model = LazyModel('stub', lambda: built.append(1) or types.SimpleNamespace(value=3), warmup=lambda instance: built.append(2))
+    assert model.status()['state'] == 'not_loaded'
+    assert built == []
+    assert model.value == 3  # attribute access is forwarded to the built model
+    model.get()
+    assert built == [1, 2]
+    assert model.status()['state'] == 'ready'
+
+
+def test_lazy_model_reports_failed_loads():
+    def fail():
+        raise RuntimeError('weights not found')
+
+    model = LazyModel('stub', fail)
+    model.load_async().join()
+    assert model.status() == {'state': 'failed', 'load_time': None, 'error': 'weights not found'}
+    with pytest.raises(RuntimeError):
+        model.get()
+
+
+def test_importing_the_recognition_pipeline_loads_no_framework():
+    code = ('import sys; import face_engine.classifier, face_engine.detector, face_engine.onnx_detector; '
+            'print(sorted({name.split(".")[0] for name in sys.modules} & '
+            '{"deepface", "tensorflow", "keras", "torch", "ultralytics", "onnxruntime"}))')
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    output = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, check=True).stdout
+    assert output.strip() == '[]'
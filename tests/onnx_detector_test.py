@@ -0,0 +1,43 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+import pytest
+from config import cfg
+from face_engine.onnx_detector import OnnxDetector, non_max_suppression
+
+
+@pytest.fixture
+def decoder(monkeypatch):
+    monkeypatch.setattr(cfg.detector, 'OBJECTNESS_CONFIDANCE', 0.25)
+    monkeypatch.setattr(cfg.detector, 'NMS_THRESHOLD', 0.5)
+    monkeypatch.setattr(cfg.detector, 'classes', [0, 1])
+    detector = OnnxDetector.__new__(OnnxDetector)  # decode() needs no ONNX Runtime session
+    detector.num_classes = 2
+    return detector
+
+
+def test_non_max_suppression_drops_overlapping_boxes():
+    boxes = np.asarray([[0, 0, 10, 10], [1, 1, 11, 11], [20, 20, 30, 30]], dtype=np.float32)
+    scores = np.asarray([0.8, 0.9, 0.7], dtype=np.float32)
+    assert non_max_suppression(boxes, scores, 0.5).tolist() == [1, 2]
+    assert non_max_suppression(boxes, scores, 0.9).tolist() == [1, 0, 2]
+    assert non_max_suppression(boxes, scores, 0.5, max_det=1).tolist() == [1]
+    assert non_max_suppression(np.empty((0, 4)), np.empty(0), 0.5).tolist() == []
+
+
+def test_decode_maps_boxes_back_to_the_frame(decoder):
+    # one column per anchor: center x, center y, width, height and the score of each class, in letterbox coordinates
+    output = np.asarray([[110, 112, 112, 110, 400],
+                         [70, 70, 70, 70, 30],
+                         [40, 40, 40, 40, 40],
+                         [20, 20, 20, 20, 40],
+                         [0.9, 0.8, 0.1, 0.1, 0.6],
+                         [0.0, 0.1, 0.85, 0.1, 0.0]], dtype=np.float32)
+    detections = decoder.decode(output, ratio=2.0, pad=(10, 20), shape=(100, 200))
+    # the class 0 box overlapping a better one is suppressed, the same box of class 1 and the low score are not
+    assert detections.class_ids.tolist() == [0, 1, 0]
+    assert detections.scores.tolist() == pytest.approx([0.9, 0.85, 0.6])
+    assert detections.boxes[0].tolist() == pytest.approx([40, 20, 20, 10])
+    assert detections.boxes[1].tolist() == pytest.approx([41, 20, 20, 10])
+    assert detections.boxes[2].tolist() == pytest.approx([185, 0, 15, 15])  # clipped to the frame
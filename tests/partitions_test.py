@@ -0,0 +1,38 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import time
+from face_engine.partitions import PermissionPartitions
+
+
+def test_partitions_load_once_and_follow_changes():
+    calls = []
+
+    def loader(permission_level):
+        calls.append(permission_level)
+        return {'security': [1, 2], 'admin': [2]}.get(permission_level, [])
+
+    partitions = PermissionPartitions(loader)
+    assert partitions.users('security') == {1, 2}
+    partitions.on_change(3, 'security', True)
+    partitions.on_change(1, 'security', False)
+    partitions.on_change(4, 'guest', True)
+    assert partitions.users('security') == {2, 3}
+    assert partitions.users('admin') == {2}
+    partitions.remove_user(2)
+    assert partitions.users('security') == {3}
+    assert partitions.users('admin') == set()
+    assert calls == ['security', 'admin']
+
+
+def test_partitions_reload_after_ttl(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    granted = {'security': [1]}
+    partitions = PermissionPartitions(lambda permission_level: granted[permission_level], ttl=10)
+    assert partitions.users('security') == {1}
+    granted['security'] = [1, 5]  # granted through another worker, no listener call in this process
+    now[0] = 9
+    assert partitions.users('security') == {1}
+    now[0] = 10
+    assert partitions.users('security') == {1, 5}
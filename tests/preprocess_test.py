@@ -0,0 +1,90 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+import cv2
+import pytest
+from config import cfg
+from face_engine.detector import Detections
+from face_engine.preprocess import jpeg_size, reduction_factor, decode_image, letterbox, prepare, restore_boxes
+
+
+@pytest.fixture
+def detector_cfg(monkeypatch):
+    monkeypatch.setattr(cfg.detector, 'roi', None)
+    monkeypatch.setattr(cfg.detector, 'cascade', False)
+    monkeypatch.setattr(cfg.detector, 'frame_resize', (640, 640))
+    monkeypatch.setattr(cfg.detector, 'rotate_frame', False)
+    monkeypatch.setattr(cfg.detector, 'reduced_decode', True)
+    return cfg.detector
+
+
+def encoded(width, height, ext='.jpg'):
+    image = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    return cv2.imencode(ext, image)[1].tobytes()
+
+
+def test_jpeg_size_reads_the_frame_header():
+    assert jpeg_size(encoded(320, 200)) == (320, 200)
+    assert jpeg_size(encoded(32, 20, '.png')) is None
+    assert jpeg_size(b'\xff\xd8\xff') is None
+
+
+def test_reduction_factor_keeps_the_detector_input_size(detector_cfg):
+    assert reduction_factor((5200, 2000)) == 8
+    assert reduction_factor((4000, 3000)) == 4
+    assert reduction_factor((1280, 720)) == 2
+    assert reduction_factor((1000, 800)) == 1
+    detector_cfg.roi = (0.25, 0, 0.75, 1)
+    assert reduction_factor((5200, 2000)) == 4
+    detector_cfg.roi = None
+    detector_cfg.cascade = True
+    detector_cfg.cascade_sizes = [(320, 320), (1280, 1280)]
+    assert reduction_factor((5200, 2000)) == 4
+
+
+def test_decode_image_reduces_large_jpegs(detector_cfg):
+    blob = encoded(2600, 1200)
+    image, factor = decode_image(blob)
+    assert factor == 4
+    assert image.shape == (300, 650, 3)
+    image, factor = decode_image(blob, reduce=False)
+    assert factor == 1
+    assert image.shape == (1200, 2600, 3)
+
+
+def test_letterbox_keeps_the_aspect_ratio():
+    padded, ratio, (left, top) = letterbox(np.zeros((480, 320, 3), dtype=np.uint8), (640, 640))
+    assert padded.shape == (640, 640, 3)
+    assert ratio == pytest.approx(640 / 480)
+    assert (left, top) == (106, 0)  # 213 columns of padding, the odd one on the right
+
+
+@pytest.mark.parametrize('roi', [None, (0.25, 0.1, 0.75, 0.9)])
+def test_restore_boxes_inverts_prepare(detector_cfg, roi):
+    detector_cfg.roi = roi
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    padded, meta = prepare(frame, (640, 640))
+    assert padded.shape == (640, 640, 3)
+    ratio, pad, offset, _ = meta
+    box = np.asarray([[200, 100, 80, 60]], dtype=np.float32)
+    letterboxed = np.concatenate([(box[:, :2] - offset) * ratio + pad, box[:, 2:] * ratio], axis=1)
+    assert restore_boxes(letterboxed, meta) == pytest.approx(box, abs=1e-3)
+
+
+def test_restore_boxes_clips_to_the_frame(detector_cfg):
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    _, meta = prepare(frame, (640, 640))
+    restored = restore_boxes(np.asarray([[600, 0, 100, 700]], dtype=np.float32), meta)
+    x, y, w, h = restored[0]
+    assert x + w == pytest.approx(640)
+    assert (y, y + h) == (0, 480)
+
+
+def test_crops_scaled_from_a_reduced_decode_match_the_full_frame():
+    frame = np.arange(400 * 600 * 3, dtype=np.uint32).reshape(400, 600, 3)
+    detections = Detections([[50, 25, 40, 30], [140, 90, 20, 20]], [0.9, 0.8], [0, 0])
+    crops = detections.scaled(2).crops(frame)
+    assert [crop.shape[:2] for crop in crops] == [(60, 80), (40, 40)]
+    assert np.array_equal(crops[0], frame[50:110, 100:180])
+    assert detections.scaled(4).crops(frame)[1].shape[:2] == (40, 40)
@@ -0,0 +1,43 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+import pytest
+from face_engine.similarity import pairwise_distances, top_k, squared_norms
+
+
+@pytest.fixture
+def embeddings():
+    rng = np.random.default_rng(0)
+    return rng.normal(size=(4, 16)).astype(np.float32), rng.normal(size=(50, 16)).astype(np.float32)
+
+
+def test_euclidean_matches_reference(embeddings):
+    probes, gallery = embeddings
+    expected = np.linalg.norm(probes[:, None] - gallery[None], axis=2)
+    assert np.allclose(pairwise_distances(probes, gallery, 'Euclidean'), expected, atol=1e-4)
+    assert np.allclose(pairwise_distances(probes[0], gallery, 'Euclidean', squared_norms(gallery)), expected[0],
+                       atol=1e-4)
+
+
+def test_cosine_matches_reference(embeddings):
+    probes, gallery = embeddings
+    expected = 1 - (probes @ gallery.T) / np.outer(np.linalg.norm(probes, axis=1), np.linalg.norm(gallery, axis=1))
+    assert np.allclose(pairwise_distances(probes, gallery, 'Cosine'), expected, atol=1e-5)
+
+
+def test_invalid_metric(embeddings):
+    probes, gallery = embeddings
+    with pytest.raises(ValueError):
+        pairwise_distances(probes, gallery, 'Manhattan')
+
+
+def test_top_k_returns_sorted_nearest(embeddings):
+    probes, gallery = embeddings
+    distances = pairwise_distances(probes, gallery)
+    indices, values = top_k(distances, 5)
+    assert indices.shape == (4, 5)
+    assert np.array_equal(indices, np.argsort(distances, axis=1)[:, :5])
+    assert np.allclose(values, np.sort(distances, axis=1)[:, :5])
+    indices, values = top_k(distances[0], 100)
+    assert len(indices) == 50
@@ -0,0 +1,133 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import numpy as np
+import pytest
+from face_engine.store import EmbeddingStore
+from face_engine.gallery import Gallery
+
+
+def test_store_appends_and_reloads_rows(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    assert not store.exists()
+    store.append(np.ones((3, 4)), 1)
+    store.append(np.zeros((2, 4)), np.array([2, 3]))
+    embeddings, labels, norms, ids = EmbeddingStore(str(tmp_path)).load()
+    assert embeddings.shape == (5, 4)
+    assert labels.tolist() == [1, 1, 1, 2, 3]
+    np.testing.assert_allclose(norms, [4, 4, 4, 0, 0])
+    assert ids.tolist() == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='segments are not memory-mapped on Windows')
+def test_single_segment_is_memory_mapped(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    store.append(np.ones((3, 4)), 1)
+    embeddings, labels, norms, ids = store.load()
+    assert isinstance(embeddings, np.memmap)
+    gallery = Gallery.from_arrays(embeddings, labels, norms, ids)
+    gallery.add(np.zeros((1, 4)), 2)
+    assert gallery.labels.tolist() == [1, 1, 1, 2]
+    assert gallery.ids.tolist() == [0, 1, 2, -1]
+    assert not isinstance(gallery.embeddings.base, np.memmap)
+
+
+def test_store_compacts_small_segments(tmp_path):
+    store = EmbeddingStore(str(tmp_path), max_segments=3)
+    for user_id in range(10):
+        store.append(np.full((2, 4), user_id), user_id)
+    assert len(store.manifest['segments']) <= 3
+    assert len([name for name in os.listdir(tmp_path) if name.endswith('.npy')]) == 4 * len(store.manifest['segments'])
+    embeddings, labels, _, ids = store.load()
+    assert labels.tolist() == [user_id for user_id in range(10) for _ in range(2)]
+    assert ids.tolist() == list(range(20))
+    np.testing.assert_array_equal(embeddings[:, 0], labels)
+
+
+def test_store_rewrite_replaces_all_rows(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    store.append(np.ones((3, 4)), 1)
+    store.append(np.ones((3, 4)), 2)
+    store.rewrite(np.zeros((1, 4)), np.array([5]))
+    embeddings, labels, _, ids = store.load()
+    assert labels.tolist() == [5]
+    assert ids.tolist() == [6]
+    assert len(store.manifest['segments']) == 1
+
+
+def test_store_rejects_dimension_mismatch(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    store.append(np.ones((1, 4)), 1)
+    with pytest.raises(ValueError):
+        store.append(np.ones((1, 5)), 1)
+
+
+def test_store_keeps_tombstones_until_compaction(tmp_path):
+    store = EmbeddingStore(str(tmp_path), max_segments=8)
+    store.append(np.ones((3, 4)), 1)
+    store.delete(np.array([0, 2]))
+    store.append(np.ones((2, 4)), 2)
+    assert EmbeddingStore(str(tmp_path)).deleted().tolist() == [0, 2]
+    store.compact()
+    _, labels, _, ids = store.load()
+    assert ids.tolist() == [1, 3, 4]
+    assert labels.tolist() == [1, 2, 2]
+    assert store.deleted().tolist() == []
+
+
+def test_store_compaction_drops_a_single_segment_tombstones(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    store.append(np.ones((3, 4)), 1)
+    store.delete(np.array([1]))
+    store.compact()
+    assert store.load()[3].tolist() == [0, 2]
+    assert len(store.manifest['segments']) == 1
+
+
+def test_store_row_ids_are_shared_by_every_writer(tmp_path):
+    first, second = EmbeddingStore(str(tmp_path)), EmbeddingStore(str(tmp_path))
+    first.append(np.ones((2, 4)), 10)
+    added = second.append(np.zeros((2, 4)), 20)
+    second.delete(added)
+    first.compact()
+    _, labels, _, _ = EmbeddingStore(str(tmp_path)).load()
+    assert labels.tolist() == [10, 10]
+    first.append(np.ones((1, 4)), 30)
+    assert first.load()[3].tolist() == [0, 1, 4]
+
+
+def test_store_upgrades_stores_without_row_ids(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    store.append(np.ones((2, 4)), 1)
+    store.append(np.ones((3, 4)), 2)
+    for segment in store.manifest['segments']:
+        os.remove(os.path.join(str(tmp_path), f'{segment["name"]}.ids.npy'))
+    with open(store.manifest_path, 'w') as f:
+        json.dump({'dim': 4, 'segments': store.manifest['segments'], 'deleted': [3]}, f)
+    upgraded = EmbeddingStore(str(tmp_path))
+    _, labels, _, ids = upgraded.load()
+    assert ids.tolist() == [0, 1, 2, 3, 4]
+    assert labels[ids == 3].tolist() == [2]
+    assert upgraded.append(np.ones((1, 4)), 3).tolist() == [5]
+
+
+def test_store_records_the_model_key(tmp_path):
+    store = EmbeddingStore(str(tmp_path), model_key='Facenet512|1|detect')
+    store.append(np.ones((2, 4)), 1)
+    store.compact()
+    assert not store.stale()
+    assert EmbeddingStore(str(tmp_path)).manifest['model_key'] == 'Facenet512|1|detect'
+    assert EmbeddingStore(str(tmp_path), model_key='Facenet512|1|crop').stale()
+    assert not EmbeddingStore(str(tmp_path), model_key='Facenet512|1|detect').stale()
+    store = EmbeddingStore(str(tmp_path), model_key='Facenet512|1|crop')
+    store.rewrite(np.empty((0, 0)), np.empty(0))
+    assert not store.stale() and len(store) == 0
+
+
+def test_store_without_a_model_key_is_trusted(tmp_path):
+    EmbeddingStore(str(tmp_path)).append(np.ones((2, 4)), 1)
+    store = EmbeddingStore(str(tmp_path), model_key='Facenet512|1|crop')
+    assert not store.stale()
+    store.append(np.ones((1, 4)), 2)
+    assert store.manifest['model_key'] == 'Facenet512|1|crop'
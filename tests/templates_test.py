@@ -0,0 +1,30 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+import pytest
+from face_engine.templates import select_templates
+
+
+@pytest.fixture
+def embeddings():
+    rng = np.random.default_rng(0)
+    return np.concatenate([rng.normal(centre, 0.1, (20, 8)) for centre in (0, 5, 10)]).astype(np.float32)
+
+
+def test_medoids_are_enrolled_faces_of_every_mode(embeddings):
+    templates = select_templates(embeddings, 3, 'medoids')
+    assert templates.shape == (3, 8)
+    assert all((embeddings == template).all(1).any() for template in templates)
+    assert sorted(np.round(templates.mean(1)).tolist()) == [0, 5, 10]
+
+
+def test_centroids_average_every_mode(embeddings):
+    templates = select_templates(embeddings, 3, 'centroids')
+    assert sorted(np.round(templates.mean(1)).tolist()) == [0, 5, 10]
+
+
+def test_few_embeddings_are_kept_as_they_are(embeddings):
+    assert select_templates(embeddings[:2], 3).shape == (2, 8)
+    with pytest.raises(ValueError):
+        select_templates(embeddings, 3, 'random')
@@ -0,0 +1,49 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+import time
+from face_engine.trainer import TrainingWorker
+
+
+class SlowClassifier:
+    def __init__(self):
+        self.runs = 0
+        self.started = threading.Event()
+
+    def train(self):
+        self.started.set()
+        time.sleep(0.2)
+        self.runs += 1
+
+
+def test_training_worker_coalesces_requests():
+    classifier = SlowClassifier()
+    worker = TrainingWorker(classifier)
+    worker.request()
+    classifier.started.wait(1)
+    for _ in range(5):
+        worker.request()
+    assert worker.wait(timeout=5)
+    assert classifier.runs == 2
+    assert worker.completed == worker.requested == 6
+
+
+def test_training_worker_runs_callbacks_after_training():
+    classifier = SlowClassifier()
+    worker = TrainingWorker(classifier)
+    seen = []
+    worker.request(callback=lambda: seen.append(classifier.runs))
+    assert worker.wait(timeout=5)
+    assert seen == [1]
+
+
+def test_training_worker_survives_failed_training():
+    class FailingClassifier:
+        def train(self):
+            raise RuntimeError('fit failed')
+
+    worker = TrainingWorker(FailingClassifier())
+    worker.request()
+    assert worker.wait(timeout=5)
+    assert worker.last_error == 'fit failed'
@@ -6,20 +6,72 @@ from config import cfg
 import numpy as np
 import cv2 
 import os
-import time
+import shutil
+import hashlib
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from face_engine.detector import Inference
+from face_engine.preprocess import decode_image
 from flask import request
 from services.access_log_service import add_access_log
 from services.access_request_service import log_access_request
 from mason import create_error_response
 from face_engine.classifier import Classifier
+from face_engine.loader import LazyModel
+from face_engine.registry import models
+from face_engine.cache import ResultCache
+from face_engine.partitions import PermissionPartitions
 from services.user_service import get_user_profile, update_user_name, update_user_facial_data, add_user
-from services.permission_service import add_permission_to_user, validate_access_for_user
+from services.permission_service import add_permission_to_user, validate_access_for_user, get_users_with_permission, \
+    add_permission_listener
 
 
-inference = Inference()
+def warmup_detector(model):
+    """
+    Run one detection on a blank frame so the first real request does not pay for lazy initialisation.
+    Args:
+        model (Inference): The freshly built detector.
+    """
+    model.detect(np.zeros((*cfg.detector.frame_resize, 3), dtype=np.uint8))
+
+
+def warmup_classifier(model):
+    """
+    Build the recognition model through the model registry and encode a blank face, so the first real request
+    pays neither the model build nor the first-call graph setup.
+    Args:
+        model (Classifier): The freshly built classifier.
+    """
+    models.preload([cfg.recognizer.model])
+    model.reco.encode(np.zeros((160, 160, 3), dtype=np.uint8))
+
+
+inference = LazyModel('detector', Inference, warmup=warmup_detector)
 VALID_API_KEYS = cfg.app.VALID_API_KEYS
-classifier = Classifier()
+classifier = LazyModel('classifier', Classifier, warmup=warmup_classifier)
+permission_partitions = PermissionPartitions(get_users_with_permission, ttl=cfg.recognizer.permission_partition_ttl)
+add_permission_listener(permission_partitions.on_change)
+recognition_cache = ResultCache(maxsize=cfg.recognizer.result_cache_size, ttl=cfg.recognizer.result_cache_ttl)
+face_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='face-writer')  # one thread keeps writes and deletions in order
+MODELS = [inference, classifier]
+
+
+def preload_models():
+    """
+    Start building every model on a background thread, so the server can start serving before they are ready.
+    """
+    for model in MODELS:
+        model.load_async()
+
+
+def models_status():
+    """
+    Report the load state of every model.
+    Returns:
+        tuple: True if every model is ready, and a dictionary with the status of each model by name.
+    """
+    status = {model.name: model.status() for model in MODELS}
+    return all(item['state'] == 'ready' for item in status.values()), status
 
 
 class NameConverter(BaseConverter):
@@ -102,6 +154,96 @@ def query_key(*args, **kwargs):
     """
     return request.full_path
 
+def detect_faces(blobs):
+    """
+    Detect faces in uploaded images and crop them out of the full-resolution pixels.
+    Detection runs in one batch on (possibly reduced-scale) decodes; the boxes are scaled back before cropping.
+    Args:
+        blobs (list): The encoded image bytes of each upload.
+    Returns:
+        list: One list of cropped faces (numpy.ndarray) per upload, in the same order as blobs.
+    """
+    decoded = [decode_image(blob) for blob in blobs]
+    all_detections = inference.detect_batch([img for img, _ in decoded])
+    faces = []
+    for blob, (img, factor), detections in zip(blobs, decoded, all_detections):
+        if len(detections) != 0 and factor != 1:
+            img, _ = decode_image(blob, reduce=False)
+            detections = detections.scaled(factor)
+        faces.append(detections.crops(img))
+    return faces
+
+
+def encode_faces(faces):
+    """
+    Encode cropped faces as JPEG in memory, the bytes stored for the user and saved under cfg.db.database.
+    Args:
+        faces (list): The cropped BGR faces (numpy.ndarray).
+    Returns:
+        list: The JPEG bytes of each face, in the same order.
+    """
+    return [cv2.imencode('.jpg', face)[1].tobytes() for face in faces]
+
+
+def write_file(path, data):
+    """
+    Write bytes to a file, creating its folder if needed.
+    Args:
+        path (str): The path to the file.
+        data (bytes): The content of the file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def queue_write(function, path, *args, **kwargs):
+    """
+    Run a file operation on the background writer, reporting it if it fails (EX: permissions, full disk), as no
+    request waits for its result.
+    Args:
+        function (callable): The operation, called as function(path, *args, **kwargs).
+        path (str): The file or folder it operates on.
+    Returns:
+        concurrent.futures.Future: The pending operation.
+    """
+    def report(future):
+        if future.exception() is not None:
+            print(f'[ERROR] {function.__name__} {path} : {future.exception()}')
+
+    future = face_writer.submit(function, path, *args, **kwargs)
+    future.add_done_callback(report)
+    return future
+
+
+def save_faces(user_id, file_names, blobs):
+    """
+    Queue the face images of a user to be written to cfg.db.database on the background writer, off the request path.
+    The images are only read back to rebuild the gallery; the embeddings are already enrolled from memory.
+    Args:
+        user_id (int): The ID of the user.
+        file_names (list): The file names of the faces in the user's folder.
+        blobs (list): The JPEG bytes of each face, in the same order.
+    """
+    for file_name, blob in zip(file_names, blobs):
+        queue_write(write_file, os.path.join(cfg.db.database, str(user_id), file_name), blob)
+
+
+def refresh_recognition():
+    """
+    Make newly enrolled faces recognizable: the incremental backends see them at once and only the cached results
+    are dropped; the trained backends are retrained, in the background with cfg.recognizer.async_training.
+    """
+    if classifier.clf.incremental:
+        recognition_cache.clear()
+    elif len(classifier.gallery.users()) > 1:
+        if cfg.recognizer.async_training:
+            classifier.request_training(callback=recognition_cache.clear)
+        else:
+            classifier.train()
+            recognition_cache.clear()
+
+
 def process_access_request(file, associated_permission):
     """
     Handle an access request by verifying the user identity and permissions.
@@ -129,19 +271,32 @@ def process_access_request(file, associated_permission):
         return create_error_response(400, title="InvalidInputData", message=f'Invalid permission level: {associated_permission.lower()}. Use valid permission levels: {cfg.permission.user_permission_levels}')
     
     blobData = file.read()
-    img = cv2.imdecode(np.frombuffer(blobData, np.uint8), cv2.IMREAD_COLOR)
-    frame_out, boxes, _, _ = inference.infer(img)
-    if len(boxes) == 0:
-        return create_error_response(500, title="NotFound", message='No face detected from the image')
-
-    x, y, w, h = [int(item) for item in boxes[0]]
-    cropped_face = frame_out[y: y + h, x: x + w]
-    face_encode = classifier.reco.encode(cropped_face)
-    user_id = int(classifier.clf.predict([face_encode])[0])
-    probability = classifier.clf.predict_proba([face_encode])[0][int(user_id) - 1]
-
-    print(f'Recognized user: {user_id} | probability: {probability} | required minimal permission: {associated_permission} | prob_threshold: {cfg.recognizer.threshold}')
-    if not probability > cfg.recognizer.threshold:
+    # retried uploads are byte-identical, so the recognition result can be reused; the decision below is not cached
+    image_hash = hashlib.sha256(blobData).hexdigest()
+    users = None
+    if cfg.recognizer.permission_pruning:
+        # verification mode: only the users holding the required permission are searched
+        users = permission_partitions.users(associated_permission.lower())
+        image_hash = f'{image_hash}|{associated_permission.lower()}'
+    cached = recognition_cache.get(image_hash)
+    if cached is None:
+        faces = detect_faces([blobData])[0]
+        if len(faces) == 0:
+            return create_error_response(500, title="NotFound", message='No face detected from the image')
+
+        cropped_face = faces[0]
+        face_encode = classifier.reco.encode(cropped_face)
+        candidates = classifier.score(face_encode, k=cfg.recognizer.top_k, users=users)
+        user_id, probability = candidates[0] if candidates else (None, 0.0)
+        recognition_cache.put(image_hash, {'embedding': face_encode, 'user_id': user_id, 'probability': probability,
+                                           'candidates': candidates})
+    else:
+        user_id = cached['user_id']
+        probability = cached['probability']
+        candidates = cached['candidates']
+
+    print(f'Recognized user: {user_id} | probability: {probability} | candidates: {candidates} | required minimal permission: {associated_permission} | prob_threshold: {classifier.clf.threshold}')
+    if not probability > classifier.clf.threshold:
         return create_error_response(401, title="NotRecognized", message='user not recognized. Access denied')
 
     access = validate_access_for_user(user_id, associated_permission)
@@ -204,22 +359,26 @@ def update_user_details(user_id, name, permissions_list, files, cache):
 
     if is_file:
         update_user_blob = False
-        user_folder = os.path.join(cfg.db.database, str(user_id))
-        for i, file in enumerate(files):
+        blobs = []
+        for file in files:
             blobData = file.read()
             if not update_user_blob:
                 update_user_facial_data(user_id, blobData)
                 update_user_blob = True
-    
-            img = cv2.imdecode(np.frombuffer(blobData, np.uint8), cv2.IMREAD_COLOR)
-            frame_out, boxes, _, _ = inference.infer(img)
-            for idx, box in enumerate(boxes):
-                x, y, w, h = [int(item) for item in box]
-                cropped_face = frame_out[y: y + h, x: x + w]
-                cropped_face_path = os.path.join(user_folder, f'face_{i + len(os.listdir(user_folder)) + 1}_{idx}.jpg')
-                os.makedirs(os.path.dirname(cropped_face_path), exist_ok=True)
-                cv2.imwrite(cropped_face_path, cropped_face)
-        
+            blobs.append(blobData)
+
+        # a fresh prefix per update, as the faces of earlier updates may still be queued for writing
+        prefix = uuid.uuid4().hex[:8]
+        file_names, cropped_faces = [], []
+        for i, faces in enumerate(detect_faces(blobs)):
+            for idx, cropped_face in enumerate(faces):
+                file_names.append(f'face_{prefix}_{i}_{idx}.jpg')
+                cropped_faces.append(cropped_face)
+        crop_blobs = encode_faces(cropped_faces)
+        save_faces(user_id, file_names, crop_blobs)
+        if classifier.add_faces(cropped_faces, user_id, crop_blobs):
+            refresh_recognition()
+
         # Clear cache for the updated user profile
         cache.delete(f"user_profile_{user_id}")
 
@@ -268,34 +427,38 @@ def register_new_user(name, files, permissions_list):
             return create_error_response(400, title="InvalidInputData", message=f'Invalid permission level: {user_permission.lower()}. Use valid permission levels: {cfg.permission.user_permission_levels}')
 
     user_id = None
-    for i, file in enumerate(files):
-        blobData = file.read()
-        img = cv2.imdecode(np.frombuffer(blobData, np.uint8), cv2.IMREAD_COLOR)
-        frame_out, boxes, _, _ = inference.infer(img)
-        for idx, box in enumerate(boxes):
-            x, y, w, h = [int(item) for item in box]
-            cropped_face = frame_out[y: y + h, x: x + w]
-            if user_id is None:
-                os.makedirs('temp/', exist_ok=True)
-                temp_im = f'temp/{time.monotonic()}.jpg'
-                cv2.imwrite(temp_im, cropped_face)
-                with open(temp_im, 'rb') as f:
-                    Bim = f.read()
-                    user_id = add_user(name, Bim)
-                os.remove(temp_im)
-            cropped_face_path = os.path.join(cfg.db.database, str(user_id), f'face_{i}_{idx}.jpg')
-            os.makedirs(os.path.dirname(cropped_face_path), exist_ok=True)
-            cv2.imwrite(cropped_face_path, cropped_face)
-
-    for user_permission in permissions_list:
-        add_permission_to_user(user_id, user_permission.lower())
-
-    classifier.get_user_embeddings(user_id)
-    classifier.save_embeddings()
-    if len(os.listdir(cfg.db.database)) > 1:
-        classifier.train()
+    file_names, cropped_faces = [], []
+    for i, faces in enumerate(detect_faces([file.read() for file in files])):
+        for idx, cropped_face in enumerate(faces):
+            file_names.append(f'face_{i}_{idx}.jpg')
+            cropped_faces.append(cropped_face)
+    blobs = encode_faces(cropped_faces)
+    if blobs:
+        user_id = add_user(name, blobs[0])
+
+    if user_id is not None:
+        for user_permission in permissions_list:
+            add_permission_to_user(user_id, user_permission.lower())
+        save_faces(user_id, file_names, blobs)
+        if classifier.add_faces(cropped_faces, user_id, blobs):
+            refresh_recognition()
 
     return {
         'name': name,
         'user_id': user_id
-    }
\ No newline at end of file
+    }
+
+
+def remove_user_faces(user_id):
+    """
+    Removes a deleted user from recognition without retraining: tombstones their embeddings, deletes their face images
+    so a rebuild does not enroll them again, and drops the cached recognition results.
+
+    Args:
+        user_id (int): The ID of the deleted user.
+    """
+    classifier.remove_user(user_id)
+    permission_partitions.remove_user(user_id)
+    # queued behind the pending writes of the user, so none of them recreates the folder afterwards
+    queue_write(shutil.rmtree, os.path.join(cfg.db.database, str(user_id)), ignore_errors=True)
+    recognition_cache.clear()